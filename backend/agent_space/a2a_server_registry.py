@@ -6,7 +6,7 @@ from utils.log_util import logger
 from embedding import text_embedding
 from utils import a2a_util
 
-def gen_semantic_embedding_from_agent_card(request_id: str, agent_card_json_str: str) -> Tuple[str | None, list[float] | None]:
+async def gen_semantic_embedding_from_agent_card(request_id: str, agent_card_json_str: str) -> Tuple[str | None, list[float] | None]:
     try:
         
         semantic_json_str = a2a_util.transform_agent_card2semantic_json_str(request_id, agent_card_json_str)
@@ -16,9 +16,7 @@ def gen_semantic_embedding_from_agent_card(request_id: str, agent_card_json_str:
             return None, None
 
         # json字符串转向量
-        agent_card_embeded = text_embedding.embed_text(semantic_json_str)
-        agent_card_embeded = json.loads(agent_card_embeded)
-        agent_card_embeded = agent_card_embeded["data"][0]["embedding"]
+        agent_card_embeded = await text_embedding.embed_text_async(semantic_json_str)
 
         return semantic_json_str, agent_card_embeded
     except:
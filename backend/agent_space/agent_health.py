@@ -0,0 +1,171 @@
+import time
+import asyncio
+import traceback
+from datetime import datetime
+from sqlalchemy import text
+
+from utils.log_util import logger
+import config
+from database.db_engine import get_async_engine
+from database import a2a_server_op, a2a_server_health_op
+from agent_space import a2a_server_registry
+from utils.agent_card_cache import agent_card_cache
+
+# agent健康探测：后台定时拉取每个已注册agent的卡片，记录延迟与可用性，卡片变化时刷新数据库中的卡片和语义向量
+# 多worker时通过pg advisory lock保证同一时间只有一个worker在探测，结果写入a2a_server_health表，各worker定时加载
+# 检索和排序通过 is_available / health_penalty 过滤或降权不健康的agent
+
+_PROBE_LOCK_KEY = 0x61326168  # 'a2ah'
+
+_health: dict[str, dict] = {}
+_task: asyncio.Task | None = None
+
+
+def is_available(a2a_server_url: str) -> bool:
+    """没有探测记录的agent视为可用"""
+    health = _health.get(a2a_server_url)
+    return health is None or health["consecutive_failures"] < config.AGENT_HEALTH_DOWN_FAILURES
+
+
+def health_penalty(a2a_server_url: str) -> float:
+    """
+    0~1的降权系数：取 连续失败次数/判定下线次数 与 超出慢阈值的延迟比例 中的较大值
+    """
+    health = _health.get(a2a_server_url)
+    if health is None:
+        return 0.0
+    failure_ratio = health["consecutive_failures"] / config.AGENT_HEALTH_DOWN_FAILURES
+    latency_ms = health["latency_ms"] or 0.0
+    slow_ratio = (latency_ms - config.AGENT_HEALTH_SLOW_LATENCY_MS) / config.AGENT_HEALTH_SLOW_LATENCY_MS
+    return min(1.0, max(0.0, failure_ratio, slow_ratio))
+
+
+def filter_available(request_id: str, candidates: list) -> list:
+    """过滤掉已判定下线的候选agent，candidates中每项的第0个元素为a2a_server_url"""
+    if not config.AGENT_HEALTH_FILTER_UNHEALTHY:
+        return candidates
+    available = [item for item in candidates if is_available(item[0])]
+    if len(available) < len(candidates):
+        logger.info(f"request_id:{request_id}, filtered {len(candidates) - len(available)} unhealthy agents: "
+                    f"{[item[0] for item in candidates if not is_available(item[0])]}")
+    return available
+
+
+async def _refresh_card_if_changed(request_id: str, row: dict, agent_card) -> bool:
+    agent_card_json_str = agent_card.model_dump_json()
+    if agent_card_json_str == row["agent_card_json_str"]:
+        return False
+
+    a2a_server_url = row["a2a_server_url"]
+    name = agent_card.name.strip()
+    provider_org = (agent_card.provider.organization or "").strip() if agent_card.provider else ""
+    if name != row["name"] or provider_org != (row["provider_org"] or ""):
+        logger.warning(f"request_id:{request_id}, agent card of {a2a_server_url} changed name/organization "
+                        f"({row['name']}|{row['provider_org']} -> {name}|{provider_org}), re-registration required")
+        return False
+
+    semantic_json_str, semantic_json_embedding = \
+                await a2a_server_registry.gen_semantic_embedding_from_agent_card(request_id, agent_card_json_str)
+    if not semantic_json_str or not semantic_json_embedding:
+        logger.error(f"request_id:{request_id}, generate semantic embedding for changed agent card of {a2a_server_url} failed")
+        return False
+
+    succ = await a2a_server_op.update_agent_card_async(
+        request_id, a2a_server_url, agent_card.version, agent_card_json_str, semantic_json_embedding, semantic_json_str)
+    if succ == 0:
+        logger.info(f"request_id:{request_id}, agent card of {a2a_server_url} changed, refreshed")
+    return succ == 0
+
+
+async def _probe_one(request_id: str, row: dict, semaphore: asyncio.Semaphore) -> dict:
+    a2a_server_url = row["a2a_server_url"]
+    agent_card, error = None, None
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            agent_card = await asyncio.wait_for(agent_card_cache.refresh(request_id, a2a_server_url), config.AGENT_HEALTH_PROBE_TIMEOUT)
+            if agent_card is None:
+                error = "fetch agent card failed"
+        except asyncio.TimeoutError:
+            error = f"timeout after {config.AGENT_HEALTH_PROBE_TIMEOUT}s"
+        latency_ms = (time.perf_counter() - start) * 1000
+
+    if agent_card is not None:
+        try:
+            await _refresh_card_if_changed(request_id, row, agent_card)
+        except:
+            logger.error(f"request_id:{request_id}, refresh agent card of {a2a_server_url} failed: {traceback.format_exc()}")
+
+    return {
+        "a2a_server_url": a2a_server_url,
+        "healthy": agent_card is not None,
+        "latency_ms": latency_ms if agent_card is not None else None,
+        "error": error
+    }
+
+
+async def probe_round(request_id: str) -> bool:
+    """执行一轮探测；其他worker正在探测或刚探测过时跳过，返回是否执行"""
+    async with get_async_engine().connect() as conn:
+        acquired = (await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _PROBE_LOCK_KEY})).scalar()
+        await conn.commit()  # 会话级锁，不需要保持事务
+        if not acquired:
+            return False
+        try:
+            since = await a2a_server_health_op.seconds_since_last_probe_async(request_id)
+            if since is not None and since < config.AGENT_HEALTH_PROBE_INTERVAL / 2:
+                return False
+
+            rows = await a2a_server_op.list_registered_async(request_id)
+            semaphore = asyncio.Semaphore(config.AGENT_HEALTH_PROBE_CONCURRENCY)
+            results = await asyncio.gather(*[_probe_one(request_id, row, semaphore) for row in rows])
+            await a2a_server_health_op.upsert_health_async(request_id, results)
+            unhealthy = [item["a2a_server_url"] for item in results if not item["healthy"]]
+            logger.info(f"request_id:{request_id}, probed {len(results)} agents, unhealthy:{unhealthy}")
+            return True
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _PROBE_LOCK_KEY})
+            await conn.commit()
+
+
+async def reload_health(request_id: str):
+    global _health
+    health = await a2a_server_health_op.load_health_async(request_id)
+    if health is not None:
+        _health = health
+
+
+async def _probe_loop():
+    while True:
+        try:
+            await probe_round("agent_health")
+            await reload_health("agent_health")
+        except asyncio.CancelledError:
+            raise
+        except:
+            logger.error(f"agent health probe round failed: {traceback.format_exc()}")
+        await asyncio.sleep(config.AGENT_HEALTH_PROBE_INTERVAL)
+
+
+def start():
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_probe_loop())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+
+def stats() -> dict:
+    return {
+        a2a_server_url: {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in health.items() if key != "a2a_server_url"
+        }
+        for a2a_server_url, health in _health.items()
+    }
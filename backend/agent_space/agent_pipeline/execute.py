@@ -2,11 +2,13 @@ import json
 from typing import Tuple
 import traceback
 from typing import AsyncGenerator
+from contextlib import aclosing
 
 from embedding import text_embedding
 from database import a2a_server_op, file_op
-from rank import llm_ranker
+from rank import ranker
 from utils import a2a_util
+from agent_space import agent_health
 from utils.log_util import logger
 from utils.enums import STREAM_MESSAGE_TYPE, AGUI_EVENT
 
@@ -21,7 +23,7 @@ async def a2a_server_execute(
         # 根据file_id查询文件名字、类型、大小等元数据
         file_metadata_list = [] # list[list[str]]
         for file_id in file_id_list:
-            filename, mime_type, size = file_op.get_file_metadata_by_id(request_id, file_id)
+            filename, mime_type, size = await file_op.get_file_metadata_by_id_async(request_id, file_id)
             file_metadata_list.append([file_id, filename, mime_type, size])
         
         # 生成对文件元数据的文本描述
@@ -46,22 +48,28 @@ async def a2a_server_execute(
 
         # 用户query转成向量
         logger.info(f"start query embedding in a2a server execute, request_id:{request_id}")
-        d_embeded = text_embedding.embed_text(text_input_file_disc)
-        d_embeded = json.loads(d_embeded)
-        e_vec = d_embeded["data"][0]["embedding"]
+        e_vec = await text_embedding.embed_text_async(text_input_file_disc)
 
         # 向量检索
         logger.info(f"start agent retrieve in a2a server execute, request_id:{request_id}")
-        retrieve_res = a2a_server_op.query(request_id, query_embedding=str(e_vec))
+        retrieve_res = await a2a_server_op.query_async(request_id, query_embedding=e_vec, query_text=text_input)
+        retrieve_res = agent_health.filter_available(request_id, retrieve_res)
         if len(retrieve_res) <= 0:
             logger.info(f"request_id:{request_id}, no agent retrieved")
             return None
         agent_card_url_list = [item[0] for item in retrieve_res]
         agent_card_str_list = [item[1] for item in retrieve_res]
+        semantic_json_str_list = [item.semantic_json_str for item in retrieve_res]
         
         # 大模型排序   TODO:返回一个agent调用列表，并push至队列等待调用（即广搜）
         logger.info(f"start agent plan in a2a server execute, request_id:{request_id}")
-        rank_idx  = llm_ranker.rank_agent_card(request_id, text_input_file_disc, agent_card_str_list)
+        rank_idx  = await ranker.rank_agent_card(request_id, 
+                                            text_input_file_disc, 
+                                            agent_card_str_list, 
+                                            semantic_json_str_list,
+                                            candidate_urls=agent_card_url_list,
+                                            query_embedding=e_vec,
+                                            input_mime_types=[mime_type for _, _, mime_type, _ in file_metadata_list if mime_type])
         if rank_idx < 0 or rank_idx >= len(agent_card_url_list):
             return None
         rank_agent_card_url = agent_card_url_list[rank_idx]
@@ -77,7 +85,7 @@ async def a2a_server_execute(
         logger.warning(f"request_id:{request_id}, call a2a server failed")
         return None
 
-    except:
+    except Exception:
         logger.error(f"request_id:{request_id}, a2a server execute failed:{traceback.format_exc()}")
         return None
 
@@ -93,7 +101,7 @@ async def a2a_server_execute_stream(
         # 根据file_id查询文件名字、类型、大小等元数据
         file_metadata_list = [] # list[list[str]]
         for file_id in file_id_list:
-            filename, mime_type, size = file_op.get_file_metadata_by_id(request_id, file_id)
+            filename, mime_type, size = await file_op.get_file_metadata_by_id_async(request_id, file_id)
             file_metadata_list.append([file_id, filename, mime_type, size])
         
         # 生成对文件元数据的文本描述
@@ -111,24 +119,30 @@ async def a2a_server_execute_stream(
 
         # 用户query转成向量
         logger.info(f"start query embedding in a2a server execute, request_id:{request_id}")
-        d_embeded = text_embedding.embed_text(text_input_file_disc)
-        d_embeded = json.loads(d_embeded)
-        e_vec = d_embeded["data"][0]["embedding"]
+        e_vec = await text_embedding.embed_text_async(text_input_file_disc)
 
         # 向量检索
         logger.info(f"start agent retrieve in a2a server execute, request_id:{request_id}")
-        retrieve_res = a2a_server_op.query(request_id, query_embedding=str(e_vec))
+        retrieve_res = await a2a_server_op.query_async(request_id, query_embedding=e_vec, query_text=text_input)
+        retrieve_res = agent_health.filter_available(request_id, retrieve_res)
         if len(retrieve_res) <= 0:
             logger.info(f"request_id:{request_id}, no agent retrieved")
             yield STREAM_MESSAGE_TYPE.WARNING, "未检索到可用agent", ""
             return
         agent_card_url_list = [item[0] for item in retrieve_res]
         agent_card_str_list = [item[1] for item in retrieve_res]
+        semantic_json_str_list = [item.semantic_json_str for item in retrieve_res]
         yield STREAM_MESSAGE_TYPE.REASONING, f"已检索到{len(agent_card_url_list)}个可用agent\n", ""
         
         # 大模型排序   TODO:返回一个agent调用列表，并push至队列等待调用（即广搜）
         logger.info(f"start agent plan in a2a server execute, request_id:{request_id}")
-        rank_idx  = llm_ranker.rank_agent_card(request_id, text_input_file_disc, agent_card_str_list)
+        rank_idx  = await ranker.rank_agent_card(request_id, 
+                                            text_input_file_disc, 
+                                            agent_card_str_list, 
+                                            semantic_json_str_list,
+                                            candidate_urls=agent_card_url_list,
+                                            query_embedding=e_vec,
+                                            input_mime_types=[mime_type for _, _, mime_type, _ in file_metadata_list if mime_type])
         if rank_idx < 0 or rank_idx >= len(agent_card_url_list):
             yield STREAM_MESSAGE_TYPE.WARNING, "未能排序出合适的agent", ""
             return
@@ -140,10 +154,11 @@ async def a2a_server_execute_stream(
         if rank_agent_card_url:
             logger.info(f"start a2a server call in a2a server execute, request_id:{request_id}, rank_agent_card_url:{rank_agent_card_url}")
             # 这里假设 get_a2a_server_rsp_with_url_stream 是异步流式生成器
-            async for chunk in a2a_util.get_a2a_server_rsp_with_url_stream(
+            async with aclosing(a2a_util.get_a2a_server_rsp_with_url_stream(
                 request_id, rank_agent_card_url, text_input, file_metadata_list
-            ):
-                yield chunk
+            )) as stream:
+                async for chunk in stream:
+                    yield chunk
             return
 
         logger.warning(f"request_id:{request_id}, call a2a server failed")
@@ -31,11 +31,13 @@ from utils.enums import AGUI_EVENT
 from agent_space.os_agent.tools import (
     agent_retrieve_tool,
     agent_rank_tool,
-    agent_call_tool
+    agent_call_tool,
+    retrieve_candidates
 )
 from agent_space.os_agent.prompts import AGENT_SELECTION_SYSTEM_PROMPT
 import config
 from database import a2a_server_op
+from rank import rank_cache
 
 
 # class ToolCallingSupervisorResponse(BaseModel):
@@ -115,7 +117,7 @@ class MultiAgentGraph:
                     writer(message)
                     merge_msg_content += msg_content
                     
-                    agent_card_url_list = a2a_server_op.select_agent_card_url(request_id, agent_name, agent_org)
+                    agent_card_url_list = await a2a_server_op.select_agent_card_url_async(request_id, agent_name, agent_org)
                     if len(agent_card_url_list) > 0:
                         if len(agent_card_url_list) > 1:
                             logger.warning(f"request_id:{request_id}, there are {len(agent_card_url_list)} agents with name '{agent_name}' and org '{agent_org}'")
@@ -153,6 +155,41 @@ class MultiAgentGraph:
                     writer(message)
                     merge_msg_content += msg_content
 
+                # 排序决策缓存：仅在首轮对话（选择不依赖历史上下文）时使用
+                # 先检索候选集合，相同query+相同候选集合命中缓存时跳过react agent
+                # 未命中时候选集合通过config传给检索工具复用
+                rank_cache_query, candidate_urls, prefetched_candidates = "", [], None
+                if len(state.get("messages") or []) == 0:
+                    try:
+                        rank_cache_query, candidates = await retrieve_candidates(request_id, state["text_input"], state["input_file_metadata_list"])
+                        candidate_urls = [item.a2a_server_url for item in candidates]
+                        prefetched_candidates = (state["text_input"], state["input_file_metadata_list"], candidates)
+                    except:
+                        logger.error(f"request_id:{request_id}, retrieve candidates for rank cache failed: {traceback.format_exc()}")
+                    cached_url = rank_cache.lookup(rank_cache_query, candidate_urls)
+                    agent_card = await a2a_util.get_agent_card(request_id, cached_url) if cached_url else None
+                    if agent_card:
+                        logger.info(f"request_id:{request_id}, agent ranker hit rank cache: {cached_url}")
+                        provider_org = agent_card.provider.organization if agent_card.provider else ""
+                        agent_id = agent_card.name + ("|"+provider_org if provider_org else "")
+                        msg_content = "为你找到agent<span style='color: green;'>@"+agent_id+"</span>，正在调用...<br>"
+                        message = {
+                                "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK,
+                                "source": "platform",
+                                "agent_id": "",
+                                "provider_url": "",
+                                "content_type": "text", 
+                                "content": msg_content,
+                            }
+                        writer(message) 
+                        merge_msg_content += msg_content
+                        return {
+                                    "messages": AIMessage(content=merge_msg_content),
+                                    "agent_ranker_succeed": True, 
+                                    "ranked_agent_card_url": cached_url, 
+                                    "agent_ranker_error_msg": ""
+                            }
+
                 human_msg = HumanMessage(
                     content=state["text_input"]
                 )
@@ -186,7 +223,8 @@ class MultiAgentGraph:
                             "thread_id": config["configurable"]["thread_id"],
                             "request_id": config["configurable"]["request_id"], 
                             "user_id": config["configurable"]["user_id"], 
-                            "file_metadata_list": state["input_file_metadata_list"]
+                            "file_metadata_list": state["input_file_metadata_list"],
+                            "prefetched_candidates": prefetched_candidates
                         }
                     },
                     stream_mode="updates"
@@ -214,6 +252,8 @@ class MultiAgentGraph:
                                 }
                             writer(message) 
                             merge_msg_content += msg_content
+                            if rsp.succeed:
+                                rank_cache.store(rank_cache_query, candidate_urls, rsp.agent_card_url)
                             return {
                                         "messages": AIMessage(content=merge_msg_content),
                                         "agent_ranker_succeed": rsp.succeed, 
@@ -356,7 +396,7 @@ class MultiAgentGraph:
             # 根据file_id查询文件名字、类型、大小等元数据
             file_metadata_list = [] # list[list[str]]
             for file_id in file_id_list:
-                filename, mime_type, size = file_op.get_file_metadata_by_id(request_id, file_id)
+                filename, mime_type, size = await file_op.get_file_metadata_by_id_async(request_id, file_id)
                 file_metadata_list.append([file_id, filename, mime_type, size])
 
             input = {
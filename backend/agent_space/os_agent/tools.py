@@ -1,13 +1,15 @@
 import json
 import traceback
 from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel, Field
 from typing import Tuple
 
 from embedding import text_embedding
 from database import a2a_server_op
-from rank import llm_ranker
+from rank import ranker
 from utils import a2a_util
+from agent_space import agent_health
 from utils.log_util import logger
 
 
@@ -21,33 +23,50 @@ class VectorRetrieveInputSchema(BaseModel):
     text_input: str = Field(description="用户输入的文本内容")
     file_metadata_list: list[list[str|int]] = Field(description="用户输入文件的元数据列表，每个元素是一个包含4个字符串或整数的列表：索引0: 文件ID，索引1: 文件名，索引2: MIME类型（文件类型），索引3: 文件大小（字节）")
 
+
+async def retrieve_candidates(request_id: str, 
+                                text_input: str, 
+                                file_metadata_list: list[list[str|int]]
+                            ) -> Tuple[str, list[a2a_server_op.AgentCandidate]]:
+    """
+    returns:
+        (附带文件元数据描述的用户输入, 检索到的候选agent列表)
+    """
+    # 生成对文件元数据的文本描述
+    file_metadata_discription = ""
+    if len(file_metadata_list) > 0:
+        file_metadata_json = [
+            {"文件名": filename, "文件类型": mime_type, "文件大小（单位：字节）": size} \
+            for _, filename, mime_type, size in file_metadata_list \
+            if filename or mime_type
+        ]
+        file_metadata_discription = "输入文件的信息如下：" + json.dumps(file_metadata_json, ensure_ascii=False)
+
+    text_input_file_disc = "\n".join([text_input, file_metadata_discription])
+    logger.info(f"request_id:{request_id}, text input with file meta data is: {text_input_file_disc}")
+
+    # 用户query转成向量
+    logger.info(f"start query embedding in a2a server execute, request_id:{request_id}")
+    e_vec = await text_embedding.embed_text_async(text_input_file_disc)
+
+    # 向量检索
+    logger.info(f"start agent retrieve in a2a server execute, request_id:{request_id}")
+    retrieve_res = await a2a_server_op.query_async(request_id, query_embedding=e_vec, query_text=text_input)
+    return text_input_file_disc, agent_health.filter_available(request_id, retrieve_res)
+
+
 @tool(args_schema=VectorRetrieveInputSchema)
-def agent_retrieve_tool(request_id: str, text_input: str, file_metadata_list: list[list[str|int]]) -> Tuple[list[str], list[str]] | None:
+async def agent_retrieve_tool(request_id: str, text_input: str, file_metadata_list: list[list[str|int]], config: RunnableConfig) -> Tuple[list[str], list[str]] | None:
     try:
         logger.info(f"request_id:{request_id}, start vector retrieve tool, text_input:{text_input}, file_metadata_list:{file_metadata_list}")
         
-        # 生成对文件元数据的文本描述
-        file_metadata_discription = ""
-        if len(file_metadata_list) > 0:
-            file_metadata_json = [
-                {"文件名": filename, "文件类型": mime_type, "文件大小（单位：字节）": size} \
-                for _, filename, mime_type, size in file_metadata_list \
-                if filename or mime_type
-            ]
-            file_metadata_discription = "输入文件的信息如下：" + json.dumps(file_metadata_json, ensure_ascii=False)
-
-        text_input_file_disc = "\n".join([text_input, file_metadata_discription])
-        logger.info(f"request_id:{request_id}, text input with file meta data is: {text_input_file_disc}")
-
-        # 用户query转成向量
-        logger.info(f"start query embedding in a2a server execute, request_id:{request_id}")
-        d_embeded = text_embedding.embed_text(text_input_file_disc)
-        d_embeded = json.loads(d_embeded)
-        e_vec = d_embeded["data"][0]["embedding"]
-
-        # 向量检索
-        logger.info(f"start agent retrieve in a2a server execute, request_id:{request_id}")
-        retrieve_res = a2a_server_op.query(request_id, query_embedding=str(e_vec))
+        # 排序缓存未命中时，agent ranker已按同一输入检索过候选，直接复用，避免重复检索
+        prefetched = (config.get("configurable") or {}).get("prefetched_candidates")
+        if prefetched and prefetched[0] == text_input and prefetched[1] == file_metadata_list:
+            logger.info(f"request_id:{request_id}, reuse prefetched candidates")
+            retrieve_res = prefetched[2]
+        else:
+            _, retrieve_res = await retrieve_candidates(request_id, text_input, file_metadata_list)
         if len(retrieve_res) <= 0:
             logger.info(f"request_id:{request_id}, no agent retrieved")
             return None
@@ -74,7 +93,7 @@ class AgentRankInputSchema(BaseModel):
     agent_card_str_list: list[str] = Field(description="候选agent的卡片内容列表")
 
 @tool(args_schema=AgentRankInputSchema)
-def agent_rank_tool(request_id: str, 
+async def agent_rank_tool(request_id: str, 
                         text_input: str, 
                         file_metadata_list: list[list[str|int]], 
                         agent_card_url_list: list[str], 
@@ -95,8 +114,14 @@ def agent_rank_tool(request_id: str,
 
         text_input_file_disc = "\n".join([text_input, file_metadata_discription])
 
-        # 对agent进行排序，返回最优agent的url
-        rank_idx  = llm_ranker.rank_agent_card(request_id, text_input_file_disc, agent_card_str_list)
+        # 对agent进行排序，返回最优agent的url（与检索使用同一文本，向量命中缓存）
+        e_vec = await text_embedding.embed_text_async(text_input_file_disc)
+        rank_idx  = await ranker.rank_agent_card(request_id, 
+                                            text_input_file_disc, 
+                                            agent_card_str_list, 
+                                            candidate_urls=agent_card_url_list,
+                                            query_embedding=e_vec,
+                                            input_mime_types=[mime_type for _, _, mime_type, _ in file_metadata_list if mime_type])
         if rank_idx < 0 or rank_idx >= len(agent_card_url_list):
             return None
         rank_agent_card_url = agent_card_url_list[rank_idx]
@@ -104,7 +129,7 @@ def agent_rank_tool(request_id: str,
         logger.info(f"request_id:{request_id}, agent rank tool finished, selected agent card is {rank_agent_card_url}")
 
         return rank_agent_card_url
-    except:
+    except Exception:
         logger.error(f"request_id:{request_id}, agent rank tool exception: {traceback.format_exc()}")
         return None
 
@@ -2,39 +2,73 @@ import re
 import traceback
 # from flask import Flask, request, jsonify, Response
 from fastapi import FastAPI, Request, File, UploadFile, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from werkzeug.utils import secure_filename
 import json
-from datetime import datetime
+from datetime import datetime, timezone
+import email.utils
 import os
 import uuid
 import mimetypes
 import urllib.parse
 import asyncio
 import random
+from contextlib import asynccontextmanager, aclosing
 
 from embedding import text_embedding
 from database import (agent_op,  
                         a2a_server_op, 
+                        a2a_server_feed, 
                         file_op, 
                         chat_message_op, 
                         chat_list_op, 
                         auth_op, 
-                        user_op
+                        user_op,
+                        history_cache
                     )
-from rank import llm_ranker
-from agent_space import a2a_server_registry
+from database.chat_message_sink import ChatMessageSink
+from database.history_cache import InvalidCursorError
+from rank import ranker, rank_cache
+from agent_space import a2a_server_registry, agent_health
+from storage.blob_store import get_blob_store
 import config
 from utils.log_util import logger
 from utils import a2a_util, auth_util
-from utils import file_util
+from utils import file_util, http_client, agent_card_cache, circuit_breaker
 from utils.enums import AGUI_EVENT, STREAM_MESSAGE_TYPE
 from agent_space.os_agent.multi_agent_graph import MultiAgentGraph
 from agent_space.agent_pipeline import plan, execute
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 先启动a2a_server变更订阅，再全量加载，最后补上加载期间的变更，保证索引不丢更新
+    feed_since = None
+    if config.USE_A2A_SERVER_FEED:
+        a2a_server_feed.subscribe(a2a_server_op.apply_a2a_server_change)
+        a2a_server_feed.subscribe(rank_cache.apply_a2a_server_change)
+        a2a_server_feed.subscribe(agent_card_cache.apply_a2a_server_change)
+        feed_since = await a2a_server_feed.start()
+
+    # 启动时加载进程内agent向量索引（加载失败时检索自动回退到数据库）
+    if config.USE_LOCAL_VECTOR_INDEX:
+        await a2a_server_op.load_vector_index_async("startup")
+
+    if config.USE_A2A_SERVER_FEED and feed_since:
+        await a2a_server_feed.catch_up(since=feed_since)
+
+    if config.USE_AGENT_HEALTH_PROBE:
+        agent_health.start()
+    yield
+    if config.USE_AGENT_HEALTH_PROBE:
+        await agent_health.stop()
+    if config.USE_A2A_SERVER_FEED:
+        await a2a_server_feed.stop()
+    await http_client.close_http_client()
+
+
 # app = Flask(__name__)
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # 配置CORS中间件
 app.add_middleware(
@@ -52,6 +86,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # 分页游标
 )
 
 multi_agent_graph = MultiAgentGraph()
@@ -85,11 +120,12 @@ async def a2a_server_register(request: Request):
             return JSONResponse(content={"text": "URL必须以'http://'或'https://'开头"}, status_code=500)
 
         # 检查URL是否已存在
-        if a2a_server_op.a2a_server_url_exists(request_id, a2a_server_url):
+        if await a2a_server_op.a2a_server_url_exists_async(request_id, a2a_server_url):
             # logger.error(f"request_id:{request_id}, a2a_server_url:{a2a_server_url} already exists")
             return JSONResponse(content={"text": "该URL已注册"}, status_code=500)
 
-        # 获取agent card
+        # 获取agent card（注册时总是拉取最新卡片）
+        agent_card_cache.agent_card_cache.invalidate(a2a_server_url)
         final_agent_card_to_use = await a2a_util.get_agent_card(request_id, a2a_server_url)
         if not final_agent_card_to_use:
             logger.error(f"request_id:{request_id}, a2a_server_url:{a2a_server_url}, cannot get agent card from this url")
@@ -117,7 +153,7 @@ async def a2a_server_register(request: Request):
             return JSONResponse(content={"text": "agent card中organization不能包含'|'字符"}, status_code=500)
 
          # 检查name和provider_org是否已存在
-        if a2a_server_op.name_provider_org_exists(request_id, name, provider_org):
+        if await a2a_server_op.name_provider_org_exists_async(request_id, name, provider_org):
             if provider_org:
                 return JSONResponse(content={"text": "该organization下已有相同name的agent"}, status_code=500)
             else:
@@ -125,7 +161,7 @@ async def a2a_server_register(request: Request):
 
         # 生成语义向量
         semantic_json_str, semantic_json_embedding = \
-                    a2a_server_registry.gen_semantic_embedding_from_agent_card(request_id, agent_card_json_str)
+                    await a2a_server_registry.gen_semantic_embedding_from_agent_card(request_id, agent_card_json_str)
         if not semantic_json_str or not semantic_json_embedding:
             logger.error(f"request_id:{request_id}, generate semantic embedding fail!")
             return JSONResponse(content={"text": "服务器内部错误，请稍后再试"}, status_code=500)
@@ -135,7 +171,7 @@ async def a2a_server_register(request: Request):
         url = agent_card_json['url']
         version = agent_card_json['version']
         
-        succ = a2a_server_op.insert(
+        succ = await a2a_server_op.insert_async(
             request_id,
             user_id,
             a2a_server_url,
@@ -236,6 +272,7 @@ async def a2a_server_register(request: Request):
 @app.websocket("/agent-space/agent_space_chat_stream")
 async def agent_space_chat_stream(websocket: WebSocket):
     await websocket.accept()
+    message_sink = None
     try:
         # 1. 等待前端发送初始请求参数
         data = await websocket.receive_json()
@@ -263,13 +300,14 @@ async def agent_space_chat_stream(websocket: WebSocket):
         await websocket.send_json({"event": AGUI_EVENT.RUN_STARTED})
 
         # 保存会话列表（侧边栏用）
-        if chat_list_op.insert_chat(thread_id, request_id, user_id, text_input) == 1:
+        if await chat_list_op.insert_chat_async(thread_id, request_id, user_id, text_input) == 1:
             await websocket.send_json({"event": AGUI_EVENT.CHAT_LIST_UPDATED})
 
-        # 保存会话消息（聊天区用）
+        # 保存会话消息（聊天区用），写后缓冲批量入库
+        message_sink = ChatMessageSink(request_id, thread_id, user_id)
         for file_id in file_id_list:
             if file_id:
-                user_message = json.dumps({
+                message_sink.add({
                     "role": "user",
                     "event": AGUI_EVENT.FILE_ID_STRING,
                     "source": "",
@@ -277,10 +315,8 @@ async def agent_space_chat_stream(websocket: WebSocket):
                     "provider_url": "",
                     "content_type": "file", 
                     "content":file_id,
-                }, ensure_ascii=False)
-                message_id = str(uuid.uuid4())
-                chat_message_op.insert_message(thread_id, request_id, user_id, message_id, user_message)
-        user_message = json.dumps({
+                })
+        message_sink.add({
             "role": "user",
             "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK,
             "source": "",
@@ -288,67 +324,39 @@ async def agent_space_chat_stream(websocket: WebSocket):
             "provider_url": "",
             "content_type": "text", 
             "content":text_input,
-        }, ensure_ascii=False)
-        message_id = str(uuid.uuid4())
-        chat_message_op.insert_message(thread_id, request_id, user_id, message_id, user_message)
+        })
 
-        # 2. 启动主任务（流式输出）
-        stop_requested = False
-        
+        # 2. agent输出（生成器链）由producer任务产出并放入发送队列，stop或断开时取消该任务，
+        #    取消会立即传递到最内层的await（包括上游a2a的http流），各层async with/finally随之释放资源
         async def stream_agent_answer():
-            nonlocal stop_requested
-            
-            # 创建停止检查函数
-            async def check_stop():
-                nonlocal stop_requested
-                try:
-                    msg = await asyncio.wait_for(websocket.receive_json(), timeout=0.01)
-                    logger.info(f"request_id:{request_id}, received message in stream: {msg}")
-                    if msg.get("action") == "stop":
-                        logger.info(f"request_id:{request_id}, user stop the task in stream")
-                        stop_requested = True
-                        return True
-                except asyncio.TimeoutError:
-                    pass
-                except Exception as e:
-                    logger.error(f"request_id:{request_id}, check_stop error: {e}")
-                return False
-            
             if config.USE_OS_AGENT:
-                async for chunk in multi_agent_graph.invoke_stream(thread_id, request_id, user_id, text_input, file_id_list, agent_name, agent_org):
-                    if await check_stop():
-                        return
-                    logger.info(f"thread_id:{thread_id}, request_id:{request_id}, answered by os agent, answer is 【{chunk}】")
-                    # {
-                    #     "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK,
-                    #     "source": "agent",
-                    #     "agent_id": agent_id,
-                    #     "provider_url": provider_url,
-                    #     "content_type": "text", 
-                    #     "content":content,
-                    # }
-                    chunk["role"] = "assistant"
-                    message_id = str(uuid.uuid4())
-                    assistant_message = json.dumps(chunk, ensure_ascii=False)
-                    chat_message_op.insert_message(thread_id, request_id, user_id, message_id, assistant_message)
-                    
-                    yield chunk
+                async with aclosing(multi_agent_graph.invoke_stream(thread_id, request_id, user_id, text_input, file_id_list, agent_name, agent_org)) as stream:
+                    async for chunk in stream:
+                        logger.info(f"thread_id:{thread_id}, request_id:{request_id}, answered by os agent, answer is 【{chunk}】")
+                        # {
+                        #     "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK,
+                        #     "source": "agent",
+                        #     "agent_id": agent_id,
+                        #     "provider_url": provider_url,
+                        #     "content_type": "text", 
+                        #     "content":content,
+                        # }
+                        chunk["role"] = "assistant"
+                        message_sink.add(chunk)
+                        
+                        yield chunk
                          
             else:
                 # ---------用户指定agent---------
                 if agent_name:
-                    if await check_stop():
-                        return
                     yield {
                             "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK, 
                             "message_type": STREAM_MESSAGE_TYPE.REASONING, 
                             "content": (f"检测到指定了agent@{agent_name}" + f"|{agent_org}" if agent_org else "") + "，我将使用指定的agent完成任务\n"
                         }
-                    a2a_server_url_list = a2a_server_op.select_agent_card_url(request_id, agent_name, agent_org)
+                    a2a_server_url_list = await a2a_server_op.select_agent_card_url_async(request_id, agent_name, agent_org)
                     if len(a2a_server_url_list) <= 0:
                         logger.warning(f"request_id:{request_id}, there are {len(a2a_server_url_list)} agents with name '{agent_name}' and org '{agent_org}'")
-                        if await check_stop():
-                            return
                         yield {
                                 "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK, 
                                 "message_type": STREAM_MESSAGE_TYPE.WARNING,
@@ -356,8 +364,6 @@ async def agent_space_chat_stream(websocket: WebSocket):
                             }
                     elif len(a2a_server_url_list) > 1:
                         logger.warning(f"request_id:{request_id}, there are {len(a2a_server_url_list)} agents with name '{agent_name}' and org '{agent_org}'")
-                        if await check_stop():
-                            return
                         yield {
                                 "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK,
                                 "message_type": STREAM_MESSAGE_TYPE.WARNING,
@@ -366,8 +372,6 @@ async def agent_space_chat_stream(websocket: WebSocket):
                     
                     if len(a2a_server_url_list) > 0 and a2a_server_url_list[0]:
                         final_a2a_server_url = a2a_server_url_list[0]
-                        if await check_stop():
-                            return
                         yield {
                                 "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK,
                                 "message_type": STREAM_MESSAGE_TYPE.REASONING, 
@@ -375,62 +379,45 @@ async def agent_space_chat_stream(websocket: WebSocket):
                             }
                         file_metadata_list = []
                         for file_id in file_id_list:
-                            if stop_requested:
-                                return
-                            filename, mime_type, size = file_op.get_file_metadata_by_id(request_id, file_id)
+                            filename, mime_type, size = await file_op.get_file_metadata_by_id_async(request_id, file_id)
                             file_metadata_list.append([file_id, filename, mime_type, size])
                         
-                        # 在调用 a2a server 前检查停止信号
-                        if await check_stop():
-                            return
-                        
-                        # 假设 get_a2a_server_rsp_with_url 支持流式生成器
-                        async for chunk in a2a_util.get_a2a_server_rsp_with_url_stream(request_id, final_a2a_server_url, text_input, file_metadata_list):
-                            if stop_requested:
-                                return
-                            msg_type, text_msg, file_id_msg = chunk
-                            if text_msg:
-                                if await check_stop():
-                                    return
-                                yield {
-                                    "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK, 
-                                    "message_type": msg_type, 
-                                    "content": text_msg
-                                }
-                            if file_id_msg:
-                                if await check_stop():
-                                    return
-                                yield {
-                                    "event": AGUI_EVENT.FILE_ID_STRING, 
-                                    "message_type": msg_type, 
-                                    "content": file_id_msg
-                                }
+                        async with aclosing(a2a_util.get_a2a_server_rsp_with_url_stream(request_id, final_a2a_server_url, text_input, file_metadata_list)) as stream:
+                            async for chunk in stream:
+                                msg_type, text_msg, file_id_msg = chunk
+                                if text_msg:
+                                    yield {
+                                        "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK, 
+                                        "message_type": msg_type, 
+                                        "content": text_msg
+                                    }
+                                if file_id_msg:
+                                    yield {
+                                        "event": AGUI_EVENT.FILE_ID_STRING, 
+                                        "message_type": msg_type, 
+                                        "content": file_id_msg
+                                    }
 
                         return
 
                 # ---------规划阶段---------
                 answered = -1
                 
-                # 在调用 LLM 前检查停止信号
-                if await check_stop():
-                    return
-                    
-                async for chunk in plan.answer_by_llm_stream(request_id, text_input):
-                    msg_type, text_msg, has_answer = chunk
-                    if answered != 1 and has_answer != -1:
-                        if has_answer == 1:
-                            answered = 1
-                        elif has_answer == 0:
-                            answered = 0
-                    if text_msg:
-                        if await check_stop():
-                            return
-                        yield {
-                            "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK, 
-                            "message_type": msg_type, 
-                            "content": text_msg
-                        }
-                    logger.info(f"request_id:{request_id}, answered by LLM, answer is 【{text_msg}】")
+                async with aclosing(plan.answer_by_llm_stream(request_id, text_input)) as stream:
+                    async for chunk in stream:
+                        msg_type, text_msg, has_answer = chunk
+                        if answered != 1 and has_answer != -1:
+                            if has_answer == 1:
+                                answered = 1
+                            elif has_answer == 0:
+                                answered = 0
+                        if text_msg:
+                            yield {
+                                "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK, 
+                                "message_type": msg_type, 
+                                "content": text_msg
+                            }
+                        logger.info(f"request_id:{request_id}, answered by LLM, answer is 【{text_msg}】")
                 
                 
                 
@@ -438,64 +425,82 @@ async def agent_space_chat_stream(websocket: WebSocket):
                     return
                 
                 # ---------执行阶段---------
-                # 在调用执行阶段前检查停止信号
-                if await check_stop():
-                    return
-                
-                async for chunk in execute.a2a_server_execute_stream(request_id, text_input, file_id_list, agent_name, agent_org):
-                    if await check_stop():
-                        return
-                    msg_type, text_msg, file_id_msg = chunk
-                    if text_msg:
-                        if await check_stop():
-                            return
-                        yield {
-                            "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK, 
-                            "message_type": msg_type, 
-                            "content": text_msg
-                        }
-                    if file_id_msg:
-                        if await check_stop():
-                            return
-                        yield {
-                            "event": AGUI_EVENT.FILE_ID_STRING, 
-                            "message_type": msg_type, 
-                            "content": file_id_msg
-                        }
-                    logger.info(f"request_id:{request_id}, answered by a2a server, answer is 【{text_msg}】")
+                async with aclosing(execute.a2a_server_execute_stream(request_id, text_input, file_id_list, agent_name, agent_org)) as stream:
+                    async for chunk in stream:
+                        msg_type, text_msg, file_id_msg = chunk
+                        if text_msg:
+                            yield {
+                                "event": AGUI_EVENT.TEXT_MESSAGE_CHUNK, 
+                                "message_type": msg_type, 
+                                "content": text_msg
+                            }
+                        if file_id_msg:
+                            yield {
+                                "event": AGUI_EVENT.FILE_ID_STRING, 
+                                "message_type": msg_type, 
+                                "content": file_id_msg
+                            }
+                        logger.info(f"request_id:{request_id}, answered by a2a server, answer is 【{text_msg}】")
 
-        # 3. 使用单一任务处理流式输出
-        async def process_messages():
-            nonlocal stop_requested
-            
+        # 3. 读写分离：producer产出事件 -> outbound队列 -> writer发送；reader只负责接收控制消息（stop）
+        #    三者互不阻塞，chunk之间不再轮询websocket
+        outbound: asyncio.Queue = asyncio.Queue(maxsize=config.CHAT_STREAM_SEND_QUEUE_SIZE)
+        stop_requested = False
+
+        async def produce():
             logger.info(f"request_id:{request_id}, starting stream processing...")
             try:
-                async for event in stream_agent_answer():
-                    if stop_requested:
-                        logger.info(f"request_id:{request_id}, stream cancelled by stop signal")
-                        break
-                    
-                    logger.info(f"request_id:{request_id}, send event: {event}")
-                    await websocket.send_json(event)
-                
-                if not stop_requested:
-                    await websocket.send_json({"event": AGUI_EVENT.RUN_FINISHED})
-                else:
-                    logger.info(f"request_id:{request_id}, stream cancelled, return RUN_CANCEL event")
-                    await websocket.send_json({"event": AGUI_EVENT.RUN_CANCEL})
-                    
-            except WebSocketDisconnect:
-                logger.info(f"request_id:{request_id}, WebSocket disconnected during stream")
-            except Exception as e:
-                logger.error(f"request_id:{request_id}, stream processing error: {e}")
-                if not stop_requested:
-                    try:
-                        await websocket.send_json({"event": AGUI_EVENT.RUN_ERROR})
-                    except:
-                        pass
-        
-        # 启动消息处理
-        await process_messages()
+                async with aclosing(stream_agent_answer()) as stream:
+                    async for event in stream:
+                        await outbound.put(event)
+                await outbound.put({"event": AGUI_EVENT.RUN_FINISHED})
+            except Exception:
+                logger.error(f"request_id:{request_id}, stream processing error: {traceback.format_exc()}")
+                await outbound.put({"event": AGUI_EVENT.RUN_ERROR})
+            await outbound.put(None)
+
+        async def write():
+            while (event := await outbound.get()) is not None:
+                logger.info(f"request_id:{request_id}, send event: {event}")
+                await websocket.send_json(event)
+
+        async def read():
+            nonlocal stop_requested
+            while True:
+                try:
+                    msg = await websocket.receive_json()
+                except ValueError:
+                    logger.warning(f"request_id:{request_id}, received non-json message in stream, ignored")
+                    continue
+                logger.info(f"request_id:{request_id}, received message in stream: {msg}")
+                if isinstance(msg, dict) and msg.get("action") == "stop":
+                    logger.info(f"request_id:{request_id}, user stop the task in stream")
+                    stop_requested = True
+                    return
+
+        producer = asyncio.create_task(produce())
+        writer = asyncio.create_task(write())
+        reader = asyncio.create_task(read())
+        try:
+            await asyncio.wait([writer, reader], return_when=asyncio.FIRST_COMPLETED)
+            if reader.done() and not stop_requested:
+                reader.result()  # 连接断开，抛出WebSocketDisconnect
+            if stop_requested:
+                # 立即取消生成器链，丢弃未发送的事件，writer发完当前事件后发送RUN_CANCEL
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+                while not outbound.empty():
+                    outbound.get_nowait()
+                logger.info(f"request_id:{request_id}, stream cancelled, return RUN_CANCEL event")
+                outbound.put_nowait({"event": AGUI_EVENT.RUN_CANCEL})
+                outbound.put_nowait(None)
+            await writer
+        except WebSocketDisconnect:
+            logger.info(f"request_id:{request_id}, WebSocket disconnected during stream")
+        finally:
+            for task in (producer, writer, reader):
+                task.cancel()
+            await asyncio.gather(producer, writer, reader, return_exceptions=True)
     except WebSocketDisconnect:
         logger.info(f"request_id:{request_id}, WebSocket disconnected")
     except Exception as e:
@@ -504,13 +509,62 @@ async def agent_space_chat_stream(websocket: WebSocket):
             await websocket.send_json({"event": AGUI_EVENT.RUN_ERROR, "error": "服务器内部错误，请稍后再试"})
         except:
             pass
+    finally:
+        # 正常结束、停止、断开都要写完缓冲的消息；shield避免处理协程被取消时丢消息
+        if message_sink is not None:
+            await asyncio.shield(message_sink.aclose())
+
+
+async def proxy_file_reference(request_id: str, file_id: str, mime_type: str, source_uri: str, content_disposition: str):
+    """
+    流式转发上游文件，边转发边累积，完整下载且不超过FILE_REFERENCE_CACHE_MAX_SIZE时写回数据库
+    """
+    client = http_client.get_http_client()
+    upstream = await client.send(client.build_request("GET", source_uri), stream=True)
+    if upstream.status_code != 200:
+        await upstream.aclose()
+        logger.error(f"request_id:{request_id}, file_id:{file_id}, upstream {source_uri} status:{upstream.status_code}")
+        return JSONResponse(content={"error": "文件源不可用"}, status_code=502)
+
+    logger.info(f"request_id:{request_id}, file_id:{file_id}, proxy upstream {source_uri}")
+
+    async def upstream_iterator():
+        cache = bytearray() if config.FILE_REFERENCE_CACHE else None
+        completed = False
+        try:
+            async for chunk in upstream.aiter_bytes():
+                if cache is not None:
+                    cache += chunk
+                    if len(cache) > config.FILE_REFERENCE_CACHE_MAX_SIZE:
+                        cache = None
+                yield chunk
+            completed = True
+        finally:
+            await upstream.aclose()
+        if completed and cache:
+            await file_op.cache_file_content_async(request_id, file_id, len(cache), bytes(cache))
+
+    headers = {
+        "Content-Disposition": content_disposition,
+        "X-File-ID": file_id,
+        "Content-Type": mime_type,
+        "Cache-Control": "no-cache",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "GET",
+        "Access-Control-Allow-Headers": "Content-Type"
+    }
+    # 上游有压缩时aiter_bytes返回解压后的内容，长度与Content-Length不一致，不透传
+    if upstream.headers.get("Content-Length") and not upstream.headers.get("Content-Encoding"):
+        headers["Content-Length"] = upstream.headers["Content-Length"]
+
+    return StreamingResponse(upstream_iterator(), media_type=mime_type, headers=headers)
 
 
 @app.get("/agent-space/download_file/{file_id}")
-async def download_file(file_id: str):
+async def download_file(file_id: str, request: Request):
     """
     异步文件下载接口
-    支持客户端异步下载文件，提供更好的并发性能
+    按块从数据库流式读取，支持Range/If-Range（206），视频可拖动、下载可断点续传
     """
     request_id = str(uuid.uuid4())
     logger.info(f"got /agent-space/download_file request, request_id:{request_id}, file_id:{file_id}")
@@ -520,38 +574,82 @@ async def download_file(file_id: str):
         return JSONResponse(content={"error": "文件ID不能为空"}, status_code=400)
 
     try:
-        # 从数据库异步读取文件
-        filename, mime_type, file_size, content = await file_op.get_file_by_id_async(request_id, file_id)
-        if not mime_type or not content:
-            logger.error(f"request_id:{request_id}, file_id:{file_id}, file not found or empty")
+        # 只读取元数据，内容按需分块读取
+        meta = await file_op.get_file_meta_async(request_id, file_id)
+        if meta is None or not meta.mime_type:
+            logger.error(f"request_id:{request_id}, file_id:{file_id}, file not found")
             return JSONResponse(content={"error": "文件不存在或为空"}, status_code=404)
 
-        logger.info(f"request_id:{request_id}, file_id:{file_id}, size:{file_size}")
-        filename_urlencoded = urllib.parse.quote(filename)
+        filename_urlencoded = urllib.parse.quote(meta.filename)
         content_disposition = f"attachment; filename*=UTF-8''{filename_urlencoded}"
+        if not meta.has_content and meta.source_uri: # 尚未缓存的文件引用，流式代理上游
+            return await proxy_file_reference(request_id, file_id, meta.mime_type, meta.source_uri, content_disposition)
+
+        if not meta.has_content or meta.size <= 0:
+            logger.error(f"request_id:{request_id}, file_id:{file_id}, file empty")
+            return JSONResponse(content={"error": "文件不存在或为空"}, status_code=404)
 
-        async def file_iterator(data: bytes, chunk_size: int = 8192):
-            """异步文件迭代器，支持流式传输"""
-            for i in range(0, len(data), chunk_size):
-                yield data[i:i+chunk_size]
-                # 让出控制权给其他协程，提高并发性能
-                await asyncio.sleep(0)
+        blob_store = get_blob_store()
+        local_path = blob_store.local_path(meta.storage_key) if blob_store and meta.storage_key else None
+        if local_path: # 本地blob存储，FileResponse零拷贝发送，Range/If-Range由starlette处理
+            logger.info(f"request_id:{request_id}, file_id:{file_id}, size:{meta.size}, send local blob")
+            return FileResponse(
+                local_path,
+                media_type=meta.mime_type,
+                content_disposition_type="attachment",
+                filename=meta.filename or None,
+                headers={
+                    "X-File-ID": file_id,
+                    "Cache-Control": "no-cache",
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Methods": "GET",
+                    "Access-Control-Allow-Headers": "Content-Type, Range, If-Range",
+                    "Access-Control-Expose-Headers": "Content-Range, Accept-Ranges, ETag, Content-Length"
+                }
+            )
+
+        # 文件id对应的内容不会变化，直接用文件id作为ETag
+        etag = f'"{file_id}"'
+        last_modified = email.utils.format_datetime(meta.created_at.astimezone(timezone.utc), usegmt=True) if meta.created_at else ""
+        headers = {
+            "Content-Disposition": content_disposition,
+            "X-File-ID": file_id,
+            "Content-Type": meta.mime_type,
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET",
+            "Access-Control-Allow-Headers": "Content-Type, Range, If-Range",
+            "Access-Control-Expose-Headers": "Content-Range, Accept-Ranges, ETag, Content-Length"
+        }
+        if last_modified:
+            headers["Last-Modified"] = last_modified
+
+        start, end, status_code = 0, meta.size - 1, 200
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if range_header and (not if_range or if_range in (etag, last_modified)):
+            byte_range = file_util.parse_range(range_header, meta.size)
+            if byte_range is None:
+                logger.warning(f"request_id:{request_id}, file_id:{file_id}, range not satisfiable: {range_header}")
+                return JSONResponse(content={"error": "请求范围无效"}, status_code=416,
+                                    headers={"Content-Range": f"bytes */{meta.size}"})
+            start, end = byte_range
+            if (start, end) != (0, meta.size - 1):
+                status_code = 206
+                headers["Content-Range"] = f"bytes {start}-{end}/{meta.size}"
+
+        headers["Content-Length"] = str(end - start + 1)
+        logger.info(f"request_id:{request_id}, file_id:{file_id}, size:{meta.size}, range:{start}-{end}")
 
         return StreamingResponse(
-            file_iterator(content),
-            media_type=mime_type,
-            headers={
-                "Content-Disposition": content_disposition,
-                "X-File-ID": file_id,
-                "Content-Length": str(file_size),
-                "Content-Type": mime_type,
-                "Cache-Control": "no-cache",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET",
-                "Access-Control-Allow-Headers": "Content-Type"
-            }
+            file_op.iter_file_content_async(request_id, file_id, meta, start, end),
+            status_code=status_code,
+            media_type=meta.mime_type,
+            headers=headers
         )
-        
+
     except Exception as e:
         logger.error(f"request_id:{request_id}, file_id:{file_id}, download failed: {traceback.format_exc()}")
         return JSONResponse(content={"error": "文件下载失败"}, status_code=500)
@@ -574,8 +672,7 @@ async def upload_file(file: UploadFile = File(...)):
 
     try:
         filename = os.path.basename(file.filename)
-        file_data = await file.read()
-        file_size = len(file_data)
+        file_size = file.size or 0
         mime_type = file.content_type
         if not mime_type:
             mime_type, _ = mimetypes.guess_type(filename)
@@ -583,8 +680,8 @@ async def upload_file(file: UploadFile = File(...)):
                 mime_type = 'application/octet-stream'
         logger.info(f"request_id:{request_id}, file to upload is {filename}, mime_type is {mime_type}")
 
-        # 写入数据库
-        if file_op.insert_file(request_id, request_id, filename, mime_type, file_size, file_data):
+        # 上传内容已在临时文件中，逐块哈希/写入，不整体读入内存
+        if await asyncio.to_thread(file_op.insert_file_stream, request_id, request_id, filename, mime_type, file_size, file.file):
             return JSONResponse(content={"file_id": request_id}, status_code=200)
         else:
             return JSONResponse(content={'error': '上传失败'}, status_code=500)
@@ -606,9 +703,9 @@ async def show_agents(user_id: str | None = None):
                 logger.warning(f"request_id:{request_id}, user_id is null")
                 return JSONResponse(content=[], status_code=200)
             
-            agent_card_str_list = a2a_server_op.get_latest_registered_by_user(request_id, user_id)
+            agent_card_str_list = await a2a_server_op.get_latest_registered_by_user_async(request_id, user_id)
         else:
-            agent_card_str_list = a2a_server_op.get_latest_registered(request_id)
+            agent_card_str_list = await a2a_server_op.get_latest_registered_async(request_id)
         
         for agent_card_str in agent_card_str_list:
             agent_card_json = json.loads(agent_card_str)
@@ -641,20 +738,24 @@ async def search_agent(request: Request):
         logger.info(f"request_id:{request_id}, got /agent-space/search_agent request, text_input={text_input}")
         
         # 用户query转成向量
-        d_embeded = text_embedding.embed_text(text_input)
-        d_embeded = json.loads(d_embeded)
-        e_vec = d_embeded["data"][0]["embedding"]
+        e_vec = await text_embedding.embed_text_async(text_input)
 
         # 向量检索
-        retrieve_res = a2a_server_op.vector_retrieve(request_id, str(e_vec))
+        retrieve_res = await a2a_server_op.vector_retrieve_async(request_id, e_vec)
+        retrieve_res = agent_health.filter_available(request_id, retrieve_res or [])
         if retrieve_res is None or len(retrieve_res) <= 0:
             return JSONResponse(content={'text': '服务器内容错误，请稍后再试'}, status_code=500)
         
         # 大模型排序
-        rank_idx  = llm_ranker.rank_agent_card(request_id, text_input, retrieve_res)
+        rank_idx  = await ranker.rank_agent_card(request_id, 
+                                            text_input, 
+                                            [item.agent_card_json_str for item in retrieve_res],
+                                            [item.semantic_json_str for item in retrieve_res],
+                                            candidate_urls=[item.a2a_server_url for item in retrieve_res],
+                                            query_embedding=e_vec)
         if rank_idx < 0 or rank_idx >= len(retrieve_res):
             return JSONResponse(content={'text': '搜索失败，请稍后再试'}, status_code=500)
-        retrieved_agent = json.loads(retrieve_res[rank_idx])
+        retrieved_agent = json.loads(retrieve_res[rank_idx].agent_card_json_str)
 
         logger.info(f"request_id:{request_id}, search agent succeed, retrieved agent card: {retrieved_agent}")
         
@@ -683,9 +784,9 @@ async def search_agent_by_prefix(request: Request):
         
         logger.info(f"request_id:{request_id}, user_id:{user_id}, got /agent-space/agent_space_chat/search_agent_by_prefix request, prefix:{prefix}")
 
-        agent_name_org_list = a2a_server_op.select_agent_name_org_by_prefix(request_id, prefix, config.AGENT_PREFIX_RECOMMEND_NUM)
+        agent_name_org_list = await a2a_server_op.select_agent_name_org_by_prefix_async(request_id, prefix, config.AGENT_PREFIX_RECOMMEND_NUM)
         if len(agent_name_org_list) < config.AGENT_PREFIX_RECOMMEND_NUM:
-            agent_name_org_list += a2a_server_op.select_agent_name_org_by_similarity(
+            agent_name_org_list += await a2a_server_op.select_agent_name_org_by_similarity_async(
                                                 request_id, 
                                                 prefix, 
                                                 config.AGENT_PREFIX_RECOMMEND_NUM - len(agent_name_org_list)
@@ -702,28 +803,77 @@ async def search_agent_by_prefix(request: Request):
     return JSONResponse(content=[], status_code=500)
 
 
+@app.get('/agent-space/stats/embedding_cache')
+async def embedding_cache_stats():
+    return JSONResponse(content=text_embedding.get_cache_stats(), status_code=200)
+
+
+@app.get('/agent-space/stats/rank_cache')
+async def rank_cache_stats():
+    return JSONResponse(content=rank_cache.agent_rank_cache.stats(), status_code=200)
+
+
+@app.get('/agent-space/stats/circuit_breakers')
+async def circuit_breaker_stats():
+    return JSONResponse(content=circuit_breaker.stats(), status_code=200)
+
+
+@app.get('/agent-space/stats/agent_health')
+async def agent_health_stats():
+    return JSONResponse(content=agent_health.stats(), status_code=200)
+
+
+@app.get('/agent-space/stats/history_cache')
+async def history_cache_stats():
+    return JSONResponse(content={
+        "chat_list": history_cache.chat_list_cache.stats(),
+        "message_list": history_cache.message_list_cache.stats(),
+    }, status_code=200)
+
+
+@app.get('/agent-space/stats/agent_card_cache')
+async def agent_card_cache_stats():
+    return JSONResponse(content=agent_card_cache.agent_card_cache.stats(), status_code=200)
+
+
+def _history_page_response(items: list, next_cursor: str | None) -> JSONResponse:
+    """响应体保持为列表，下一页游标放在X-Next-Cursor响应头中（没有更多时不返回该头）"""
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return JSONResponse(content=items, status_code=200, headers=headers)
+
+
 @app.get('/agent-space/get_chat_list/{user_id}')
-async def get_chat_list(user_id: str):
+async def get_chat_list(user_id: str, cursor: str | None = None, limit: int = config.CHAT_LIST_PAGE_SIZE):
     request_id = str(uuid.uuid4())
-    logger.info(f"got /agent-space/get_chat_list request, request_id:{request_id}, user_id:{user_id}")
+    logger.info(f"got /agent-space/get_chat_list request, request_id:{request_id}, user_id:{user_id}, cursor:{cursor}, limit:{limit}")
 
     if not user_id or user_id == 'null':
         logger.warning(f"request_id:{request_id}, can't get user id")
         return JSONResponse(content=[], status_code=200)
 
-    chat_list = chat_list_op.get_chat_list(request_id, user_id)
+    limit = max(1, min(limit, config.CHAT_LIST_MAX_PAGE_SIZE))
+    try:
+        chat_list, next_cursor = await chat_list_op.get_chat_list_async(request_id, user_id, cursor, limit)
+    except InvalidCursorError:
+        logger.warning(f"request_id:{request_id}, invalid cursor:{cursor}")
+        return JSONResponse(content={'text': 'invalid cursor'}, status_code=400)
 
-    return JSONResponse(content=chat_list, status_code=200)
+    return _history_page_response(chat_list, next_cursor)
 
 
 @app.get('/agent-space/get_message_list/{thread_id}')
-async def get_message_list(thread_id: str):
+async def get_message_list(thread_id: str, cursor: str | None = None, limit: int = config.CHAT_MESSAGE_PAGE_SIZE):
     request_id = str(uuid.uuid4())
-    logger.info(f"got /agent-space/get_message_list request, request_id:{request_id}, thread_id:{thread_id}")
+    logger.info(f"got /agent-space/get_message_list request, request_id:{request_id}, thread_id:{thread_id}, cursor:{cursor}, limit:{limit}")
 
-    message_list = chat_message_op.get_message_list(request_id, thread_id)
+    limit = max(1, min(limit, config.CHAT_MESSAGE_MAX_PAGE_SIZE))
+    try:
+        message_list, next_cursor = await chat_message_op.get_message_list_async(request_id, thread_id, cursor, limit)
+    except InvalidCursorError:
+        logger.warning(f"request_id:{request_id}, invalid cursor:{cursor}")
+        return JSONResponse(content={'text': 'invalid cursor'}, status_code=400)
 
-    return JSONResponse(content=message_list, status_code=200)
+    return _history_page_response(message_list, next_cursor)
 
 
 @app.post('/agent-space-auth/send_code')
@@ -741,7 +891,7 @@ async def send_code(request: Request):
         code = str(random.randint(100000, 999999))
         # code = '000000'
         if auth_util.send_code_message(to_mail, code) \
-            and auth_op.insert_auth_code(request_id, to_mail, code):
+            and await auth_op.insert_auth_code_async(request_id, to_mail, code):
             return JSONResponse(content={'text': '验证码发送成功'}, status_code=200)
         else:
             return JSONResponse(content={'text': '验证码发送失败'}, status_code=500)
@@ -764,9 +914,9 @@ async def verify(request: Request):
 
         logger.info(f"got /agent-space-auth/verify request, request_id:{request_id}, to_mail:{to_mail}, code:{code}")
 
-        if auth_op.verify(request_id, to_mail, code):
+        if await auth_op.verify_async(request_id, to_mail, code):
             logger.info(f"request_id:{request_id}, to_mail:{to_mail}, code:{code}, verify code success")
-            user_op.insert(request_id, to_mail, to_mail)
+            await user_op.insert_async(request_id, to_mail, to_mail)
             return JSONResponse(content={'verify_succeed': True, 'user_id': to_mail, 'text': '验证码验证成功'}, status_code=200)
         else:
             logger.info(f"request_id:{request_id}, to_mail:{to_mail}, code:{code}, verify code failed")
@@ -12,8 +12,71 @@ EXTENDED_AGENT_CARD_PATH = '/agent/authenticatedExtendedCard'
 A2A_SERVER_RETRIEVE_NUM = 10
 A2A_SERVER_RETRIEVE_COSIN_THRES = 1.0
 
+# 进程内共享的httpx连接池
+HTTP_CLIENT_HTTP2                     = True   # 需安装httpx[http2]，未安装时回退HTTP/1.1
+HTTP_CLIENT_TIMEOUT                   = 60     # 秒，默认超时
+HTTP_CLIENT_CONNECT_TIMEOUT           = 10
+HTTP_CLIENT_MAX_CONNECTIONS           = 200
+HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS = 50
+HTTP_CLIENT_KEEPALIVE_EXPIRY          = 60
+# agent卡片缓存：新鲜期取Cache-Control max-age与TTL的较小值，过期后在stale-while-revalidate期限内先返回旧卡片并后台刷新
+AGENT_CARD_FETCH_TIMEOUT                = 10
+AGENT_CARD_CACHE_SIZE                   = 1024
+AGENT_CARD_CACHE_TTL                    = 300
+AGENT_CARD_CACHE_STALE_WHILE_REVALIDATE = 3600
+
+# agent调用准入：每个agent的并发上限与排队超时、滚动窗口熔断（首包超过AGENT_BREAKER_SLOW_CALL_SECONDS也计为失败）
+A2A_CALL_READ_TIMEOUT           = 300   # 秒，两次收到数据之间的最长间隔，替代原来的1000秒
+AGENT_CALL_MAX_INFLIGHT         = 32
+AGENT_CALL_QUEUE_TIMEOUT        = 5     # 秒
+AGENT_BREAKER_WINDOW_SECONDS    = 60
+AGENT_BREAKER_MIN_CALLS         = 5
+AGENT_BREAKER_FAILURE_RATE      = 0.5
+AGENT_BREAKER_SLOW_CALL_SECONDS = 60
+AGENT_BREAKER_OPEN_SECONDS      = 30
+
+# agent健康探测：定时拉取卡片记录延迟/可用性，卡片变化时刷新入库；连续失败AGENT_HEALTH_DOWN_FAILURES次判定下线
+USE_AGENT_HEALTH_PROBE          = True
+AGENT_HEALTH_PROBE_INTERVAL     = 60    # 秒
+AGENT_HEALTH_PROBE_TIMEOUT      = 10    # 秒
+AGENT_HEALTH_PROBE_CONCURRENCY  = 16
+AGENT_HEALTH_DOWN_FAILURES      = 3
+AGENT_HEALTH_SLOW_LATENCY_MS    = 3000  # 超过该延迟开始在本地排序中降权，2倍时降权最大
+AGENT_HEALTH_LATENCY_EWMA_ALPHA = 0.3
+AGENT_HEALTH_FILTER_UNHEALTHY   = True  # 检索结果中过滤已判定下线的agent
+
+# 混合检索：向量召回 + pg_trgm字面召回，RRF融合后取A2A_SERVER_RANK_CANDIDATE_NUM个候选送给排序
+USE_HYBRID_RETRIEVE            = True
+A2A_SERVER_RANK_CANDIDATE_NUM  = 5
+A2A_SERVER_LEXICAL_SIM_THRES   = 0.3
+A2A_SERVER_RRF_K               = 60
+# 非a2a_server表来源的agent卡片，其语义json的LRU缓存条数
+SEMANTIC_JSON_CACHE_SIZE       = 1024
+# agent语义向量的检索存储方式：
+#   vector : 全精度向量（默认）
+#   halfvec: 半精度列 + hnsw索引召回，全精度重排（需先执行 python -m database.migrate_embedding_storage halfvec）
+#   binary : 二值量化表达式索引召回，全精度重排（需先执行 python -m database.migrate_embedding_storage binary）
+A2A_SERVER_EMBEDDING_STORAGE = 'vector'
+A2A_SERVER_EMBEDDING_DIM     = 2048
+A2A_SERVER_RESCORE_OVERSAMPLE = 4   # 第一阶段召回数 = 最终数量 * 该倍数
+# 是否使用进程内向量索引检索agent（索引未加载时回退到数据库检索）
+USE_LOCAL_VECTOR_INDEX = True
+# a2a_server表变更订阅：LISTEN/NOTIFY实时推送 + 高水位轮询补漏，用于多worker间同步进程内索引/缓存
+USE_A2A_SERVER_FEED           = True
+A2A_SERVER_FEED_CHANNEL       = 'a2a_server_changes'
+A2A_SERVER_FEED_POLL_INTERVAL = 30  # 秒
+
 PLAN_LLM_MODEL = "deepseek-r1"
 AGENT_CARD_RANK_MODEL = "deepseek-r1"
+# agent卡片排序后端：llm / local / cascade（本地打分置信度不足时才调用大模型）
+AGENT_CARD_RANKER             = "cascade"
+AGENT_CARD_RANK_MARGIN_THRES  = 0.05
+AGENT_CARD_RANK_MIN_SCORE     = 0.3
+AGENT_CARD_LOCAL_RANK_WEIGHTS = {"similarity": 1.0, "keyword": 0.3, "io_mode": 0.2, "health": 0.3}
+# 排序决策缓存（归一化query + 候选集合指纹 -> 选中的agent），候选agent变更时失效
+USE_AGENT_RANK_CACHE          = True
+AGENT_RANK_CACHE_SIZE         = 2048
+AGENT_RANK_CACHE_TTL          = 600  # 秒
 
 
 GEN_IMAGE_SAVE_DIR = f'{os.path.dirname(os.path.abspath(__file__))}/generated_images'
@@ -22,9 +85,57 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx', 'txt'}
 FILE_DOWNLOAD_URI  = "http://207.148.19.172:5001/agent-space/download_file/{file_id}"
 DEFAULT_FILENAME_IN_DATABASE = "default_filename"
 DEFAULT_MIME_TYPE_IN_DATABASE = "default/default_type"
+# agent返回文件拼装时，超过该大小（字节）后从内存转存到临时文件
+ARTIFACT_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+# agent返回文件uri时只登记引用，不在对话中下载入库；首次下载时流式代理上游，不超过上限的文件顺带缓存入库
+USE_FILE_REFERENCE            = True
+FILE_REFERENCE_CACHE          = True
+FILE_REFERENCE_CACHE_MAX_SIZE = 64 * 1024 * 1024
+# 文件分块存储（file_chunks表），下载按块流式读取并支持Range
+USE_FILE_CHUNKS               = True
+FILE_CHUNK_SIZE               = 1024 * 1024
+FILE_READ_BATCH_CHUNKS        = 4    # 每次查询读取的块数
+# 文件内容存储后端（见storage/blob_store.py）：db（存数据库） / local（本地分级目录） / s3（S3兼容对象存储，需安装boto3）
+# local/s3时数据库只保存元数据和storage_key
+FILE_BLOB_STORE               = "local"
+FILE_BLOB_LOCAL_DIR           = f'{os.path.dirname(os.path.abspath(__file__))}/file_blobs'
+FILE_BLOB_S3_ENDPOINT         = os.getenv("FILE_BLOB_S3_ENDPOINT", "")  # 如MinIO: http://127.0.0.1:9000
+FILE_BLOB_S3_BUCKET           = os.getenv("FILE_BLOB_S3_BUCKET", "agent-space-files")
+FILE_BLOB_S3_ACCESS_KEY       = os.getenv("FILE_BLOB_S3_ACCESS_KEY", "")
+FILE_BLOB_S3_SECRET_KEY       = os.getenv("FILE_BLOB_S3_SECRET_KEY", "")
+FILE_BLOB_S3_REGION           = os.getenv("FILE_BLOB_S3_REGION", "")
+USE_FILE_DEDUP                = True  # blob按sha256内容寻址，相同内容只存一份
+# 下载agent返回的文件（共享连接池，流式）
+FILE_DOWNLOAD_TIMEOUT         = 300  # 秒，整体超时
+FILE_DOWNLOAD_MAX_SIZE        = 512 * 1024 * 1024
+FILE_DOWNLOAD_CHUNK_SIZE      = 64 * 1024
 
 AGENT_PREFIX_RECOMMEND_NUM = 5
 
+# 会话消息写后缓冲：缓冲条数达到BATCH_SIZE或距上次写入超过FLUSH_INTERVAL秒时批量写入
+CHAT_MESSAGE_SINK_BATCH_SIZE     = 50
+CHAT_MESSAGE_SINK_FLUSH_INTERVAL = 1.0
+# 流式对话websocket的发送队列长度，发送慢于生成时对agent输出形成背压
+CHAT_STREAM_SEND_QUEUE_SIZE      = 64
+# 会话列表/消息列表按 (created_at, id) 游标分页，请求的limit不超过MAX_PAGE_SIZE
+CHAT_LIST_PAGE_SIZE              = 50
+CHAT_LIST_MAX_PAGE_SIZE          = 200
+CHAT_MESSAGE_PAGE_SIZE           = 200
+CHAT_MESSAGE_MAX_PAGE_SIZE       = 1000
+# 分页结果的进程内缓存，写入会话/消息时失效（多worker时其他worker最多滞后TTL秒）
+USE_CHAT_HISTORY_CACHE           = True
+CHAT_HISTORY_CACHE_SIZE          = 2048  # 缓存的页数
+CHAT_HISTORY_CACHE_TTL           = 60    # 秒
+
+# 向量化批处理配置：在时间窗口内合并并发请求为一次批量调用
+EMBEDDING_BATCH_WINDOW_MS = 5
+EMBEDDING_BATCH_MAX_SIZE  = 10   # text-embedding-v4 单次请求最多10条
+
+# 向量缓存配置：进程内LRU + 磁盘mmap（EMBEDDING_CACHE_DIR为空则不使用磁盘缓存）
+EMBEDDING_CACHE_LRU_SIZE   = 4096
+EMBEDDING_CACHE_DIR        = f'{os.path.dirname(os.path.abspath(__file__))}/embedding_cache'
+EMBEDDING_CACHE_DISK_SLOTS = 16384  # 每个槽位约8KB（2048维float32）
+
 # 是否使用os agent
 USE_OS_AGENT=True
 
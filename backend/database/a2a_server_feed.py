@@ -0,0 +1,151 @@
+import json
+import asyncio
+import traceback
+from datetime import datetime
+from typing import Callable
+from sqlalchemy import text
+
+from utils.log_util import logger
+import config
+from database.db_engine import get_async_engine
+
+# a2a_server表的变更订阅（每个worker一份）
+# 1. LISTEN a2a_server表触发器发出的NOTIFY（见create_tables.sql），实时推送变更
+# 2. 按 created_at/modified_at 高水位定时轮询补漏（监听断线重连期间、未安装触发器时）
+# 订阅者回调签名：callback(op, a2a_server_url, row)，op为INSERT/UPDATE/DELETE，DELETE时row为None
+
+_subscribers: list[Callable[[str, str, dict | None], None]] = []
+_tasks: list[asyncio.Task] = []
+_queue: asyncio.Queue | None = None
+_high_water_mark: datetime | None = None
+
+_ROW_COLUMNS = ("a2a_server_url, agent_card_json_str, semantic_json_str, "
+                    "semantic_json_embedding, "
+                    "GREATEST(created_at, COALESCE(modified_at, created_at)) AS changed_at")
+
+
+def subscribe(callback: Callable[[str, str, dict | None], None]):
+    _subscribers.append(callback)
+
+
+def _dispatch(op: str, a2a_server_url: str, row: dict | None):
+    global _high_water_mark
+    if row and row.get("changed_at") and (_high_water_mark is None or row["changed_at"] > _high_water_mark):
+        _high_water_mark = row["changed_at"]
+    for callback in _subscribers:
+        try:
+            callback(op, a2a_server_url, row)
+        except:
+            logger.error(f"a2a_server feed subscriber {callback} failed, a2a_server_url:{a2a_server_url}, op:{op}: {traceback.format_exc()}")
+
+
+async def _fetch_rows(where: str, params: dict) -> list[dict]:
+    sql = f"SELECT {_ROW_COLUMNS} FROM a2a_server WHERE {where}"
+    async with get_async_engine().connect() as conn:
+        result = await conn.execute(text(sql), params)
+        return [dict(row._mapping) for row in result]
+
+
+async def catch_up(since: datetime | None = None):
+    """拉取高水位（或since）之后新增/修改的记录并推送给订阅者"""
+    global _high_water_mark
+    if _high_water_mark is None:
+        async with get_async_engine().connect() as conn:
+            _high_water_mark = (await conn.execute(text("SELECT NOW()"))).scalar()
+        return
+
+    rows = await _fetch_rows(
+        "GREATEST(created_at, COALESCE(modified_at, created_at)) > :hwm ORDER BY changed_at",
+        {"hwm": since or _high_water_mark}
+    )
+    for row in rows:
+        _dispatch("UPDATE", row["a2a_server_url"], row)
+    if rows:
+        logger.info(f"a2a_server feed caught up {len(rows)} changed agents")
+
+
+def _on_notify(connection, pid, channel, payload):
+    try:
+        _queue.put_nowait(json.loads(payload))
+    except:
+        logger.error(f"a2a_server feed bad notify payload:{payload}")
+
+
+async def _listen_loop():
+    """保持一个LISTEN连接，断线后重连并补漏"""
+    while True:
+        try:
+            async with get_async_engine().connect() as conn:
+                raw_conn = await conn.get_raw_connection()
+                driver_conn = raw_conn.driver_connection
+                await driver_conn.add_listener(config.A2A_SERVER_FEED_CHANNEL, _on_notify)
+                logger.info(f"a2a_server feed listening on channel {config.A2A_SERVER_FEED_CHANNEL}")
+                await catch_up()
+                try:
+                    while not driver_conn.is_closed():
+                        await asyncio.sleep(config.A2A_SERVER_FEED_POLL_INTERVAL)
+                        await driver_conn.execute("SELECT 1")  # 保活，及时发现断线
+                finally:
+                    if not driver_conn.is_closed():
+                        await driver_conn.remove_listener(config.A2A_SERVER_FEED_CHANNEL, _on_notify)
+        except asyncio.CancelledError:
+            raise
+        except:
+            logger.error(f"a2a_server feed listen connection lost, retry later: {traceback.format_exc()}")
+        await asyncio.sleep(5)
+
+
+async def _consume_loop():
+    while True:
+        notice = await _queue.get()
+        op = notice.get("op", "")
+        a2a_server_url = notice.get("a2a_server_url", "")
+        try:
+            if op == "DELETE":
+                _dispatch(op, a2a_server_url, None)
+            else:
+                for row in await _fetch_rows("a2a_server_url = :a2a_server_url", {"a2a_server_url": a2a_server_url}):
+                    _dispatch(op, a2a_server_url, row)
+        except asyncio.CancelledError:
+            raise
+        except:
+            logger.error(f"a2a_server feed apply change failed, notice:{notice}: {traceback.format_exc()}")
+
+
+async def _poll_loop():
+    while True:
+        await asyncio.sleep(config.A2A_SERVER_FEED_POLL_INTERVAL)
+        try:
+            await catch_up()
+        except asyncio.CancelledError:
+            raise
+        except:
+            logger.error(f"a2a_server feed poll failed: {traceback.format_exc()}")
+
+
+async def start() -> datetime | None:
+    """
+    启动监听和轮询，返回启动时的高水位
+    调用方在启动后全量加载缓存，再用catch_up(since=返回值)补上加载期间的变更
+    """
+    global _queue
+    if _tasks:
+        return _high_water_mark
+    _queue = asyncio.Queue()
+    try:
+        await catch_up()  # 初始化高水位
+    except:
+        logger.error(f"a2a_server feed init high water mark failed: {traceback.format_exc()}")
+    _tasks.extend([
+        asyncio.create_task(_listen_loop()),
+        asyncio.create_task(_consume_loop()),
+        asyncio.create_task(_poll_loop()),
+    ])
+    return _high_water_mark
+
+
+async def stop():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -0,0 +1,68 @@
+import traceback
+from sqlalchemy import text
+
+from utils.log_util import logger
+import config
+from database.db_engine import get_async_engine
+
+
+async def upsert_health_async(request_id: str, results: list[dict]) -> bool:
+    """
+    写入一轮探测结果，results中每项包含：a2a_server_url, healthy, latency_ms, error
+    延迟按EWMA累积，连续失败次数在探测成功时清零
+    """
+    if not results:
+        return True
+    sql = ("INSERT INTO a2a_server_health "
+                "(a2a_server_url, healthy, latency_ms, consecutive_failures, success_count, failure_count, last_error, checked_at) "
+            "VALUES (:a2a_server_url, :healthy, :latency_ms, "
+                "CASE WHEN :healthy THEN 0 ELSE 1 END, CASE WHEN :healthy THEN 1 ELSE 0 END, CASE WHEN :healthy THEN 0 ELSE 1 END, "
+                ":error, NOW()) "
+            "ON CONFLICT (a2a_server_url) DO UPDATE SET "
+                "healthy = EXCLUDED.healthy, "
+                "latency_ms = CASE WHEN EXCLUDED.latency_ms IS NULL THEN a2a_server_health.latency_ms "
+                                    "WHEN a2a_server_health.latency_ms IS NULL THEN EXCLUDED.latency_ms "
+                                    "ELSE a2a_server_health.latency_ms * (1 - CAST(:alpha AS DOUBLE PRECISION)) "
+                                        "+ EXCLUDED.latency_ms * CAST(:alpha AS DOUBLE PRECISION) END, "
+                "consecutive_failures = CASE WHEN EXCLUDED.healthy THEN 0 ELSE a2a_server_health.consecutive_failures + 1 END, "
+                "success_count = a2a_server_health.success_count + EXCLUDED.success_count, "
+                "failure_count = a2a_server_health.failure_count + EXCLUDED.failure_count, "
+                "last_error = EXCLUDED.last_error, "
+                "checked_at = EXCLUDED.checked_at")
+    try:
+        async with get_async_engine().begin() as conn:
+            await conn.execute(text(sql), [
+                {
+                    "a2a_server_url": item["a2a_server_url"],
+                    "healthy": item["healthy"],
+                    "latency_ms": item["latency_ms"],
+                    "error": item["error"],
+                    "alpha": config.AGENT_HEALTH_LATENCY_EWMA_ALPHA
+                } for item in results
+            ])
+        return True
+    except:
+        logger.error(f"request_id:{request_id}, upsert a2a server health failed: {traceback.format_exc()}")
+
+    return False
+
+
+async def load_health_async(request_id: str) -> dict[str, dict] | None:
+    sql = ("SELECT a2a_server_url, healthy, latency_ms, consecutive_failures, success_count, failure_count, last_error, checked_at "
+            "FROM a2a_server_health")
+    try:
+        async with get_async_engine().connect() as conn:
+            result = await conn.execute(text(sql))
+            return {row._mapping["a2a_server_url"]: dict(row._mapping) for row in result}
+    except:
+        logger.error(f"request_id:{request_id}, load a2a server health failed: {traceback.format_exc()}")
+
+    return None
+
+
+async def seconds_since_last_probe_async(request_id: str) -> float | None:
+    """距离最近一轮探测的秒数，没有记录时返回None"""
+    sql = "SELECT EXTRACT(EPOCH FROM NOW() - MAX(checked_at)) FROM a2a_server_health"
+    async with get_async_engine().connect() as conn:
+        value = (await conn.execute(text(sql))).scalar()
+    return None if value is None else float(value)
@@ -1,11 +1,57 @@
 import json
+import asyncio
 from sqlalchemy import text
 import traceback
-from typing import Tuple
+from typing import Tuple, NamedTuple
 
 from utils.log_util import logger
 import config
-from database.db_engine import engine
+from database.db_engine import engine, get_async_engine
+from database.vector_codec import to_pg_vector
+from rank.rrf import reciprocal_rank_fusion
+from embedding.vector_index import agent_vector_index
+
+
+class AgentCandidate(NamedTuple):
+    """检索结果，兼容原(a2a_server_url, agent_card_json_str)元组的下标访问"""
+    a2a_server_url: str
+    agent_card_json_str: str
+    semantic_json_str: str
+
+
+def vector_search_sql() -> str:
+    """
+    根据config.A2A_SERVER_EMBEDDING_STORAGE生成向量检索sql
+    参数：query_embedding, distance_threshold, retrieve_num, candidate_num
+        vector : 直接按全精度向量距离排序（2048维超出vector类型hnsw索引上限，为全表扫描）
+        halfvec: 第一阶段用halfvec列的hnsw索引召回candidate_num个候选，第二阶段用全精度向量重排
+        binary : 第一阶段用二值量化表达式索引（汉明距离）召回，第二阶段用全精度向量重排
+    """
+    storage = config.A2A_SERVER_EMBEDDING_STORAGE
+    if storage == "halfvec":
+        first_stage_order = ("semantic_json_embedding_half <=> "
+                                f"CAST(CAST(:query_embedding AS vector) AS halfvec({config.A2A_SERVER_EMBEDDING_DIM}))")
+    elif storage == "binary":
+        first_stage_order = (f"CAST(binary_quantize(semantic_json_embedding) AS bit({config.A2A_SERVER_EMBEDDING_DIM})) <~> "
+                                "binary_quantize(CAST(:query_embedding AS vector))")
+    else:
+        return ("SELECT a2a_server_url, agent_card_json_str, semantic_json_str, "
+                "semantic_json_embedding <=> :query_embedding AS distance "
+                "FROM a2a_server "
+                "WHERE semantic_json_embedding <=> :query_embedding < :distance_threshold "
+                "ORDER BY distance "
+                "LIMIT :retrieve_num;")
+
+    return ("SELECT a2a_server_url, agent_card_json_str, semantic_json_str, distance FROM ("
+                "SELECT a2a_server_url, agent_card_json_str, semantic_json_str, "
+                "semantic_json_embedding <=> CAST(:query_embedding AS vector) AS distance "
+                "FROM a2a_server "
+                f"ORDER BY {first_stage_order} "
+                "LIMIT :candidate_num"
+            ") AS candidates "
+            "WHERE distance < :distance_threshold "
+            "ORDER BY distance "
+            "LIMIT :retrieve_num;")
 
 
 def a2a_server_url_exists(request_id: str, a2a_server_url: str) -> bool:
@@ -24,6 +70,21 @@ def a2a_server_url_exists(request_id: str, a2a_server_url: str) -> bool:
         return False
         
 
+
+async def a2a_server_url_exists_async(request_id: str, a2a_server_url: str) -> bool:
+    sql = "SELECT COUNT(*) FROM a2a_server WHERE a2a_server_url = :a2a_server_url"
+    try:
+        async with get_async_engine().connect() as conn:
+            count = (await conn.execute(text(sql), {"a2a_server_url": a2a_server_url})).scalar() or 0
+        if count > 0:
+            logger.info(f"request_id:{request_id}, agent with a2a_server_url '{a2a_server_url}' already exists")
+            return True
+        return False
+    except:
+        logger.error(f"request_id:{request_id}, check a2a_server_url failed: {traceback.format_exc()}")
+        return False
+
+
 def name_provider_org_exists(request_id: str, name: str, provider_org: str) -> bool:
     sql = "SELECT COUNT(*) FROM a2a_server WHERE name = :name AND provider_org = :provider_org"
     try:
@@ -40,6 +101,20 @@ def name_provider_org_exists(request_id: str, name: str, provider_org: str) -> b
         return False
 
 
+async def name_provider_org_exists_async(request_id: str, name: str, provider_org: str) -> bool:
+    sql = "SELECT COUNT(*) FROM a2a_server WHERE name = :name AND provider_org = :provider_org"
+    try:
+        async with get_async_engine().connect() as conn:
+            count = (await conn.execute(text(sql), {"name": name, "provider_org": provider_org})).scalar() or 0
+        if count > 0:
+            logger.info(f"request_id:{request_id}, agent with name '{name}' and provider_org '{provider_org}' already exists")
+            return True
+        return False
+    except:
+        logger.error(f"request_id:{request_id}, check name_provider_org failed: {traceback.format_exc()}")
+        return False
+
+
 def insert(request_id: str,
             user_id: str,
             a2a_server_url: str,
@@ -85,6 +160,7 @@ def insert(request_id: str,
             )
             logger.info(f"request_id:{request_id}, a2a server database insert result: {result.rowcount}")
 
+        agent_vector_index.upsert(a2a_server_url, (agent_card_json_str, semantic_json_str), semantic_json_embedding)
         return 0
     except:
         logger.error(f"request_id:{request_id}, a2a server database insert failed: {traceback.format_exc()}")
@@ -92,39 +168,140 @@ def insert(request_id: str,
     return -1
 
 
+async def insert_async(request_id: str,
+                        user_id: str,
+                        a2a_server_url: str,
+                        name: str,
+                        agent_server_url: str,
+                        provider_org: str,
+                        provider_url: str,
+                        version: str,
+                        agent_card_json_str: str,
+                        semantic_json_embedding: list[float],
+                        semantic_json_str: str) -> int:
+    """
+    insert的异步版本，向量以二进制格式发送
+    return:
+        0: 插入成功
+        -1: 插入失败
+    """
+    sql = ("INSERT INTO a2a_server "
+                "(user_id, a2a_server_url, name, agent_server_url, provider_org, provider_url, name_provider_org, version, agent_card_json_str, semantic_json_embedding, semantic_json_str) "
+                "VALUES (:user_id, :a2a_server_url, :name, :agent_server_url, :provider_org, :provider_url, :name_provider_org, :version, :agent_card_json_str, :semantic_json_embedding, :semantic_json_str)"
+        )
+    try:
+        async with get_async_engine().begin() as conn:
+            result = await conn.execute(
+                text(sql),
+                {
+                    "user_id": user_id, 
+                    "a2a_server_url": a2a_server_url, 
+                    "name": name,
+                    "agent_server_url": agent_server_url,
+                    "provider_org": provider_org,
+                    "provider_url": provider_url,
+                    "name_provider_org": f"{name}|{provider_org}" if provider_org else name,
+                    "version": version,
+                    "agent_card_json_str": agent_card_json_str,
+                    "semantic_json_embedding": to_pg_vector(semantic_json_embedding),
+                    "semantic_json_str": semantic_json_str
+                }
+            )
+            logger.info(f"request_id:{request_id}, a2a server database insert result: {result.rowcount}")
+
+        agent_vector_index.upsert(a2a_server_url, (agent_card_json_str, semantic_json_str), semantic_json_embedding)
+        return 0
+    except:
+        logger.error(f"request_id:{request_id}, a2a server database insert failed: {traceback.format_exc()}")
+
+    return -1
+
+
+async def update_agent_card_async(request_id: str,
+                                    a2a_server_url: str,
+                                    version: str,
+                                    agent_card_json_str: str,
+                                    semantic_json_embedding: list[float],
+                                    semantic_json_str: str) -> int:
+    """
+    agent卡片变化后刷新卡片、语义json和向量（name/provider_org不变，变化时需重新注册）
+    return:
+        0: 更新成功
+        -1: 更新失败
+    """
+    sql = ("UPDATE a2a_server SET version = :version, agent_card_json_str = :agent_card_json_str, "
+                "semantic_json_embedding = :semantic_json_embedding, semantic_json_str = :semantic_json_str "
+            "WHERE a2a_server_url = :a2a_server_url")
+    try:
+        async with get_async_engine().begin() as conn:
+            result = await conn.execute(
+                text(sql),
+                {
+                    "a2a_server_url": a2a_server_url,
+                    "version": version,
+                    "agent_card_json_str": agent_card_json_str,
+                    "semantic_json_embedding": to_pg_vector(semantic_json_embedding),
+                    "semantic_json_str": semantic_json_str
+                }
+            )
+            logger.info(f"request_id:{request_id}, a2a server update agent card result: {result.rowcount}")
+
+        agent_vector_index.upsert(a2a_server_url, (agent_card_json_str, semantic_json_str), semantic_json_embedding)
+        return 0
+    except:
+        logger.error(f"request_id:{request_id}, a2a server update agent card failed: {traceback.format_exc()}")
+
+    return -1
+
+
+async def list_registered_async(request_id: str) -> list[dict]:
+    """所有已注册agent的url、name、provider_org和卡片"""
+    sql = "SELECT a2a_server_url, name, provider_org, agent_card_json_str FROM a2a_server"
+    try:
+        async with get_async_engine().connect() as conn:
+            result = await conn.execute(text(sql))
+            return [dict(row._mapping) for row in result]
+    except:
+        logger.error(f"request_id:{request_id}, list registered a2a servers failed: {traceback.format_exc()}")
+
+    return []
+
+
 def query(request_id: str, 
             name: str = "", 
             url: str  = "", 
             provider_org: str = "",
-            query_embedding: str | None = None
-        ) -> list[Tuple[str, str]]:
+            query_embedding: list[float] | None = None
+        ) -> list[AgentCandidate]:
     agent_card_list = []
 
-    sql1 = f"SELECT a2a_server_url, agent_card_json_str FROM a2a_server"
-    where_conditions = []
+    sql1 = f"SELECT a2a_server_url, agent_card_json_str, semantic_json_str FROM a2a_server"
+    where_conditions, params = [], {}
     if name:
-        where_conditions.append(f"name=\"{name}\"")
+        where_conditions.append("name = :name")
+        params["name"] = name
     if url:
-        where_conditions.append(f"url=\"{url}\"")
+        where_conditions.append("agent_server_url = :url")
+        params["url"] = url
     if provider_org:
-        where_conditions.append(f"provider_org=\"{provider_org}\"")
+        where_conditions.append("provider_org = :provider_org")
+        params["provider_org"] = provider_org
     
     try:
         with engine.begin() as conn:
             # 精确匹配
             if len(where_conditions) > 0:
                 sql1 += " where " + " and ".join(where_conditions)
-                result = conn.execute(
-                    text(sql1)
-                )
+                result = conn.execute(text(sql1), params)
                 logger.info(f"request_id:{request_id}, query a2a server result1: {result.rowcount}")
 
                 for i, row in enumerate(result):
                     mapping = row._mapping
                     a2a_server_url      = mapping.get("a2a_server_url")
                     agent_card_json_str = mapping.get("agent_card_json_str")
+                    semantic_json_str   = mapping.get("semantic_json_str")
                     if a2a_server_url and agent_card_json_str:
-                        agent_card_list.append((a2a_server_url, agent_card_json_str))
+                        agent_card_list.append(AgentCandidate(a2a_server_url, agent_card_json_str, semantic_json_str))
                 
                 if len(agent_card_list) >= config.A2A_SERVER_RETRIEVE_NUM:
                     logger.info(f"request_id:{request_id}, len(agent_card_list) >= config.A2A_SERVER_RETRIEVE_NUM({config.A2A_SERVER_RETRIEVE_NUM})")
@@ -134,9 +311,21 @@ def query(request_id: str,
                     logger.info(f"request_id:{request_id}, no query embedding provided")
                     return agent_card_list
 
-            # 向量检索
+            # 向量检索：优先使用进程内索引
+            if config.USE_LOCAL_VECTOR_INDEX and agent_vector_index.ready and query_embedding:
+                exclude_urls = {item[0] for item in agent_card_list}
+                for a2a_server_url, (agent_card_json_str, semantic_json_str), _ in agent_vector_index.search(
+                            query_embedding,
+                            config.A2A_SERVER_RETRIEVE_NUM - len(agent_card_list),
+                            config.A2A_SERVER_RETRIEVE_COSIN_THRES,
+                            exclude_urls
+                        ):
+                    agent_card_list.append(AgentCandidate(a2a_server_url, agent_card_json_str, semantic_json_str))
+                logger.info(f"request_id:{request_id}, retrieved {len(agent_card_list)} agents by local vector index")
+                return agent_card_list
+
             #sql2 = "SELECT agent_card_json_str FROM a2a_server ORDER BY semantic_json_embedding <=> :query_embedding LIMIT :retrieve_num;"
-            sql2 = ("SELECT a2a_server_url, agent_card_json_str, "
+            sql2 = ("SELECT a2a_server_url, agent_card_json_str, semantic_json_str, "
                     "semantic_json_embedding <=> :query_embedding AS distance "
                     "FROM a2a_server "
                     "WHERE semantic_json_embedding <=> :query_embedding < :distance_threshold "
@@ -144,7 +333,7 @@ def query(request_id: str,
                     "LIMIT :retrieve_num;")
             result = conn.execute(
                 text(sql2),
-                {"query_embedding": query_embedding, 
+                {"query_embedding": str(query_embedding), 
                 "distance_threshold": config.A2A_SERVER_RETRIEVE_COSIN_THRES,
                 "retrieve_num": config.A2A_SERVER_RETRIEVE_NUM - len(agent_card_list)}
             )
@@ -153,8 +342,9 @@ def query(request_id: str,
                 mapping = row._mapping
                 a2a_server_url      = mapping.get("a2a_server_url")
                 agent_card_json_str = mapping.get("agent_card_json_str")
+                semantic_json_str   = mapping.get("semantic_json_str")
                 if a2a_server_url and agent_card_json_str:
-                    agent_card_list.append((a2a_server_url, agent_card_json_str))
+                    agent_card_list.append(AgentCandidate(a2a_server_url, agent_card_json_str, semantic_json_str))
 
             logger.info(f"request_id:{request_id}, retrieved {len(agent_card_list)} agents")
 
@@ -165,6 +355,151 @@ def query(request_id: str,
     return []
 
 
+async def _exact_match_async(request_id: str, name: str, url: str, provider_org: str) -> list[AgentCandidate]:
+    where_conditions, params = [], {}
+    if name:
+        where_conditions.append("name = :name")
+        params["name"] = name
+    if url:
+        where_conditions.append("agent_server_url = :url")
+        params["url"] = url
+    if provider_org:
+        where_conditions.append("provider_org = :provider_org")
+        params["provider_org"] = provider_org
+    if not where_conditions:
+        return []
+
+    sql = "SELECT a2a_server_url, agent_card_json_str, semantic_json_str FROM a2a_server WHERE " + " AND ".join(where_conditions)
+    agent_card_list = []
+    async with get_async_engine().connect() as conn:
+        result = await conn.execute(text(sql), params)
+        for i, row in enumerate(result):
+            mapping = row._mapping
+            a2a_server_url      = mapping.get("a2a_server_url")
+            agent_card_json_str = mapping.get("agent_card_json_str")
+            semantic_json_str   = mapping.get("semantic_json_str")
+            if a2a_server_url and agent_card_json_str:
+                agent_card_list.append(AgentCandidate(a2a_server_url, agent_card_json_str, semantic_json_str))
+    logger.info(f"request_id:{request_id}, exact match retrieved {len(agent_card_list)} agents")
+    return agent_card_list
+
+
+async def _vector_retrieve_candidates_async(request_id: str, query_embedding: list[float], retrieve_num: int) -> list[AgentCandidate]:
+    """向量召回：优先使用进程内索引，否则走数据库"""
+    if config.USE_LOCAL_VECTOR_INDEX and agent_vector_index.ready:
+        agent_card_list = [AgentCandidate(a2a_server_url, agent_card_json_str, semantic_json_str) 
+                                for a2a_server_url, (agent_card_json_str, semantic_json_str), _ in 
+                                agent_vector_index.search(query_embedding, retrieve_num, config.A2A_SERVER_RETRIEVE_COSIN_THRES)]
+        logger.info(f"request_id:{request_id}, retrieved {len(agent_card_list)} agents by local vector index")
+        return agent_card_list
+
+    agent_card_list = []
+    async with get_async_engine().connect() as conn:
+        result = await conn.execute(
+            text(vector_search_sql()),
+            {"query_embedding": to_pg_vector(query_embedding), 
+            "distance_threshold": config.A2A_SERVER_RETRIEVE_COSIN_THRES,
+            "retrieve_num": retrieve_num,
+            "candidate_num": retrieve_num * config.A2A_SERVER_RESCORE_OVERSAMPLE}
+        )
+        for i, row in enumerate(result):
+            mapping = row._mapping
+            a2a_server_url      = mapping.get("a2a_server_url")
+            agent_card_json_str = mapping.get("agent_card_json_str")
+            semantic_json_str   = mapping.get("semantic_json_str")
+            if a2a_server_url and agent_card_json_str:
+                agent_card_list.append(AgentCandidate(a2a_server_url, agent_card_json_str, semantic_json_str))
+    logger.info(f"request_id:{request_id}, retrieved {len(agent_card_list)} agents by vector")
+    return agent_card_list
+
+
+async def lexical_retrieve_async(request_id: str, query_text: str, retrieve_num: int) -> list[AgentCandidate]:
+    """
+    字面召回：pg_trgm对semantic_json_str做词相似度匹配（覆盖技能名、标签等），同时匹配name_provider_org
+    依赖 semantic_json_str 和 name_provider_org 上的 gin_trgm_ops 索引
+    """
+    sql = ("SELECT a2a_server_url, agent_card_json_str, semantic_json_str, "
+            "GREATEST(word_similarity(:query_text, semantic_json_str), similarity(:query_text, name_provider_org)) AS score "
+            "FROM a2a_server "
+            "WHERE :query_text <% semantic_json_str OR name_provider_org % :query_text "
+            "ORDER BY score DESC "
+            "LIMIT :retrieve_num")
+    agent_card_list = []
+    async with get_async_engine().begin() as conn:
+        # 仅对当前事务生效的阈值
+        await conn.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', :thres, true), "
+                    "set_config('pg_trgm.similarity_threshold', :thres, true)"),
+            {"thres": str(config.A2A_SERVER_LEXICAL_SIM_THRES)}
+        )
+        result = await conn.execute(text(sql), {"query_text": query_text, "retrieve_num": retrieve_num})
+        for i, row in enumerate(result):
+            mapping = row._mapping
+            a2a_server_url      = mapping.get("a2a_server_url")
+            agent_card_json_str = mapping.get("agent_card_json_str")
+            semantic_json_str   = mapping.get("semantic_json_str")
+            if a2a_server_url and agent_card_json_str:
+                agent_card_list.append(AgentCandidate(a2a_server_url, agent_card_json_str, semantic_json_str))
+    logger.info(f"request_id:{request_id}, retrieved {len(agent_card_list)} agents by lexical")
+    return agent_card_list
+
+
+async def query_async(request_id: str, 
+                        name: str = "", 
+                        url: str  = "", 
+                        provider_org: str = "",
+                        query_embedding: list[float] | None = None,
+                        query_text: str = ""
+                    ) -> list[AgentCandidate]:
+    """
+    混合检索：
+    1. 精确匹配（name/url/provider_org）的结果排在最前
+    2. 向量召回与字面召回并发执行，用RRF融合后截取A2A_SERVER_RANK_CANDIDATE_NUM个候选
+       （两路互补，融合后可以用更少的候选达到同样的召回质量，缩短排序prompt）
+    未提供query_text或关闭混合检索时，只做向量召回，返回A2A_SERVER_RETRIEVE_NUM个候选
+    """
+    try:
+        agent_card_list = await _exact_match_async(request_id, name, url, provider_org)
+        if len(agent_card_list) >= config.A2A_SERVER_RETRIEVE_NUM:
+            logger.info(f"request_id:{request_id}, len(agent_card_list) >= config.A2A_SERVER_RETRIEVE_NUM({config.A2A_SERVER_RETRIEVE_NUM})")
+            return agent_card_list[:config.A2A_SERVER_RETRIEVE_NUM]
+
+        use_lexical = config.USE_HYBRID_RETRIEVE and bool(query_text.strip())
+        if query_embedding is None and not use_lexical:
+            logger.info(f"request_id:{request_id}, no query embedding provided")
+            return agent_card_list
+
+        channels = []
+        if query_embedding is not None:
+            channels.append(_vector_retrieve_candidates_async(request_id, query_embedding, config.A2A_SERVER_RETRIEVE_NUM))
+        if use_lexical:
+            channels.append(lexical_retrieve_async(request_id, query_text, config.A2A_SERVER_RETRIEVE_NUM))
+        channel_results = await asyncio.gather(*channels, return_exceptions=True)
+
+        ranked_lists, candidates = [], {}
+        for channel_result in channel_results:
+            if isinstance(channel_result, BaseException):  # 单路召回失败不影响另一路
+                logger.error(f"request_id:{request_id}, retrieve channel failed: {channel_result!r}")
+                continue
+            ranked_lists.append([item.a2a_server_url for item in channel_result])
+            candidates.update((item.a2a_server_url, item) for item in channel_result)
+
+        candidate_num = config.A2A_SERVER_RANK_CANDIDATE_NUM if use_lexical else config.A2A_SERVER_RETRIEVE_NUM
+        exclude_urls = {item[0] for item in agent_card_list}
+        for a2a_server_url, _ in reciprocal_rank_fusion(ranked_lists):
+            if len(agent_card_list) >= candidate_num:
+                break
+            if a2a_server_url not in exclude_urls:
+                agent_card_list.append(candidates[a2a_server_url])
+
+        logger.info(f"request_id:{request_id}, retrieved {len(agent_card_list)} agents")
+        return agent_card_list
+    except:
+        logger.error(f"request_id:{request_id}, query a2a server database async: {traceback.format_exc()}")
+
+    return []
+
+
 def get_latest_registered(request_id: str) -> list[str]:
     agent_card_list = []
 
@@ -190,6 +525,20 @@ def get_latest_registered(request_id: str) -> list[str]:
     return []
 
 
+async def get_latest_registered_async(request_id: str) -> list[str]:
+    sql = "SELECT agent_card_json_str FROM a2a_server ORDER BY created_at DESC LIMIT 9"
+    try:
+        async with get_async_engine().connect() as conn:
+            result = await conn.execute(text(sql))
+            agent_card_list = [row[0] for row in result if row[0]]
+        logger.info(f"request_id:{request_id}, retrieved {len(agent_card_list)} latest registered agents")
+        return agent_card_list
+    except:
+        logger.error(f"request_id:{request_id}, query latest registered a2a server database: {traceback.format_exc()}")
+
+    return []
+
+
 def get_latest_registered_by_user(request_id: str, user_id: str) -> list[str]:
     agent_card_list: list[str] = []
     if not user_id:
@@ -216,16 +565,38 @@ def get_latest_registered_by_user(request_id: str, user_id: str) -> list[str]:
     return []
 
 
+async def get_latest_registered_by_user_async(request_id: str, user_id: str) -> list[str]:
+    if not user_id:
+        return []
+
+    sql = "SELECT agent_card_json_str FROM a2a_server WHERE user_id = :user_id ORDER BY created_at DESC"
+    try:
+        async with get_async_engine().connect() as conn:
+            result = await conn.execute(text(sql), {"user_id": user_id})
+            agent_card_list = [row[0] for row in result if row[0]]
+        logger.info(f"request_id:{request_id}, retrieved {len(agent_card_list)} latest registered agents by user:{user_id}")
+        return agent_card_list
+    except:
+        logger.error(f"request_id:{request_id}, user_id:{user_id}, query latest registered by user database: {traceback.format_exc()}")
+
+    return []
+
+
 # 基于向量检索出agent
-def vector_retrieve(request_id: str, query_vec: str) -> list[str]:
+def vector_retrieve(request_id: str, query_vec: list[float]) -> list[str]:
     agent_card_list = []
 
+    if config.USE_LOCAL_VECTOR_INDEX and agent_vector_index.ready:
+        agent_card_list = [agent_card_json_str for _, (agent_card_json_str, _), _ in agent_vector_index.search(query_vec, config.AGENT_VEC_RETRIEVE_NUM)]
+        logger.info(f"request_id:{request_id}, vector_retrieve results length by local vector index: {len(agent_card_list)}")
+        return agent_card_list
+
     sql = "SELECT agent_card_json_str FROM a2a_server ORDER BY semantic_json_embedding <=> :query_vec LIMIT :retrieve_num;"
     try:
         with engine.begin() as conn:
             result = conn.execute(
                 text(sql),
-                {"query_vec": query_vec, "retrieve_num": config.AGENT_VEC_RETRIEVE_NUM}
+                {"query_vec": str(query_vec), "retrieve_num": config.AGENT_VEC_RETRIEVE_NUM}
             )
 
             for i, row in enumerate(result):
@@ -243,6 +614,70 @@ def vector_retrieve(request_id: str, query_vec: str) -> list[str]:
     return []
 
 
+async def vector_retrieve_async(request_id: str, query_vec: list[float]) -> list[AgentCandidate]:
+    """vector_retrieve的异步版本，向量以二进制格式发送，同时返回入库时保存的semantic_json_str"""
+    if config.USE_LOCAL_VECTOR_INDEX and agent_vector_index.ready:
+        agent_card_list = [AgentCandidate(a2a_server_url, agent_card_json_str, semantic_json_str) 
+                            for a2a_server_url, (agent_card_json_str, semantic_json_str), _ in 
+                            agent_vector_index.search(query_vec, config.AGENT_VEC_RETRIEVE_NUM)]
+        logger.info(f"request_id:{request_id}, vector_retrieve results length by local vector index: {len(agent_card_list)}")
+        return agent_card_list
+
+    try:
+        async with get_async_engine().connect() as conn:
+            result = await conn.execute(
+                text(vector_search_sql()),
+                {"query_embedding": to_pg_vector(query_vec), 
+                "distance_threshold": 2.0,  # 余弦距离最大为2，即不过滤
+                "retrieve_num": config.AGENT_VEC_RETRIEVE_NUM,
+                "candidate_num": config.AGENT_VEC_RETRIEVE_NUM * config.A2A_SERVER_RESCORE_OVERSAMPLE}
+            )
+            agent_card_list = [AgentCandidate(row._mapping.get("a2a_server_url"), 
+                                                row._mapping.get("agent_card_json_str"), 
+                                                row._mapping.get("semantic_json_str")) for row in result]
+            agent_card_list = [item for item in agent_card_list if item.agent_card_json_str]
+
+        logger.info(f"request_id:{request_id}, vector_retrieve_async results length: {len(agent_card_list)}")
+        return agent_card_list
+    except:
+        logger.error(f"request_id:{request_id}, vector retrieve async from a2a server database failed:{traceback.format_exc()}")
+
+    return []
+
+
+async def load_vector_index_async(request_id: str) -> bool:
+    """从a2a_server表全量加载进程内向量索引（向量以二进制格式读取）"""
+    sql = "SELECT a2a_server_url, agent_card_json_str, semantic_json_str, semantic_json_embedding FROM a2a_server"
+    try:
+        async with get_async_engine().connect() as conn:
+            result = await conn.execute(text(sql))
+            rows = []
+            for i, row in enumerate(result):
+                mapping = row._mapping
+                a2a_server_url          = mapping.get("a2a_server_url")
+                agent_card_json_str     = mapping.get("agent_card_json_str")
+                semantic_json_str       = mapping.get("semantic_json_str")
+                semantic_json_embedding = mapping.get("semantic_json_embedding")
+                if a2a_server_url and agent_card_json_str and semantic_json_embedding is not None:
+                    rows.append((a2a_server_url, (agent_card_json_str, semantic_json_str), semantic_json_embedding))
+
+        agent_vector_index.load(rows)
+        logger.info(f"request_id:{request_id}, load vector index succeed, {len(rows)} agents")
+        return True
+    except:
+        logger.error(f"request_id:{request_id}, load vector index failed:{traceback.format_exc()}")
+
+    return False
+
+
+def apply_a2a_server_change(op: str, a2a_server_url: str, row: dict | None):
+    """a2a_server表变更订阅回调：增量更新进程内向量索引"""
+    if op == "DELETE":
+        agent_vector_index.remove(a2a_server_url)
+    elif row and row.get("semantic_json_embedding") is not None:
+        agent_vector_index.upsert(a2a_server_url, (row["agent_card_json_str"], row.get("semantic_json_str")), row["semantic_json_embedding"])
+
+
 def select_agent_card_url(request_id: str, name: str, org_name: str) -> list[str]:
     sql = "SELECT a2a_server_url FROM a2a_server WHERE name = :name AND provider_org = :provider_org"
 
@@ -263,14 +698,37 @@ def select_agent_card_url(request_id: str, name: str, org_name: str) -> list[str
 
     return a2a_server_url_list
 
-def select_agent_name_org_by_prefix(request_id: str, prefix: str, num: int) -> list[str]:
-    sql = f"SELECT name_provider_org FROM a2a_server WHERE name_provider_org LIKE '{prefix}%' LIMIT {num}"
 
+async def select_agent_card_url_async(request_id: str, name: str, org_name: str) -> list[str]:
+    sql = "SELECT a2a_server_url FROM a2a_server WHERE name = :name AND provider_org = :provider_org"
+    try:
+        async with get_async_engine().connect() as conn:
+            result = await conn.execute(text(sql), {"name": name, "provider_org": org_name})
+            a2a_server_url_list = [row[0] for row in result if row[0]]
+        logger.info(f"request_id:{request_id}, select_agent_card_url results: {a2a_server_url_list}")
+        return a2a_server_url_list
+    except:
+        logger.error(f"request_id:{request_id}, select_agent_card_url failed:{traceback.format_exc()}")
+
+    return []
+
+
+_PREFIX_SQL = "SELECT name_provider_org FROM a2a_server WHERE name_provider_org LIKE :prefix LIMIT :num"
+_SIMILARITY_SQL = ("SELECT name_provider_org, similarity(name_provider_org, :search_str) AS score "
+                    "FROM a2a_server WHERE similarity(name_provider_org, :search_str) > 0.05 "
+                    "ORDER BY score DESC LIMIT :num")
+
+
+def _like_prefix(prefix: str) -> str:
+    """转义LIKE通配符，按字面前缀匹配"""
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def select_agent_name_org_by_prefix(request_id: str, prefix: str, num: int) -> list[str]:
     agent_name_org_list = []
     try:
         with engine.begin() as conn:
-            # result = conn.execute(text(sql), {"prefix": prefix, "num": num})
-            result = conn.execute(text(sql))
+            result = conn.execute(text(_PREFIX_SQL), {"prefix": _like_prefix(prefix), "num": num})
             for i, row in enumerate(result):
                 mapping = row._mapping 
                 name_provider_org = mapping.get("name_provider_org")
@@ -285,18 +743,25 @@ def select_agent_name_org_by_prefix(request_id: str, prefix: str, num: int) -> l
     return []
 
 
+async def select_agent_name_org_by_prefix_async(request_id: str, prefix: str, num: int) -> list[str]:
+    try:
+        async with get_async_engine().connect() as conn:
+            result = await conn.execute(text(_PREFIX_SQL), {"prefix": _like_prefix(prefix), "num": num})
+            return [row[0] for row in result if row[0]]
+    except:
+        logger.error(f"request_id:{request_id}, select_agent_name_org_by_prefix failed:{traceback.format_exc()}")
+
+    return []
+
+
 def select_agent_name_org_by_similarity(request_id: str, search_str: str, num: int) -> list[str]:
     if not search_str.strip():
         return []
 
-    sql = f"SELECT name_provider_org, similarity(name_provider_org, '{search_str}') AS score " \
-            f"FROM a2a_server where similarity(name_provider_org, '{search_str}') > 0.05 " \
-            f"ORDER BY score DESC LIMIT {num}"
-
     agent_name_org_list = []
     try:
         with engine.begin() as conn:
-            result = conn.execute(text(sql), {"search_str": search_str, "num": num})
+            result = conn.execute(text(_SIMILARITY_SQL), {"search_str": search_str, "num": num})
             for i, row in enumerate(result):
                 mapping = row._mapping
                 name_provider_org = mapping.get("name_provider_org")
@@ -308,4 +773,22 @@ def select_agent_name_org_by_similarity(request_id: str, search_str: str, num: i
     except:
         logger.error(f"request_id:{request_id}, select_agent_name_org_by_similarity failed:{traceback.format_exc()}")
 
-    return []
\ No newline at end of file
+    return []
+
+
+async def select_agent_name_org_by_similarity_async(request_id: str, search_str: str, num: int) -> list[str]:
+    if not search_str.strip():
+        return []
+
+    try:
+        async with get_async_engine().connect() as conn:
+            result = await conn.execute(text(_SIMILARITY_SQL), {"search_str": search_str, "num": num})
+            agent_name_org_list = [row[0] for row in result if row[0]]
+        logger.info(f"request_id:{request_id}, select_agent_name_org_by_similarity results: {agent_name_org_list}")
+        return agent_name_org_list
+    except:
+        logger.error(f"request_id:{request_id}, select_agent_name_org_by_similarity failed:{traceback.format_exc()}")
+
+    return []
+
+
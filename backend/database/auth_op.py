@@ -6,7 +6,7 @@ import random
 import json
 
 from utils.log_util import logger
-from database.db_engine import engine
+from database.db_engine import engine, get_async_engine
 
 auth_code_cache_key_prefix = "auth_code-"
 
@@ -58,4 +58,53 @@ def verify(request_id: str, to_mail: str, code: str) -> bool:
 
     except:
         logger.error(f"request_id:{request_id}, to_mail:{to_mail}, verify code exception:{traceback.format_exc()}")
-        return False
\ No newline at end of file
+        return False
+
+
+async def insert_auth_code_async(request_id: str, to_mail: str, code: str) -> bool:
+    try:
+        cache_key = auth_code_cache_key_prefix + to_mail
+        cache_value = {"code": code}
+        cache_expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
+
+        sql = """
+            INSERT INTO cache (key, value, expires_at) 
+            VALUES (:key, CAST(:value AS JSONB), :expires_at)
+            ON CONFLICT (key) 
+            DO UPDATE SET 
+                value = EXCLUDED.value,
+                expires_at = EXCLUDED.expires_at
+        """
+        async with get_async_engine().begin() as conn:
+            await conn.execute(text(sql), {"key": cache_key, "value": json.dumps(cache_value, ensure_ascii=False), "expires_at": cache_expires_at})
+
+        logger.info(f"request_id:{request_id}, to_mail:{to_mail}, code:{code}, send code success")
+        return True
+    except:
+        logger.error(f"request_id:{request_id}, to_mail:{to_mail}, send code exception:{traceback.format_exc()}")
+        return False
+
+
+async def verify_async(request_id: str, to_mail: str, code: str) -> bool:
+    try:
+        cache_key = auth_code_cache_key_prefix + to_mail
+        sql = "SELECT value, expires_at FROM cache WHERE key = :key"
+        async with get_async_engine().connect() as conn:
+            row = (await conn.execute(text(sql), {"key": cache_key})).first()
+        if row is None:
+            logger.info(f"request_id:{request_id}, to_mail:{to_mail}, code:{code}, verify code not found")
+            return False
+
+        cache_value, cache_expires_at = row
+        if isinstance(cache_value, str):  # asyncpg默认不解码jsonb
+            cache_value = json.loads(cache_value)
+        if cache_value and cache_expires_at \
+                and cache_value.get("code") == code and cache_expires_at > datetime.now(timezone.utc):
+            logger.info(f"request_id:{request_id}, to_mail:{to_mail}, code:{code}, verify code success")
+            return True
+
+        logger.info(f"request_id:{request_id}, to_mail:{to_mail}, code:{code}, verify code not correct or expired")
+        return False
+    except:
+        logger.error(f"request_id:{request_id}, to_mail:{to_mail}, verify code exception:{traceback.format_exc()}")
+        return False
@@ -4,7 +4,8 @@ from typing import Tuple
 
 from utils.log_util import logger
 import config
-from database.db_engine import engine
+from database.db_engine import engine, get_async_engine
+from database.history_cache import chat_list_cache, encode_cursor, decode_cursor
 
 def insert_chat(thread_id: str, request_id: str, user_id: str, text_input: str) -> int:
     try:
@@ -18,8 +19,9 @@ def insert_chat(thread_id: str, request_id: str, user_id: str, text_input: str)
                 return 0
             else:
                 conn.execute(text(sql2), {"thread_id": thread_id, "user_id": user_id, "title": text_input})
-                logger.info(f"request_id:{request_id}, thread_id:{thread_id}, user_id:{user_id}, insert chat success")
-                return 1
+        chat_list_cache.invalidate(user_id)  # 提交后失效
+        logger.info(f"request_id:{request_id}, thread_id:{thread_id}, user_id:{user_id}, insert chat success")
+        return 1
     except:
         logger.error(f"request_id:{request_id}, thread_id:{thread_id}, user_id:{user_id}, insert chat exception:{traceback.format_exc()}")
         return -1
@@ -43,8 +45,64 @@ def get_chat_list(request_id: str, user_id: str) -> list:
                 if thread_id and title:
                     rsp_json.append({"thread_id": thread_id, "title": title})
 
-            logger.info(f"request_id:{request_id}, user_id:{user_id}, get chat_list success: {rsp_json}")
+            logger.info(f"request_id:{request_id}, user_id:{user_id}, get chat_list success: {len(rsp_json)}")
             return rsp_json
     except:
         logger.error(f"request_id:{request_id}, user_id:{user_id}, get chat_list exception:{traceback.format_exc()}")
-        return []
\ No newline at end of file
+        return []
+
+
+async def insert_chat_async(thread_id: str, request_id: str, user_id: str, text_input: str) -> int:
+    """returns: 1 新建会话，0 会话已存在，-1 异常"""
+    sql = ("INSERT INTO chat_list (thread_id, user_id, title) VALUES (:thread_id, :user_id, :title) "
+                "ON CONFLICT (thread_id) DO NOTHING")
+    try:
+        async with get_async_engine().begin() as conn:
+            result = await conn.execute(text(sql), {"thread_id": thread_id, "user_id": user_id, "title": text_input})
+        if result.rowcount == 0:
+            logger.info(f"request_id:{request_id}, thread_id:{thread_id} already exists in chat_list")
+            return 0
+        chat_list_cache.invalidate(user_id)
+        logger.info(f"request_id:{request_id}, thread_id:{thread_id}, user_id:{user_id}, insert chat success")
+        return 1
+    except:
+        logger.error(f"request_id:{request_id}, thread_id:{thread_id}, user_id:{user_id}, insert chat exception:{traceback.format_exc()}")
+        return -1
+
+
+async def get_chat_list_async(request_id: str, user_id: str, cursor: str | None = None,
+                                limit: int = config.CHAT_LIST_PAGE_SIZE) -> Tuple[list, str | None]:
+    """
+    按创建时间倒序分页获取会话列表，cursor为上一页返回的next_cursor（非法时抛出InvalidCursorError）
+    returns: (会话列表, next_cursor)，没有更多时next_cursor为None
+    """
+    if config.USE_CHAT_HISTORY_CACHE:
+        cached = chat_list_cache.get(user_id, cursor, limit)
+        if cached is not None:
+            return cached
+        snapshot = chat_list_cache.snapshot()
+
+    params = {"user_id": user_id, "limit": limit + 1}  # 多取一行判断是否还有下一页
+    where = "user_id = :user_id"
+    if cursor:
+        params["cursor_created_at"], params["cursor_thread_id"] = decode_cursor(cursor)
+        where += " AND (created_at, thread_id) < (:cursor_created_at, :cursor_thread_id)"
+    sql = (f"SELECT thread_id, title, created_at FROM chat_list WHERE {where} "
+                "ORDER BY created_at DESC, thread_id DESC LIMIT :limit")
+    try:
+        async with get_async_engine().connect() as conn:
+            rows = (await conn.execute(text(sql), params)).all()
+        has_more, rows = len(rows) > limit, rows[:limit]
+    except:
+        logger.error(f"request_id:{request_id}, user_id:{user_id}, get chat_list exception:{traceback.format_exc()}")
+        return [], None
+
+    rsp_json = [{"thread_id": thread_id, "title": title} for thread_id, title, _ in rows if thread_id and title]
+    next_cursor = encode_cursor(rows[-1][2], rows[-1][0]) if has_more else None
+    if not rsp_json and not cursor:
+        logger.warning(f"request_id:{request_id}, user_id:{user_id}, not history chat list")
+    logger.info(f"request_id:{request_id}, user_id:{user_id}, get chat_list success: {len(rsp_json)}, has_more:{next_cursor is not None}")
+
+    if config.USE_CHAT_HISTORY_CACHE:
+        chat_list_cache.put(user_id, cursor, limit, rsp_json, next_cursor, snapshot)
+    return rsp_json, next_cursor
@@ -1,16 +1,44 @@
 from sqlalchemy import text
 import traceback
 import json
+from datetime import datetime
 
 from utils.log_util import logger
 import config
-from database.db_engine import engine
+from database.db_engine import engine, get_async_engine
+from database.history_cache import message_list_cache, encode_cursor, decode_cursor
+from utils.enums import AGUI_EVENT
+
+def coalesce_key(message: dict) -> tuple | None:
+    """
+    同一轮对话中同一来源的连续assistant文本chunk可以合并为一条消息，返回合并依据；不可合并时返回None
+    用户消息各自独立，不合并；request_id区分不同轮次（合并写入之前保存的历史消息没有该字段）
+    """
+    if message.get("role") != "assistant" or message.get("event") != AGUI_EVENT.TEXT_MESSAGE_CHUNK \
+            or message.get("content_type", "text") != "text" or not isinstance(message.get("content"), str):
+        return None
+    return tuple(message.get(k) for k in ("request_id", "source", "agent_id", "provider_url", "message_type"))
+
+
+def coalesce_messages(messages: list[dict]) -> list[dict]:
+    """合并连续的同来源文本chunk（兼容合并写入之前按chunk保存的历史消息）"""
+    merged, last_key = [], None
+    for message in messages:
+        key = coalesce_key(message)
+        if key is not None and key == last_key:
+            merged[-1]["content"] += message["content"]
+            continue
+        merged.append(message)
+        last_key = key
+    return merged
+
 
 def insert_message(thread_id: str, request_id: str, user_id: str, message_id: str, user_message: str) -> bool:
     sql = "INSERT INTO chat_messages (thread_id, user_id, message_id, user_message) VALUES (:thread_id, :user_id, :message_id, :user_message)"
     try:
         with engine.begin() as conn:
             conn.execute(text(sql), {"thread_id": thread_id, "user_id": user_id, "message_id": message_id, "user_message": user_message})
+        message_list_cache.invalidate(thread_id)
 
         logger.info(f"request_id:{request_id}, thread_id:{thread_id}, user_id:{user_id}, message_id:{message_id}, insert message success")
         return True
@@ -38,4 +66,86 @@ def get_message_list(request_id: str, thread_id: str) -> list:
             return rsp_json
     except:
         logger.error(f"request_id:{request_id}, thread_id:{thread_id}, get message list exception:{traceback.format_exc()}")
-        return []
\ No newline at end of file
+        return []
+
+
+async def insert_message_async(thread_id: str, request_id: str, user_id: str, message_id: str, user_message: str) -> bool:
+    sql = "INSERT INTO chat_messages (thread_id, user_id, message_id, user_message) VALUES (:thread_id, :user_id, :message_id, :user_message)"
+    try:
+        async with get_async_engine().begin() as conn:
+            await conn.execute(text(sql), {"thread_id": thread_id, "user_id": user_id, "message_id": message_id, "user_message": user_message})
+        message_list_cache.invalidate(thread_id)
+
+        logger.info(f"request_id:{request_id}, thread_id:{thread_id}, user_id:{user_id}, message_id:{message_id}, insert message success")
+        return True
+    except:
+        logger.error(f"request_id:{request_id}, thread_id:{thread_id}, user_id:{user_id}, message_id:{message_id}, insert message exception:{traceback.format_exc()}")
+        return False
+
+
+async def get_message_list_async(request_id: str, thread_id: str, cursor: str | None = None,
+                                    limit: int = config.CHAT_MESSAGE_PAGE_SIZE) -> tuple[list, str | None]:
+    """
+    分页获取会话消息：第一页为最新的limit条，cursor为上一页返回的next_cursor，用于向前翻更早的消息（非法时抛出InvalidCursorError）
+    每页内按时间正序返回
+    returns: (消息列表, next_cursor)，没有更早的消息时next_cursor为None
+    """
+    if config.USE_CHAT_HISTORY_CACHE:
+        cached = message_list_cache.get(thread_id, cursor, limit)
+        if cached is not None:
+            return cached
+        snapshot = message_list_cache.snapshot()
+
+    params = {"thread_id": thread_id, "limit": limit + 1}  # 多取一行判断是否还有上一页
+    where = "thread_id = :thread_id"
+    if cursor:
+        params["cursor_created_at"], params["cursor_message_id"] = decode_cursor(cursor)
+        where += " AND (created_at, message_id) < (:cursor_created_at, :cursor_message_id)"
+    sql = (f"SELECT message_id, user_message, created_at FROM chat_messages WHERE {where} "
+                "ORDER BY created_at DESC, message_id DESC LIMIT :limit")
+    try:
+        async with get_async_engine().connect() as conn:
+            rows = (await conn.execute(text(sql), params)).all()
+        has_more, rows = len(rows) > limit, rows[:limit]
+        rsp_json = coalesce_messages([json.loads(user_message) for _, user_message, _ in reversed(rows) if user_message])
+    except:
+        logger.error(f"request_id:{request_id}, thread_id:{thread_id}, get message list exception:{traceback.format_exc()}")
+        return [], None
+
+    next_cursor = encode_cursor(rows[-1][2], rows[-1][0]) if has_more else None
+    logger.info(f"request_id:{request_id}, thread_id:{thread_id}, get message list success: {len(rsp_json)}, has_more:{next_cursor is not None}")
+
+    if config.USE_CHAT_HISTORY_CACHE:
+        message_list_cache.put(thread_id, cursor, limit, rsp_json, next_cursor, snapshot)
+    return rsp_json, next_cursor
+
+
+async def insert_messages_async(request_id: str, thread_id: str, user_id: str, rows: list[tuple[str, str, datetime]]) -> bool:
+    """
+    一条多行INSERT批量写入同一会话的消息，rows为(message_id, user_message, created_at)
+    message_id已存在时覆盖内容（合并中的消息会以同一message_id多次写入）
+    """
+    if not rows:
+        return True
+    sql = ("INSERT INTO chat_messages (thread_id, user_id, message_id, user_message, created_at) "
+                "SELECT :thread_id, :user_id, message_id, user_message, created_at "
+                "FROM unnest(CAST(:message_ids AS TEXT[]), CAST(:user_messages AS TEXT[]), CAST(:created_ats AS TIMESTAMPTZ[])) "
+                "AS t(message_id, user_message, created_at) "
+                "ON CONFLICT (thread_id, message_id) DO UPDATE SET user_message = EXCLUDED.user_message")
+    message_ids, user_messages, created_ats = (list(col) for col in zip(*rows))
+    try:
+        async with get_async_engine().begin() as conn:
+            await conn.execute(text(sql), {
+                "thread_id": thread_id,
+                "user_id": user_id,
+                "message_ids": message_ids,
+                "user_messages": user_messages,
+                "created_ats": created_ats
+            })
+        message_list_cache.invalidate(thread_id)
+
+        logger.info(f"request_id:{request_id}, thread_id:{thread_id}, user_id:{user_id}, insert {len(rows)} messages success")
+        return True
+    except:
+        logger.error(f"request_id:{request_id}, thread_id:{thread_id}, user_id:{user_id}, insert {len(rows)} messages exception:{traceback.format_exc()}")
+        return False
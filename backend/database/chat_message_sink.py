@@ -0,0 +1,94 @@
+import json
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from utils.log_util import logger
+import config
+from database import chat_message_op
+
+# 会话消息的异步写后缓冲（每次对话一个实例）
+# 流式输出的每个chunk只追加到内存，由后台任务按条数/时间阈值批量写入，结束或断开时aclose()保证写完
+# 同一来源的连续文本chunk合并为一条消息（同一message_id），每次写入覆盖为当前累积的内容
+# created_at在创建消息时生成且严格递增，批量写入后按created_at排序仍保持原始顺序
+
+
+class ChatMessageSink:
+    def __init__(self,
+                    request_id: str,
+                    thread_id: str,
+                    user_id: str,
+                    batch_size: int = config.CHAT_MESSAGE_SINK_BATCH_SIZE,
+                    flush_interval: float = config.CHAT_MESSAGE_SINK_FLUSH_INTERVAL
+                ):
+        self.request_id     = request_id
+        self.thread_id      = thread_id
+        self.user_id        = user_id
+        self.batch_size     = batch_size
+        self.flush_interval = flush_interval
+        self._pending: dict[str, tuple[dict, datetime]] = {}  # 待写入（新建或内容有变化）的消息
+        self._open: tuple[str, dict, datetime, tuple] | None = None  # 可继续合并的消息
+        self._added = 0
+        self._last_created_at: datetime | None = None
+        self._wakeup = asyncio.Event()
+        self._lock   = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._closed = False
+
+    def add(self, message: dict):
+        if self._closed:
+            logger.warning(f"request_id:{self.request_id}, chat message sink closed, message dropped")
+            return
+        message = dict(message, request_id=self.request_id)  # 标记所属轮次，读取时不跨轮次合并
+        key = chat_message_op.coalesce_key(message)
+        if key is not None and self._open is not None and self._open[3] == key:
+            message_id, merged, created_at, _ = self._open
+            merged["content"] += message["content"]
+            self._pending[message_id] = (merged, created_at)
+        else:
+            created_at = datetime.now(timezone.utc)
+            if self._last_created_at and created_at <= self._last_created_at:
+                created_at = self._last_created_at + timedelta(microseconds=1)
+            self._last_created_at = created_at
+            message_id = str(uuid.uuid4())
+            self._pending[message_id] = (message, created_at)
+            self._open = (message_id, message, created_at, key) if key is not None else None
+
+        self._added += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+        if self._added >= self.batch_size:
+            self._wakeup.set()
+
+    async def _flush_loop(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> bool:
+        async with self._lock:
+            if not self._pending:
+                return True
+            pending, self._pending, self._added = self._pending, {}, 0
+            rows = [(message_id, json.dumps(message, ensure_ascii=False), created_at)
+                        for message_id, (message, created_at) in pending.items()]
+            if await chat_message_op.insert_messages_async(self.request_id, self.thread_id, self.user_id, rows):
+                return True
+            # 写入失败放回待写入，下次重试（期间又有变化的消息已在_pending中，以其为准）
+            for message_id, row in pending.items():
+                self._pending.setdefault(message_id, row)
+            return False
+
+    async def aclose(self):
+        """停止后台任务并写入剩余消息，不取消进行中的写入"""
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+        if not await self.flush():
+            logger.error(f"request_id:{self.request_id}, thread_id:{self.thread_id}, {len(self._pending)} chat messages lost")
+            self._pending.clear()
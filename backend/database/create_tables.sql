@@ -38,6 +38,8 @@ EXPLAIN ANALYZE SELECT * FROM a2a_server  WHERE name_provider_org LIKE 'your_pre
 CREATE EXTENSION pg_trgm;
 -- 创建 GIN 全文索引
 CREATE INDEX idx_name_trgm ON a2a_server USING GIN (name_provider_org gin_trgm_ops);
+-- 混合检索的字面召回（word_similarity / <% 运算符）使用
+CREATE INDEX idx_semantic_json_trgm ON a2a_server USING GIN (semantic_json_str gin_trgm_ops);
 -- 查询语句（相似度查询）
 SELECT name_provider_org, similarity(name_provider_org, '图成') AS score
 FROM a2a_server 
@@ -51,9 +53,35 @@ CREATE TABLE files (
   filename TEXT, 
   mime_type TEXT, 
   size      INTEGER NOT NULL,
-  content BYTEA NOT NULL,
+  content BYTEA,
+  source_uri TEXT,  -- agent返回FileWithUri时只记录上游地址，首次下载时代理并缓存到content
+  chunk_size INTEGER, -- 非空表示内容按该块大小存放在file_chunks，content为空
+  storage_key TEXT,   -- 非空表示内容在blob存储（本地目录/S3），数据库只保存元数据；开启去重时为内容sha256（见file_blobs）
   created_at TIMESTAMPTZ DEFAULT NOW()
 );
+-- 已有表升级
+-- ALTER TABLE files ALTER COLUMN content DROP NOT NULL;
+-- ALTER TABLE files ADD COLUMN source_uri TEXT;
+-- ALTER TABLE files ADD COLUMN chunk_size INTEGER;
+-- ALTER TABLE files ADD COLUMN storage_key TEXT;
+
+-- blob存储的内容寻址去重：files.storage_key为sha256，多个文件id引用同一blob
+CREATE TABLE file_blobs (
+  sha256     TEXT    PRIMARY KEY,
+  size       BIGINT  NOT NULL,
+  ref_count  INTEGER NOT NULL DEFAULT 0,
+  created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- 文件分块存储，下载时按Range只读取需要的块
+CREATE TABLE file_chunks (
+  file_id TEXT    NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+  seq     INTEGER NOT NULL,
+  data    BYTEA   NOT NULL,
+  PRIMARY KEY (file_id, seq)
+);
+-- 文件多为已压缩格式，关闭TOAST压缩，读取时无需解压
+ALTER TABLE file_chunks ALTER COLUMN data SET STORAGE EXTERNAL;
 
 CREATE TABLE chat_messages (
   user_id     TEXT,
@@ -63,6 +91,8 @@ CREATE TABLE chat_messages (
   created_at TIMESTAMPTZ DEFAULT NOW(),
   PRIMARY KEY (thread_id, message_id)
 );
+-- 消息列表按 (created_at, message_id) 游标分页
+CREATE INDEX chat_messages_thread_created_idx ON chat_messages (thread_id, created_at, message_id);
 
 CREATE TABLE chat_list (
   thread_id   TEXT, 
@@ -71,6 +101,8 @@ CREATE TABLE chat_list (
   created_at TIMESTAMPTZ DEFAULT NOW(),
   PRIMARY KEY (thread_id)
 );
+-- 会话列表按 (created_at, thread_id) 倒序游标分页
+CREATE INDEX chat_list_user_created_idx ON chat_list (user_id, created_at DESC, thread_id DESC);
 
 -- 缓存表
 CREATE UNLOGGED TABLE cache (
@@ -84,4 +116,62 @@ CREATE TABLE user_info (
   to_mail    TEXT,
   created_at TIMESTAMPTZ DEFAULT NOW(),
   PRIMARY KEY (user_id)
-);
\ No newline at end of file
+);
+
+-- a2a_server变更通知：各worker LISTEN该channel，增量更新进程内向量索引/缓存（见database/a2a_server_feed.py）
+CREATE OR REPLACE FUNCTION a2a_server_touch_modified_at() RETURNS trigger AS $$
+BEGIN
+  NEW.modified_at := NOW();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 只在业务字段变化时触发（回填semantic_json_embedding_half等派生列时不触发）
+CREATE TRIGGER a2a_server_touch_modified_at
+  BEFORE UPDATE OF user_id, a2a_server_url, version, name, agent_server_url, provider_org, provider_url,
+                      name_provider_org, agent_card_json_str, semantic_json_embedding, semantic_json_str
+  ON a2a_server
+  FOR EACH ROW EXECUTE FUNCTION a2a_server_touch_modified_at();
+
+CREATE OR REPLACE FUNCTION a2a_server_notify_change() RETURNS trigger AS $$
+DECLARE
+  changed_url TEXT;
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    changed_url := OLD.a2a_server_url;
+  ELSE
+    changed_url := NEW.a2a_server_url;
+  END IF;
+  PERFORM pg_notify('a2a_server_changes', json_build_object('op', TG_OP, 'a2a_server_url', changed_url)::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER a2a_server_notify_change
+  AFTER INSERT OR DELETE OR UPDATE OF user_id, a2a_server_url, version, name, agent_server_url, provider_org, provider_url,
+                      name_provider_org, agent_card_json_str, semantic_json_embedding, semantic_json_str
+  ON a2a_server
+  FOR EACH ROW EXECUTE FUNCTION a2a_server_notify_change();
+
+-- 高水位轮询补漏用
+CREATE INDEX a2a_server_changed_at_idx ON a2a_server (GREATEST(created_at, COALESCE(modified_at, created_at)));
+
+-- agent健康探测结果（见agent_space/agent_health.py），latency_ms为EWMA
+CREATE TABLE a2a_server_health (
+  a2a_server_url       TEXT    NOT NULL,
+  healthy              BOOLEAN NOT NULL,
+  latency_ms           DOUBLE PRECISION,
+  consecutive_failures INTEGER NOT NULL DEFAULT 0,
+  success_count        BIGINT  NOT NULL DEFAULT 0,
+  failure_count        BIGINT  NOT NULL DEFAULT 0,
+  last_error           TEXT,
+  checked_at           TIMESTAMPTZ DEFAULT NOW(),
+  PRIMARY KEY (a2a_server_url)
+);
+
+
+-- 可选：半精度/二值量化检索（2048维超出vector类型hnsw索引2000维上限，halfvec上限4000维）
+-- 由 python -m database.migrate_embedding_storage halfvec|binary 执行，以下仅作说明
+-- ALTER TABLE a2a_server ADD COLUMN semantic_json_embedding_half HALFVEC(2048);
+-- CREATE INDEX CONCURRENTLY a2a_server_embedding_half_hnsw_idx ON a2a_server USING hnsw (semantic_json_embedding_half halfvec_cosine_ops);
+-- CREATE INDEX CONCURRENTLY a2a_server_embedding_bit_hnsw_idx ON a2a_server USING hnsw ((CAST(binary_quantize(semantic_json_embedding) AS bit(2048))) bit_hamming_ops);
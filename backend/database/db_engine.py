@@ -4,6 +4,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.asyncio import create_async_engine
 
 import config
+from database.vector_codec import register_vector_codec
 
 def parse_db_uri(uri: str) -> str:
     """
@@ -114,6 +115,8 @@ def get_async_engine():
                     }
                 }
             )
+            # vector类型使用二进制格式收发
+            register_vector_codec(async_engine)
         except ImportError:
             # 如果没有 asyncpg，使用同步引擎
             print("警告: asyncpg 未安装，将使用同步数据库连接")
@@ -4,11 +4,40 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 import traceback
-from typing import Tuple
+from typing import AsyncIterator, BinaryIO, NamedTuple, Tuple
+from datetime import datetime
+import io
+import hashlib
+import tempfile
 
 from utils.log_util import logger
 import config
 from database.db_engine import engine, get_async_engine
+from storage.blob_store import get_blob_store
+
+# 内容位置：storage_key非空时在blob存储（见storage/blob_store.py），chunk_size非空时在file_chunks表（按seq拼接），否则在files.content
+_CONTENT_EXPR = ("COALESCE(content, (SELECT string_agg(data, ''::bytea ORDER BY seq) "
+                    "FROM file_chunks WHERE file_chunks.file_id = files.id))")
+_INSERT_CHUNK_SQL = "INSERT INTO file_chunks (file_id, seq, data) VALUES (:file_id, :seq, :data)"
+# 内容寻址去重：blob按sha256存储，files行只是引用（storage_key为sha256），ref_count为引用数
+# 已存在时只增加引用计数；inserted为真时才需要写blob。并发写同一内容时ON CONFLICT等待先写入的事务提交
+# 目前没有删除文件的路径；以后增加时，须在file_blobs行锁下确认引用归零并删除blob，避免与并发的ACQUIRE交错
+_ACQUIRE_BLOB_SQL = ("INSERT INTO file_blobs (sha256, size, ref_count) VALUES (:sha256, :size, 1) "
+                        "ON CONFLICT (sha256) DO UPDATE SET ref_count = file_blobs.ref_count + 1 "
+                        "RETURNING (xmax = 0) AS inserted")
+_RELEASE_BLOB_SQL = "UPDATE file_blobs SET ref_count = ref_count - 1 WHERE sha256 = :sha256 RETURNING ref_count"
+
+
+class FileMeta(NamedTuple):
+    filename   : str
+    mime_type  : str
+    size       : int
+    chunk_size : int        # 分块存储的块大小，0表示内容在files.content（或尚未缓存的引用）
+    has_content: bool       # 内容已保存（files.content、file_chunks或blob存储）
+    source_uri : str
+    storage_key: str        # blob存储的key，空表示内容在数据库
+    created_at : datetime | None
+
 
 def get_file_by_id(request_id: str, file_id: str) -> Tuple[str, str, int, bytes]:
     """
@@ -22,7 +51,7 @@ def get_file_by_id(request_id: str, file_id: str) -> Tuple[str, str, int, bytes]
         Tuple[str, str, int, bytes]: A tuple containing the filename, MIME type, file size in bytes, and file content as bytes.
                                      If the file is not found or an error occurs, returns ("", "", 0, b"").
     """
-    sql = "SELECT filename, mime_type, size, content FROM files WHERE id = :id"
+    sql = f"SELECT filename, mime_type, size, {_CONTENT_EXPR} AS content, storage_key FROM files WHERE id = :id"
     try:
         with engine.begin() as conn:
             result = conn.execute(
@@ -40,6 +69,8 @@ def get_file_by_id(request_id: str, file_id: str) -> Tuple[str, str, int, bytes]
                 mime_type = mapping.get("mime_type") or ""
                 size      = int(mapping.get("size") or  0)
                 content = mapping.get("content") or b""
+                if not content and mapping.get("storage_key"):
+                    content = get_blob_store().get(mapping["storage_key"])
                 return filename, str(mime_type), size, content
 
     except:
@@ -48,7 +79,7 @@ def get_file_by_id(request_id: str, file_id: str) -> Tuple[str, str, int, bytes]
     return "", "", 0, b""
 
 
-async def get_file_by_id_async(request_id: str, file_id: str) -> Tuple[str, str, int, bytes]:
+async def get_file_by_id_async(request_id: str, file_id: str) -> Tuple[str, str, int, bytes, str]:
     """
     Asynchronously retrieve file information and content from the database by file ID.
 
@@ -57,10 +88,11 @@ async def get_file_by_id_async(request_id: str, file_id: str) -> Tuple[str, str,
         file_id (str): The unique identifier of the file to retrieve.
 
     Returns:
-        Tuple[str, str, int, bytes]: A tuple containing the filename, MIME type, file size in bytes, and file content as bytes.
-                                     If the file is not found or an error occurs, returns ("", "", 0, b"").
+        Tuple[str, str, int, bytes, str]: A tuple containing the filename, MIME type, file size in bytes, file content as bytes
+                                     and the upstream source uri (file references not cached yet have empty content).
+                                     If the file is not found or an error occurs, returns ("", "", 0, b"", "").
     """
-    sql = "SELECT filename, mime_type, size, content FROM files WHERE id = :id"
+    sql = f"SELECT filename, mime_type, size, {_CONTENT_EXPR} AS content, source_uri, storage_key FROM files WHERE id = :id"
     try:
         async_engine = get_async_engine()
         async with async_engine.connect() as conn:
@@ -72,19 +104,22 @@ async def get_file_by_id_async(request_id: str, file_id: str) -> Tuple[str, str,
             row = result.first()
             if row is None:
                 logger.error(f"request_id:{request_id}, file_id:{file_id}, file not found")
-                return "", "", 0, b""
+                return "", "", 0, b"", ""
 
             mapping = row._mapping
             filename = mapping.get("filename") or ""
             mime_type = mapping.get("mime_type") or ""
             size      = int(mapping.get("size") or  0)
             content = mapping.get("content") or b""
-            return filename, str(mime_type), size, content
+            source_uri = mapping.get("source_uri") or ""
+            if not content and mapping.get("storage_key"):
+                content = await asyncio.to_thread(get_blob_store().get, mapping["storage_key"])
+            return filename, str(mime_type), size, content, source_uri
 
     except:
         logger.error(f"request_id:{request_id}, get file by id async exception:{traceback.format_exc()}")
 
-    return "", "", 0, b""
+    return "", "", 0, b"", ""
 
 
 def get_file_metadata_by_id(request_id: str, file_id: str) -> Tuple[str, str, int]:
@@ -124,7 +159,27 @@ def get_file_metadata_by_id(request_id: str, file_id: str) -> Tuple[str, str, in
     return "", "", 0
 
 
+async def get_file_metadata_by_id_async(request_id: str, file_id: str) -> Tuple[str, str, int]:
+    """get_file_metadata_by_id的异步版本"""
+    sql = "SELECT filename, mime_type, size FROM files WHERE id = :id"
+    try:
+        async with get_async_engine().connect() as conn:
+            row = (await conn.execute(text(sql), {"id": file_id})).first()
+        if row is None:
+            logger.error(f"request_id:{request_id}, file_id:{file_id}, filename not found")
+            return "", "", 0
+
+        filename, mime_type, size = row
+        return filename or "", mime_type or "", int(size or 0)
+    except:
+        logger.error(f"request_id:{request_id}, get filename by id async exception:{traceback.format_exc()}")
+
+    return "", "", 0
+
+
 def insert_file(request_id: str, file_id: str, filename: str, mime_type: str, size: int, file_data: bytes) -> bool:
+    if config.USE_FILE_CHUNKS or get_blob_store():
+        return insert_file_stream(request_id, file_id, filename, mime_type, size, io.BytesIO(file_data))
     sql = ("INSERT INTO files (id, filename, mime_type, size, content) "
                     "VALUES (:id, :filename, :mime_type, :size, :content)")
     try:
@@ -147,4 +202,250 @@ def insert_file(request_id: str, file_id: str, filename: str, mime_type: str, si
     except:
         logger.error(f"request_id:{request_id}, upload file fatal: {traceback.format_exc()}")
 
-    return False
\ No newline at end of file
+    return False
+
+
+def insert_file_stream(request_id: str, file_id: str, filename: str, mime_type: str, size: int, fileobj: BinaryIO) -> bool:
+    """
+    从文件对象逐块读取写入，不把整个文件读入内存
+    配置了blob存储时内容写入blob存储、数据库只保存元数据；否则写入file_chunks；都未开启时退化为insert_file
+    """
+    blob_store = get_blob_store()
+    if blob_store:
+        return _insert_file_blob(request_id, blob_store, file_id, filename, mime_type, fileobj)
+    if not config.USE_FILE_CHUNKS:
+        return insert_file(request_id, file_id, filename, mime_type, size, fileobj.read())
+
+    chunk_size = config.FILE_CHUNK_SIZE
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO files (id, filename, mime_type, size, chunk_size) "
+                        "VALUES (:id, :filename, :mime_type, :size, :chunk_size)"),
+                {"id": file_id, "filename": filename, "mime_type": mime_type, "size": size, "chunk_size": chunk_size}
+            )
+            seq = 0
+            while data := fileobj.read(chunk_size):
+                conn.execute(text(_INSERT_CHUNK_SQL), {"file_id": file_id, "seq": seq, "data": data})
+                seq += 1
+
+        logger.info(f"request_id:{request_id}, file insert database in {seq} chunks, size:{size}")
+        return True
+    except:
+        logger.error(f"request_id:{request_id}, upload file fatal: {traceback.format_exc()}")
+
+    return False
+
+
+async def insert_file_async(request_id: str, file_id: str, filename: str, mime_type: str, size: int, file_data: bytes) -> bool:
+    """写入涉及文件读取/哈希/blob存储等阻塞IO，整体放到线程池执行，不阻塞事件循环"""
+    return await asyncio.to_thread(insert_file, request_id, file_id, filename, mime_type, size, file_data)
+
+
+async def insert_file_stream_async(request_id: str, file_id: str, filename: str, mime_type: str, size: int, fileobj: BinaryIO) -> bool:
+    return await asyncio.to_thread(insert_file_stream, request_id, file_id, filename, mime_type, size, fileobj)
+
+
+def _hash_fileobj(fileobj: BinaryIO) -> tuple[str, int, BinaryIO]:
+    """
+    逐块计算sha256，returns: (sha256, size, 可从头读取的文件对象)
+    文件对象不可seek时边哈希边转存到临时文件
+    """
+    sha256, size = hashlib.sha256(), 0
+    if fileobj.seekable():
+        start = fileobj.tell()
+        while data := fileobj.read(config.FILE_CHUNK_SIZE):
+            sha256.update(data)
+            size += len(data)
+        fileobj.seek(start)
+        return sha256.hexdigest(), size, fileobj
+
+    spool = tempfile.SpooledTemporaryFile(max_size=config.ARTIFACT_SPOOL_MAX_MEMORY)
+    while data := fileobj.read(config.FILE_CHUNK_SIZE):
+        sha256.update(data)
+        size += len(data)
+        spool.write(data)
+    spool.seek(0)
+    return sha256.hexdigest(), size, spool
+
+
+def _put_blob(conn, blob_store, file_id: str, fileobj: BinaryIO) -> tuple[str, int]:
+    """
+    写入blob存储，returns: (storage_key, size)
+    开启去重时key为sha256，内容已存在则跳过写入，只增加引用计数
+    """
+    if not config.USE_FILE_DEDUP:
+        return file_id, blob_store.put(file_id, fileobj)
+
+    sha256, size, fileobj = _hash_fileobj(fileobj)
+    inserted = conn.execute(text(_ACQUIRE_BLOB_SQL), {"sha256": sha256, "size": size}).scalar()
+    if inserted:
+        blob_store.put(sha256, fileobj)
+    return sha256, size
+
+
+def _insert_file_blob(request_id: str, blob_store, file_id: str, filename: str, mime_type: str, fileobj: BinaryIO) -> bool:
+    try:
+        with engine.begin() as conn:
+            storage_key, size = _put_blob(conn, blob_store, file_id, fileobj)
+            conn.execute(
+                text("INSERT INTO files (id, filename, mime_type, size, storage_key) "
+                        "VALUES (:id, :filename, :mime_type, :size, :storage_key)"),
+                {"id": file_id, "filename": filename, "mime_type": mime_type, "size": size, "storage_key": storage_key}
+            )
+        logger.info(f"request_id:{request_id}, file insert blob store, storage_key:{storage_key}, size:{size}")
+        return True
+    except:
+        logger.error(f"request_id:{request_id}, upload file fatal: {traceback.format_exc()}")
+
+    return False
+
+
+def insert_file_reference(request_id: str, file_id: str, filename: str, mime_type: str, source_uri: str) -> bool:
+    """登记指向上游uri的文件引用，不保存内容（size未知时为0）"""
+    sql = ("INSERT INTO files (id, filename, mime_type, size, source_uri) "
+                    "VALUES (:id, :filename, :mime_type, 0, :source_uri)")
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text(sql),
+                {
+                    "id": file_id,
+                    "filename": filename,
+                    "mime_type": mime_type,
+                    "source_uri": source_uri
+                }
+            )
+        logger.info(f"request_id:{request_id}, file reference inserted, file_id:{file_id}, source_uri:{source_uri}")
+        return True
+    except:
+        logger.error(f"request_id:{request_id}, insert file reference fatal: {traceback.format_exc()}")
+
+    return False
+
+
+async def insert_file_reference_async(request_id: str, file_id: str, filename: str, mime_type: str, source_uri: str) -> bool:
+    sql = ("INSERT INTO files (id, filename, mime_type, size, source_uri) "
+                    "VALUES (:id, :filename, :mime_type, 0, :source_uri)")
+    try:
+        async with get_async_engine().begin() as conn:
+            await conn.execute(
+                text(sql),
+                {"id": file_id, "filename": filename, "mime_type": mime_type, "source_uri": source_uri}
+            )
+        logger.info(f"request_id:{request_id}, file reference inserted, file_id:{file_id}, source_uri:{source_uri}")
+        return True
+    except:
+        logger.error(f"request_id:{request_id}, insert file reference fatal: {traceback.format_exc()}")
+
+    return False
+
+
+async def cache_file_content_async(request_id: str, file_id: str, size: int, file_data: bytes) -> bool:
+    """将代理下载到的文件引用内容写回blob存储或数据库，之后不再访问上游"""
+    blob_store = get_blob_store()
+    try:
+        async with get_async_engine().begin() as conn:
+            if blob_store:
+                storage_key = file_id
+                if config.USE_FILE_DEDUP:
+                    storage_key = await asyncio.to_thread(lambda: hashlib.sha256(file_data).hexdigest())
+                    inserted = (await conn.execute(text(_ACQUIRE_BLOB_SQL), {"sha256": storage_key, "size": size})).scalar()
+                if not config.USE_FILE_DEDUP or inserted:
+                    await asyncio.to_thread(blob_store.put, storage_key, io.BytesIO(file_data))
+                result = await conn.execute(
+                    text("UPDATE files SET size = :size, storage_key = :storage_key "
+                            "WHERE id = :id AND content IS NULL AND chunk_size IS NULL AND storage_key IS NULL"),
+                    {"id": file_id, "size": size, "storage_key": storage_key}
+                )
+                if result.rowcount == 0 and config.USE_FILE_DEDUP:  # 其他请求已缓存，归还引用
+                    await conn.execute(text(_RELEASE_BLOB_SQL), {"sha256": storage_key})
+            elif config.USE_FILE_CHUNKS:
+                chunk_size = config.FILE_CHUNK_SIZE
+                for seq, offset in enumerate(range(0, len(file_data), chunk_size)):
+                    await conn.execute(
+                        text(_INSERT_CHUNK_SQL + " ON CONFLICT (file_id, seq) DO NOTHING"),
+                        {"file_id": file_id, "seq": seq, "data": file_data[offset:offset + chunk_size]}
+                    )
+                result = await conn.execute(
+                    text("UPDATE files SET size = :size, chunk_size = :chunk_size "
+                            "WHERE id = :id AND content IS NULL AND chunk_size IS NULL"),
+                    {"id": file_id, "size": size, "chunk_size": chunk_size}
+                )
+            else:
+                result = await conn.execute(
+                    text("UPDATE files SET content = :content, size = :size WHERE id = :id AND content IS NULL"),
+                    {"id": file_id, "size": size, "content": file_data}
+                )
+        logger.info(f"request_id:{request_id}, file_id:{file_id}, cache file content result: {result.rowcount}")
+        return True
+    except:
+        logger.error(f"request_id:{request_id}, cache file content fatal: {traceback.format_exc()}")
+
+    return False
+
+
+async def get_file_meta_async(request_id: str, file_id: str) -> FileMeta | None:
+    """只查询元数据，不读取内容；文件不存在或异常时返回None"""
+    sql = ("SELECT filename, mime_type, size, chunk_size, "
+                "(content IS NOT NULL OR chunk_size IS NOT NULL OR storage_key IS NOT NULL) AS has_content, "
+                "source_uri, storage_key, created_at FROM files WHERE id = :id")
+    try:
+        async with get_async_engine().connect() as conn:
+            row = (await conn.execute(text(sql), {"id": file_id})).first()
+        if row is None:
+            logger.error(f"request_id:{request_id}, file_id:{file_id}, file not found")
+            return None
+        mapping = row._mapping
+        return FileMeta(
+            filename    = mapping.get("filename") or "",
+            mime_type   = str(mapping.get("mime_type") or ""),
+            size        = int(mapping.get("size") or 0),
+            chunk_size  = int(mapping.get("chunk_size") or 0),
+            has_content = bool(mapping.get("has_content")),
+            source_uri  = mapping.get("source_uri") or "",
+            storage_key = mapping.get("storage_key") or "",
+            created_at  = mapping.get("created_at")
+        )
+    except:
+        logger.error(f"request_id:{request_id}, get file meta async exception:{traceback.format_exc()}")
+
+    return None
+
+
+async def iter_file_content_async(request_id: str, file_id: str, meta: FileMeta, start: int, end: int) -> AsyncIterator[bytes]:
+    """
+    流式读取文件[start, end]（闭区间）字节，每次只查询FILE_READ_BATCH_CHUNKS块，内存占用与文件大小无关
+    blob存储按范围读取；分块存储按seq定位块；旧文件用substring按块切片读取files.content
+    """
+    async_engine = get_async_engine()
+    if meta.storage_key:
+        async for data in get_blob_store().iter_range(meta.storage_key, start, end, config.FILE_CHUNK_SIZE):
+            yield data
+    elif meta.chunk_size:
+        chunk_size = meta.chunk_size
+        first, last = start // chunk_size, end // chunk_size
+        for batch_first in range(first, last + 1, config.FILE_READ_BATCH_CHUNKS):
+            batch_last = min(batch_first + config.FILE_READ_BATCH_CHUNKS - 1, last)
+            async with async_engine.connect() as conn:
+                result = await conn.execute(
+                    text("SELECT seq, data FROM file_chunks WHERE file_id = :file_id AND seq BETWEEN :first AND :last ORDER BY seq"),
+                    {"file_id": file_id, "first": batch_first, "last": batch_last}
+                )
+                rows = result.all()
+            for seq, data in rows:
+                offset = seq * chunk_size
+                yield bytes(data[max(start - offset, 0):end - offset + 1])
+    else:
+        chunk_size = config.FILE_CHUNK_SIZE
+        for offset in range(start, end + 1, chunk_size):
+            length = min(chunk_size, end + 1 - offset)
+            async with async_engine.connect() as conn:
+                data = (await conn.execute(
+                    text("SELECT substring(content FROM :offset FOR :length) FROM files WHERE id = :id"),
+                    {"id": file_id, "offset": offset + 1, "length": length}  # substring从1开始
+                )).scalar()
+            if not data:
+                logger.warning(f"request_id:{request_id}, file_id:{file_id}, content ends before offset {offset}")
+                return
+            yield bytes(data)
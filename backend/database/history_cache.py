@@ -0,0 +1,119 @@
+import time
+import json
+import base64
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import config
+
+# 会话列表/消息列表的分页游标与进程内缓存
+# 游标为最后一行的 (created_at, id) 的base64编码，按复合索引做keyset分页，翻页代价与历史长度无关
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(id)
+    except Exception as e:
+        raise InvalidCursorError(f"invalid cursor: {cursor}") from e
+
+
+class HistoryCache:
+    """
+    分页结果缓存：key为 (owner, cursor, limit)，owner为user_id或thread_id，value为 (items, next_cursor)
+    TTL + LRU淘汰；写入会话/消息时按owner整体失效
+    查询前取snapshot，写回时若owner在此之后失效过则丢弃，避免并发写入期间查到的旧结果被缓存
+    """
+    def __init__(self, max_size: int, ttl: float, max_invalidations: int = 4096):
+        self.max_size = max_size
+        self.ttl      = ttl
+        self._entries: OrderedDict[tuple, tuple[float, list, str | None]] = OrderedDict()
+        self._keys_by_owner: dict[str, set[tuple]] = {}
+        self._invalidated_at: OrderedDict[str, int] = OrderedDict()  # owner -> 最近一次失效的序号
+        self._max_invalidations = max_invalidations
+        self._seq   = 0
+        self._floor = 0  # 已从_invalidated_at中淘汰的最大序号，早于它的snapshot一律不写回
+        self._lock  = threading.Lock()
+
+        self.hits, self.misses, self.expirations, self.evictions, self.invalidations = 0, 0, 0, 0, 0
+
+    def snapshot(self) -> int:
+        with self._lock:
+            return self._seq
+
+    def get(self, owner: str, cursor: str | None, limit: int) -> tuple[list, str | None] | None:
+        key = (owner, cursor, limit)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expire_at, items, next_cursor = entry
+            if expire_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return items, next_cursor
+
+    def put(self, owner: str, cursor: str | None, limit: int, items: list, next_cursor: str | None, snapshot: int):
+        key = (owner, cursor, limit)
+        with self._lock:
+            if snapshot < self._floor or self._invalidated_at.get(owner, -1) >= snapshot:
+                return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, items, next_cursor)
+            self._keys_by_owner.setdefault(owner, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, owner: str):
+        with self._lock:
+            self._invalidated_at.pop(owner, None)
+            self._invalidated_at[owner] = self._seq
+            self._seq += 1
+            while len(self._invalidated_at) > self._max_invalidations:
+                _, seq = self._invalidated_at.popitem(last=False)
+                self._floor = max(self._floor, seq + 1)
+            keys = list(self._keys_by_owner.get(owner, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def _remove(self, key: tuple):
+        if self._entries.pop(key, None) is None:
+            return
+        keys = self._keys_by_owner.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_owner[key[0]]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "capacity": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+chat_list_cache    = HistoryCache(config.CHAT_HISTORY_CACHE_SIZE, config.CHAT_HISTORY_CACHE_TTL)
+message_list_cache = HistoryCache(config.CHAT_HISTORY_CACHE_SIZE, config.CHAT_HISTORY_CACHE_TTL)
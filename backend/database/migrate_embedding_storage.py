@@ -0,0 +1,112 @@
+import argparse
+import traceback
+from sqlalchemy import text
+
+from utils.log_util import logger
+import config
+from database.db_engine import engine
+from database import a2a_server_op
+
+# agent语义向量存储迁移工具（在backend目录下执行）
+#   python -m database.migrate_embedding_storage halfvec   # 新增halfvec列、同步触发器，回填并创建hnsw索引
+#   python -m database.migrate_embedding_storage binary    # 创建二值量化表达式hnsw索引（无需回填）
+#   python -m database.migrate_embedding_storage halfvec --eval 100   # 迁移后评估recall@10
+# 迁移完成后将config.A2A_SERVER_EMBEDDING_STORAGE改为对应值并重启服务
+
+
+def migrate_halfvec(batch_size: int):
+    dim = config.A2A_SERVER_EMBEDDING_DIM
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE a2a_server ADD COLUMN IF NOT EXISTS semantic_json_embedding_half HALFVEC({dim})"))
+        conn.execute(text(
+            "CREATE OR REPLACE FUNCTION a2a_server_sync_embedding_half() RETURNS trigger AS $$ "
+            "BEGIN "
+            f"  NEW.semantic_json_embedding_half := CAST(NEW.semantic_json_embedding AS halfvec({dim})); "
+            "  RETURN NEW; "
+            "END; "
+            "$$ LANGUAGE plpgsql"
+        ))
+        conn.execute(text("DROP TRIGGER IF EXISTS a2a_server_sync_embedding_half ON a2a_server"))
+        conn.execute(text(
+            "CREATE TRIGGER a2a_server_sync_embedding_half "
+            "BEFORE INSERT OR UPDATE OF semantic_json_embedding ON a2a_server "
+            "FOR EACH ROW EXECUTE FUNCTION a2a_server_sync_embedding_half()"
+        ))
+    logger.info("halfvec column and sync trigger ready")
+
+    # 分批回填，避免长事务
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            result = conn.execute(text(
+                f"UPDATE a2a_server SET semantic_json_embedding_half = CAST(semantic_json_embedding AS halfvec({dim})) "
+                "WHERE a2a_server_url IN ("
+                "SELECT a2a_server_url FROM a2a_server WHERE semantic_json_embedding_half IS NULL LIMIT :batch_size)"
+            ), {"batch_size": batch_size})
+        if result.rowcount <= 0:
+            break
+        total += result.rowcount
+        logger.info(f"backfilled {total} rows")
+
+    # CREATE INDEX CONCURRENTLY 不能在事务中执行
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS a2a_server_embedding_half_hnsw_idx "
+            "ON a2a_server USING hnsw (semantic_json_embedding_half halfvec_cosine_ops)"
+        ))
+    logger.info(f"halfvec migration finished, backfilled {total} rows")
+
+
+def migrate_binary():
+    dim = config.A2A_SERVER_EMBEDDING_DIM
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS a2a_server_embedding_bit_hnsw_idx "
+            f"ON a2a_server USING hnsw ((CAST(binary_quantize(semantic_json_embedding) AS bit({dim}))) bit_hamming_ops)"
+        ))
+    logger.info("binary quantization index created")
+
+
+def eval_recall(storage: str, sample_num: int, k: int = 10) -> float:
+    """以已注册agent的向量作为查询，对比全精度精确检索与两阶段检索的recall@k"""
+    config.A2A_SERVER_EMBEDDING_STORAGE = storage
+    approx_sql = a2a_server_op.vector_search_sql()
+    exact_sql = ("SELECT a2a_server_url FROM a2a_server "
+                    "ORDER BY semantic_json_embedding <=> CAST(:query_embedding AS vector) LIMIT :retrieve_num")
+    with engine.begin() as conn:
+        queries = [row[0] for row in conn.execute(
+            text("SELECT semantic_json_embedding::text FROM a2a_server ORDER BY random() LIMIT :n"), {"n": sample_num})]
+
+        recalls = []
+        for query_embedding in queries:
+            exact = {row[0] for row in conn.execute(text(exact_sql), {"query_embedding": query_embedding, "retrieve_num": k})}
+            approx = {row[0] for row in conn.execute(text(approx_sql), {
+                "query_embedding": query_embedding,
+                "distance_threshold": 2.0,
+                "retrieve_num": k,
+                "candidate_num": k * config.A2A_SERVER_RESCORE_OVERSAMPLE
+            })}
+            if exact:
+                recalls.append(len(exact & approx) / len(exact))
+
+    recall = sum(recalls) / len(recalls) if recalls else 0.0
+    logger.info(f"storage:{storage}, recall@{k} over {len(recalls)} queries: {recall:.4f}")
+    return recall
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("storage", choices=["halfvec", "binary"])
+    parser.add_argument("--batch_size", type=int, default=500)
+    parser.add_argument("--eval", type=int, default=0, help="评估recall@10使用的查询数量，0表示不评估")
+    args = parser.parse_args()
+
+    try:
+        if args.storage == "halfvec":
+            migrate_halfvec(args.batch_size)
+        else:
+            migrate_binary()
+        if args.eval > 0:
+            eval_recall(args.storage, args.eval)
+    except:
+        logger.error(f"migrate embedding storage to {args.storage} failed: {traceback.format_exc()}")
@@ -6,7 +6,7 @@ import random
 import json
 
 from utils.log_util import logger
-from database.db_engine import engine
+from database.db_engine import engine, get_async_engine
 
 
 def insert(request_id: str, user_id: str, to_mail: str) -> bool:
@@ -20,4 +20,17 @@ def insert(request_id: str, user_id: str, to_mail: str) -> bool:
         return True
     except:
         logger.error(f"request_id:{request_id}, user_id:{user_id}, to_mail:{to_mail}, insert user exception:{traceback.format_exc()}")
-        return False
\ No newline at end of file
+        return False
+
+
+async def insert_async(request_id: str, user_id: str, to_mail: str) -> bool:
+    try:
+        sql = "INSERT INTO user_info (user_id, to_mail) VALUES (:user_id, :to_mail) ON CONFLICT (user_id) DO NOTHING"
+        async with get_async_engine().begin() as conn:
+            await conn.execute(text(sql), {"user_id": user_id, "to_mail": to_mail})
+
+        logger.info(f"request_id:{request_id}, user_id:{user_id}, to_mail:{to_mail}, insert user success")
+        return True
+    except:
+        logger.error(f"request_id:{request_id}, user_id:{user_id}, to_mail:{to_mail}, insert user exception:{traceback.format_exc()}")
+        return False
@@ -0,0 +1,44 @@
+import struct
+import traceback
+import numpy as np
+from sqlalchemy import event
+
+from utils.log_util import logger
+
+# pgvector二进制格式：int16维度 + int16保留位 + 维度个大端float32
+# 相比str(list)文本格式（2048维约40KB），二进制为8KB，且两端都不需要文本解析
+
+
+def encode_vector(vec) -> bytes:
+    arr = np.asarray(vec, dtype=">f4")
+    return struct.pack(">HH", arr.shape[0], 0) + arr.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    dim, _ = struct.unpack_from(">HH", data)
+    return np.frombuffer(data, dtype=">f4", count=dim, offset=4).astype(np.float32)
+
+
+def to_pg_vector(vec) -> np.ndarray:
+    """查询参数统一转成float32数组，由注册的codec按二进制格式发送"""
+    return np.asarray(vec, dtype=np.float32)
+
+
+async def _set_vector_codec(conn):
+    try:
+        await conn.set_type_codec(
+            "vector",
+            schema="public",
+            encoder=encode_vector,
+            decoder=decode_vector,
+            format="binary"
+        )
+    except:
+        logger.error(f"register pgvector binary codec failed: {traceback.format_exc()}")
+
+
+def register_vector_codec(async_engine):
+    """在异步引擎（asyncpg）的每个新连接上注册vector类型的二进制codec"""
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.run_async(_set_vector_codec)
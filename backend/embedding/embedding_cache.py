@@ -0,0 +1,151 @@
+import os
+import mmap
+import zlib
+import struct
+import hashlib
+import threading
+import unicodedata
+import traceback
+from array import array
+from collections import OrderedDict
+
+from utils.log_util import logger
+import config
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本：NFKC + 合并空白，使仅有空白/全半角差异的文本命中同一缓存"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class DiskEmbeddingStore:
+    """
+    基于mmap的磁盘向量缓存，进程重启后仍有效，多个uvicorn worker共享同一文件
+    文件按槽位直接映射：slot = hash(key) % slots，冲突时直接覆盖（即淘汰）
+    每个槽位布局：key(16字节) + crc32(4字节) + 向量(dim个float32)
+    写入顺序为 向量 -> crc -> key，读取时校验key和crc，避免读到并发写入的半成品
+    """
+    KEY_SIZE = 16
+
+    def __init__(self, path: str, dimensions: int, slots: int):
+        self.dimensions = dimensions
+        self.slots      = slots
+        self.vec_size   = dimensions * 4
+        self.slot_size  = self.KEY_SIZE + 4 + self.vec_size
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_size = self.slot_size * slots
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < file_size:
+                os.ftruncate(fd, file_size)  # 稀疏文件，不会立即占用磁盘
+            self._mm = mmap.mmap(fd, file_size)
+        finally:
+            os.close(fd)
+
+    def _offset(self, key: bytes) -> int:
+        return (int.from_bytes(key[:8], "little") % self.slots) * self.slot_size
+
+    def get(self, key: bytes) -> list[float] | None:
+        off = self._offset(key)
+        if self._mm[off:off + self.KEY_SIZE] != key:
+            return None
+        crc, = struct.unpack_from("<I", self._mm, off + self.KEY_SIZE)
+        vec_bytes = self._mm[off + self.KEY_SIZE + 4:off + self.slot_size]
+        if zlib.crc32(vec_bytes) != crc:
+            return None
+        return array("f", vec_bytes).tolist()
+
+    def put(self, key: bytes, vec: list[float]) -> bool:
+        """写入向量，返回是否覆盖了其他key（淘汰）"""
+        vec_bytes = array("f", vec).tobytes()
+        if len(vec_bytes) != self.vec_size:
+            return False
+        off = self._offset(key)
+        old_key = self._mm[off:off + self.KEY_SIZE]
+        evicted = old_key != key and old_key != bytes(self.KEY_SIZE)
+        self._mm[off:off + self.KEY_SIZE] = bytes(self.KEY_SIZE)
+        self._mm[off + self.KEY_SIZE + 4:off + self.slot_size] = vec_bytes
+        struct.pack_into("<I", self._mm, off + self.KEY_SIZE, zlib.crc32(vec_bytes))
+        self._mm[off:off + self.KEY_SIZE] = key
+        return evicted
+
+
+class EmbeddingCache:
+    """
+    内容寻址的向量缓存，key为 (model, dimensions, 归一化文本) 的哈希
+    两级：进程内有界LRU + 磁盘mmap（可选，跨重启、跨worker共享）
+    """
+    def __init__(self,
+                    model: str,
+                    dimensions: int,
+                    lru_size: int = config.EMBEDDING_CACHE_LRU_SIZE,
+                    disk_dir: str = config.EMBEDDING_CACHE_DIR,
+                    disk_slots: int = config.EMBEDDING_CACHE_DISK_SLOTS
+                ):
+        self.model      = model
+        self.dimensions = dimensions
+        self.lru_size   = lru_size
+        self._lru: OrderedDict[bytes, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits, self.disk_hits, self.misses = 0, 0, 0
+        self.evictions, self.disk_evictions    = 0, 0
+
+        self._disk: DiskEmbeddingStore | None = None
+        if disk_dir:
+            path = os.path.join(disk_dir, f"{model}.{dimensions}.{disk_slots}.cache")
+            try:
+                self._disk = DiskEmbeddingStore(path, dimensions, disk_slots)
+            except:
+                logger.error(f"open disk embedding cache {path} failed, use memory cache only: {traceback.format_exc()}")
+
+    def make_key(self, text: str) -> bytes:
+        raw = f"{self.model}|{self.dimensions}|{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(raw).digest()[:DiskEmbeddingStore.KEY_SIZE]
+
+    def get(self, text: str) -> list[float] | None:
+        key = self.make_key(text)
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return vec
+
+            vec = self._disk.get(key) if self._disk else None
+            if vec is not None:
+                self.disk_hits += 1
+                self._put_lru(key, vec)
+                return vec
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vec: list[float]):
+        key = self.make_key(text)
+        with self._lock:
+            self._put_lru(key, vec)
+            if self._disk and self._disk.put(key, vec):
+                self.disk_evictions += 1
+
+    def _put_lru(self, key: bytes, vec: list[float]):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "dimensions": self.dimensions,
+            "lru_entries": len(self._lru),
+            "lru_capacity": self.lru_size,
+            "disk_enabled": self._disk is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+        }
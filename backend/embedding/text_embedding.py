@@ -1,13 +1,19 @@
-from utils.llm_client import client
+import asyncio
+import traceback
+
+from utils.llm_client import client, async_client
 from database import agent_op
 from utils.log_util import logger
+from embedding.embedding_cache import EmbeddingCache
+import config
 
 
 embedding_model = "text-embedding-v4"
 embedding_dim   = 2048
         
 
-def embed_text(input_text, model=embedding_model, dimensions=embedding_dim):
+def embed_text(input_text, model=embedding_model, dimensions=embedding_dim) -> list[float]:
+    """同步向量化（供脚本使用），直接返回向量"""
     completion = client.embeddings.create(
         model=model,
         input=input_text,
@@ -15,7 +21,107 @@ def embed_text(input_text, model=embedding_model, dimensions=embedding_dim):
         encoding_format="float"
     )
 
-    return completion.model_dump_json()
+    return completion.data[0].embedding
+
+
+class EmbeddingBatcher:
+    """
+    异步批量向量化服务
+    1. 在batch_window_ms时间窗口内收集并发请求，合并成一次批量调用
+    2. 同一时刻在途（等待发送或已发送未返回）的相同文本只请求一次
+    3. 请求前先查向量缓存（进程内LRU + 磁盘），命中则不发请求
+    """
+    def __init__(self, 
+                    model: str = embedding_model, 
+                    dimensions: int = embedding_dim,
+                    batch_window_ms: int = config.EMBEDDING_BATCH_WINDOW_MS,
+                    max_batch_size: int = config.EMBEDDING_BATCH_MAX_SIZE
+                ):
+        self.model          = model
+        self.dimensions     = dimensions
+        self.batch_window   = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.cache          = EmbeddingCache(model, dimensions)
+
+        self._pending : dict[str, asyncio.Future] = {}  # 等待发送的请求
+        self._inflight: dict[str, asyncio.Future] = {}  # 已发送、未返回的请求
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def embed(self, input_text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:  # future绑定事件循环，循环变化时重置状态
+            self._loop = loop
+            self._pending, self._inflight, self._flush_handle = {}, {}, None
+
+        vec = self.cache.get(input_text)
+        if vec is not None:
+            return vec
+
+        fut = self._inflight.get(input_text) or self._pending.get(input_text)
+        if fut is None:
+            fut = loop.create_future()
+            # 所有等待者都被取消时，避免"exception was never retrieved"告警
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._pending[input_text] = fut
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.batch_window, self._flush)
+
+        # shield：单个调用方被取消时不影响其他合并到同一future上的调用方
+        return await asyncio.shield(fut)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        self._inflight.update(batch)
+        asyncio.ensure_future(self._send_batch(batch))
+
+    async def _send_batch(self, batch: dict[str, asyncio.Future]):
+        texts = list(batch.keys())
+        try:
+            completion = await async_client.embeddings.create(
+                model=self.model,
+                input=texts,
+                dimensions=self.dimensions,
+                encoding_format="float"
+            )
+            for item in completion.data:
+                fut = batch[texts[item.index]]
+                self.cache.put(texts[item.index], item.embedding)
+                if not fut.done():
+                    fut.set_result(item.embedding)
+            for text, fut in batch.items():
+                if not fut.done():
+                    fut.set_exception(RuntimeError(f"no embedding returned for text: {text[:50]}"))
+        except Exception as e:
+            logger.error(f"batch embedding failed, batch size:{len(texts)}, error:{traceback.format_exc()}")
+            for fut in batch.values():
+                if not fut.done():
+                    fut.set_exception(e)
+        finally:
+            for text, fut in batch.items():
+                if self._inflight.get(text) is fut:
+                    del self._inflight[text]
+
+
+embedding_batcher = EmbeddingBatcher()
+
+
+async def embed_text_async(input_text: str) -> list[float]:
+    """异步向量化，并发请求会被合并成批量调用，直接返回向量"""
+    return await embedding_batcher.embed(input_text)
+
+
+def get_cache_stats() -> dict:
+    """向量缓存命中/未命中/淘汰计数"""
+    return embedding_batcher.cache.stats()
  
 
 if __name__ == "__main__":
@@ -30,9 +136,9 @@ if __name__ == "__main__":
             data = json.load(f)
             for i, d in enumerate(data):
                 d_str = json.dumps(d, ensure_ascii=False)
-                d_embeded = embed_text(d_str)
+                e_vec = embed_text(d_str)
 
-                fout.write(d_embeded)
+                fout.write(json.dumps(e_vec))
                 fout.write('\n')
                 print(f"finish {i+1}th embedding")
                 # if i >= 1:
@@ -47,8 +153,7 @@ if __name__ == "__main__":
                 agent_id = d["id"]
                 d_str = json.dumps(d, ensure_ascii=False)
 
-                json_obj = json.loads(line.strip())
-                e_vec = json_obj["data"][0]["embedding"]
+                e_vec = json.loads(line.strip())
 
                 agent_op.insert(agent_id, e_vec, d_str)
 
@@ -57,8 +162,7 @@ if __name__ == "__main__":
     def test_vec_retrieve():
         with open(embedding_output_file, 'r', encoding='utf-8') as f:
             for line in f:
-                json_obj = json.loads(line.strip())
-                e_vec = json_obj["data"][0]["embedding"]
+                e_vec = json.loads(line.strip())
 
                 agent_op.vector_retrieve(str(e_vec))
 
@@ -68,9 +172,7 @@ if __name__ == "__main__":
 
     def test_vec_retrieve2():
         query = "把我上传的照片转换成吉卜力动漫风"
-        d_embeded = embed_text(query)
-        d_embeded = json.loads(d_embeded)
-        e_vec = d_embeded["data"][0]["embedding"]
+        e_vec = embed_text(query)
         agent_op.vector_retrieve(str(e_vec))
 
     # test_vec_retrieve2()
\ No newline at end of file
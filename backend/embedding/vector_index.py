@@ -0,0 +1,126 @@
+import threading
+import numpy as np
+
+from utils.log_util import logger
+from embedding.text_embedding import embedding_dim
+
+
+def parse_vector(vec) -> np.ndarray:
+    """将pgvector的文本格式('[0.1,0.2,...]')或list转换为float32数组"""
+    if isinstance(vec, str):
+        return np.array(vec.strip("[]").split(","), dtype=np.float32)
+    return np.asarray(vec, dtype=np.float32)
+
+
+class VectorIndex:
+    """
+    进程内向量索引：按行存储L2归一化后的向量，一次矩阵乘法得到全部余弦相似度，精确top-k
+    每行附带id（a2a_server_url）和payload（(agent_card_json_str, semantic_json_str)）
+    索引未加载（ready为False）时，调用方应回退到数据库检索
+    """
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.ready      = False
+        self._lock      = threading.Lock()
+        self._matrix    = np.zeros((0, dimensions), dtype=np.float32)
+        self._ids     : list[str] = []
+        self._payloads: list[object] = []
+        self._pos     : dict[str, int] = {}
+        self._size      = 0
+
+    @staticmethod
+    def _normalize(vec: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def load(self, rows: list[tuple[str, object, object]]):
+        """全量加载，rows为(id, payload, vector)列表，构建完成后整体替换"""
+        matrix = np.zeros((max(len(rows), 1), self.dimensions), dtype=np.float32)
+        ids, payloads, pos = [], [], {}
+        for id, payload, vec in rows:
+            if id in pos:
+                continue
+            pos[id] = len(ids)
+            matrix[len(ids)] = self._normalize(parse_vector(vec))
+            ids.append(id)
+            payloads.append(payload)
+
+        with self._lock:
+            self._matrix, self._ids, self._payloads, self._pos = matrix, ids, payloads, pos
+            self._size = len(ids)
+            self.ready = True
+        logger.info(f"vector index loaded, size:{self._size}")
+
+    def upsert(self, id: str, payload: object, vec):
+        vec = self._normalize(parse_vector(vec))
+        with self._lock:
+            idx = self._pos.get(id)
+            if idx is None:
+                idx = self._size
+                if idx >= self._matrix.shape[0]:  # 容量翻倍，摊还O(1)
+                    grown = np.zeros((max(2 * self._matrix.shape[0], 16), self.dimensions), dtype=np.float32)
+                    grown[:self._size] = self._matrix[:self._size]
+                    self._matrix = grown
+                self._ids.append(id)
+                self._payloads.append(payload)
+                self._pos[id] = idx
+                self._size += 1
+            else:
+                self._payloads[idx] = payload
+            self._matrix[idx] = vec
+
+    def remove(self, id: str):
+        with self._lock:
+            idx = self._pos.pop(id, None)
+            if idx is None:
+                return
+            last = self._size - 1
+            if idx != last:  # 用最后一行填补空位
+                self._matrix[idx] = self._matrix[last]
+                self._ids[idx], self._payloads[idx] = self._ids[last], self._payloads[last]
+                self._pos[self._ids[idx]] = idx
+            self._ids.pop()
+            self._payloads.pop()
+            self._size = last
+
+    def get_vector(self, id: str) -> np.ndarray | None:
+        """返回归一化后的向量"""
+        with self._lock:
+            idx = self._pos.get(id)
+            return None if idx is None else self._matrix[idx].copy()
+
+    def search(self,
+                query_vec,
+                top_k: int,
+                distance_threshold: float = 2.0,
+                exclude_ids: set[str] | None = None
+            ) -> list[tuple[str, object, float]]:
+        """
+        returns:
+            按余弦距离（1 - cos，与pgvector的<=>一致）升序排列的(id, payload, distance)列表
+        """
+        query = self._normalize(parse_vector(query_vec))
+        with self._lock:
+            size = self._size
+            if size == 0 or top_k <= 0:
+                return []
+            distances = 1.0 - self._matrix[:size] @ query
+            k = min(size, top_k + len(exclude_ids or ()))
+            top_idx = np.argpartition(distances, k - 1)[:k] if k < size else np.arange(size)
+            top_idx = top_idx[np.argsort(distances[top_idx])]
+
+            results = []
+            for idx in top_idx:
+                distance = float(distances[idx])
+                if distance >= distance_threshold:
+                    break
+                if exclude_ids and self._ids[idx] in exclude_ids:
+                    continue
+                results.append((self._ids[idx], self._payloads[idx], distance))
+                if len(results) >= top_k:
+                    break
+            return results
+
+
+# a2a_server表的语义向量索引（启动时加载，注册时增量更新）
+agent_vector_index = VectorIndex(embedding_dim)
@@ -1,7 +1,7 @@
 import traceback
 import json
 
-from utils.llm_client import client
+from utils.llm_client import client, async_client
 from rank.llm_prompts import AGENT_RANK_SYSTEM_PROMPT, AGENT_CARD_RANK_SYSTEM_PROMPT
 import config
 from utils.log_util import logger
@@ -38,19 +38,29 @@ def rank_agent(query, candidate_agents, rank_num):
         return None
 
 
-def rank_agent_card(request_id: str,
+def _with_candidate_id(semantic_json_str: str, idx: int) -> str:
+    """在语义json对象的开头插入候选id，字符串拼接，不做json解析"""
+    return f'{{"id": {idx}, ' + semantic_json_str.lstrip()[1:]
+
+
+async def rank_agent_card(request_id: str,
                     text_input: str,
-                    candidate_cards: list[str]) -> int:
+                    candidate_cards: list[str],
+                    semantic_cards: list[str | None] | None = None) -> int:
+    """
+    semantic_cards: 与candidate_cards一一对应的语义json（a2a_server表中保存的semantic_json_str），
+                    缺失时按卡片内容从缓存中获取
+    """
     semantic_candidate_cards = []
     for i, cand_card in enumerate(candidate_cards):
-        semantic_card = a2a_util.transform_agent_card2semantic_json_str(request_id, cand_card)
+        semantic_card = semantic_cards[i] if semantic_cards and i < len(semantic_cards) else None
+        if not semantic_card:
+            semantic_card = a2a_util.get_semantic_json_str(request_id, cand_card)
         if semantic_card:
-            obj = json.loads(semantic_card)
-            obj["id"] = i
-            semantic_candidate_cards.append(json.dumps(obj, ensure_ascii=False))
+            semantic_candidate_cards.append(_with_candidate_id(semantic_card, i))
 
     user_prompt = f"Query:{text_input}，候选 Agent 列表：{semantic_candidate_cards}"
-    completion = client.chat.completions.create(
+    completion = await async_client.chat.completions.create(
         model=config.AGENT_CARD_RANK_MODEL, 
         messages=[
             {'role': 'system', 'content': AGENT_CARD_RANK_SYSTEM_PROMPT},
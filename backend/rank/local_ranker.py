@@ -0,0 +1,101 @@
+import json
+import traceback
+from functools import lru_cache
+import numpy as np
+
+from utils.log_util import logger
+import config
+from embedding.vector_index import agent_vector_index, parse_vector
+from agent_space import agent_health
+
+
+def _bigrams(text: str) -> set[str]:
+    """字符二元组，中文无需分词即可做字面匹配；单字文本保留单字"""
+    text = "".join(text.lower().split())
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+@lru_cache(maxsize=config.SEMANTIC_JSON_CACHE_SIZE)
+def _card_features(semantic_json_str: str) -> tuple[frozenset[str], tuple[str, ...]] | None:
+    """
+    从语义json中提取排序特征（按内容缓存）：
+        关键词二元组：名字、技能名字、技能标签
+        输入模式：默认输入模式 + 各技能输入模式
+    """
+    try:
+        semantic_json = json.loads(semantic_json_str)
+        keywords = [semantic_json.get("名字", "")]
+        input_modes = list(semantic_json.get("默认输入模式") or [])
+        for skill in semantic_json.get("技能列表") or []:
+            keywords.append(skill.get("技能名字", ""))
+            keywords.extend(skill.get("技能标签") or [])
+            input_modes.extend(skill.get("该技能输入模式") or [])
+
+        keyword_bigrams = set()
+        for keyword in keywords:
+            keyword_bigrams |= _bigrams(str(keyword))
+        return frozenset(keyword_bigrams), tuple(str(mode).lower() for mode in input_modes)
+    except:
+        logger.error(f"extract rank features from semantic json failed: {traceback.format_exc()}")
+        return None
+
+
+def _mode_match(mime_type: str, input_modes: tuple[str, ...]) -> bool:
+    """输入模式可能是完整MIME类型（image/png）、主类型（image、image/*）或text"""
+    mime_type = mime_type.lower()
+    major = mime_type.split("/")[0]
+    for mode in input_modes:
+        if mode == mime_type or mode in (major, f"{major}/*", "*/*", "*"):
+            return True
+    return False
+
+
+def score_agent_cards(request_id: str,
+                        text_input: str,
+                        candidate_urls: list[str],
+                        semantic_cards: list[str | None],
+                        query_embedding: list[float] | None,
+                        input_mime_types: list[str] | None = None
+                    ) -> list[float] | None:
+    """
+    本地打分（纯CPU，毫秒级）：
+        score = w_similarity * 余弦相似度（query向量 vs 进程内索引中的agent语义向量）
+              + w_keyword    * query二元组被agent名字/技能名/标签覆盖的比例
+              + w_io_mode    * 输入文件MIME类型被agent输入模式支持的比例（无文件时为0）
+              - w_health     * 健康降权系数（连续探测失败、延迟过高）
+    缺少query向量或候选向量时无法打分，返回None，由调用方回退到大模型排序
+    """
+    if query_embedding is None or not candidate_urls:
+        return None
+
+    query = parse_vector(query_embedding)
+    norm = np.linalg.norm(query)
+    if norm <= 0:
+        return None
+    query = query / norm
+
+    weights = config.AGENT_CARD_LOCAL_RANK_WEIGHTS
+    query_bigrams = _bigrams(text_input)
+    scores = []
+    for i, a2a_server_url in enumerate(candidate_urls):
+        vec = agent_vector_index.get_vector(a2a_server_url)
+        if vec is None:
+            logger.info(f"request_id:{request_id}, no vector for candidate {a2a_server_url} in local index")
+            return None
+        score = weights["similarity"] * float(vec @ query)
+
+        semantic_card = semantic_cards[i] if i < len(semantic_cards) else None
+        features = _card_features(semantic_card) if semantic_card else None
+        if features:
+            keyword_bigrams, input_modes = features
+            if query_bigrams:
+                score += weights["keyword"] * len(query_bigrams & keyword_bigrams) / len(query_bigrams)
+            if input_mime_types:
+                matched = sum(1 for mime_type in input_mime_types if _mode_match(mime_type, input_modes))
+                score += weights["io_mode"] * matched / len(input_mime_types)
+        score -= weights.get("health", 0.0) * agent_health.health_penalty(a2a_server_url)
+        scores.append(score)
+
+    return scores
@@ -0,0 +1,109 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from utils.log_util import logger
+import config
+from embedding.embedding_cache import normalize_text
+
+
+class RankCache:
+    """
+    排序决策缓存：key为 归一化query + 候选agent集合指纹（排序后的url列表的哈希），value为选中的agent url
+    TTL + LRU淘汰；任一候选agent重新注册/更新/删除时，所有包含该agent的条目失效
+    存url而不是下标：同一候选集合在不同请求中的检索顺序可能不同
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl      = ttl
+        self._entries: OrderedDict[str, tuple[float, str, frozenset[str]]] = OrderedDict()
+        self._keys_by_url: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+        self.hits, self.misses, self.expirations, self.evictions, self.invalidations = 0, 0, 0, 0, 0
+
+    @staticmethod
+    def make_key(query: str, candidate_urls: list[str]) -> str:
+        fingerprint = "\n".join(sorted(set(candidate_urls)))
+        return hashlib.sha256(f"{normalize_text(query)}\x00{fingerprint}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expire_at, selected_url, _ = entry
+            if expire_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return selected_url
+
+    def put(self, key: str, candidate_urls: list[str], selected_url: str):
+        urls = frozenset(candidate_urls)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, selected_url, urls)
+            for url in urls:
+                self._keys_by_url.setdefault(url, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_url(self, url: str):
+        with self._lock:
+            keys = list(self._keys_by_url.get(url, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        if keys:
+            logger.info(f"rank cache invalidated {len(keys)} entries for agent {url}")
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for url in entry[2]:
+            keys = self._keys_by_url.get(url)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_url[url]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "capacity": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+agent_rank_cache = RankCache(config.AGENT_RANK_CACHE_SIZE, config.AGENT_RANK_CACHE_TTL)
+
+
+def lookup(query: str, candidate_urls: list[str]) -> str | None:
+    if not config.USE_AGENT_RANK_CACHE or not candidate_urls:
+        return None
+    return agent_rank_cache.get(RankCache.make_key(query, candidate_urls))
+
+
+def store(query: str, candidate_urls: list[str], selected_url: str):
+    if not config.USE_AGENT_RANK_CACHE or not candidate_urls or not selected_url:
+        return
+    # 选中的agent可能不在候选集合中（如react agent自行检索），同样需要随其变更失效
+    agent_rank_cache.put(RankCache.make_key(query, candidate_urls), [*candidate_urls, selected_url], selected_url)
+
+
+def apply_a2a_server_change(op: str, a2a_server_url: str, row: dict | None):
+    """a2a_server表变更订阅回调：候选agent变化后，相关排序决策失效"""
+    agent_rank_cache.invalidate_url(a2a_server_url)
@@ -0,0 +1,87 @@
+import time
+import traceback
+
+from utils.log_util import logger
+import config
+from rank import llm_ranker, local_ranker, rank_cache
+from utils import a2a_util
+
+# agent卡片排序入口，按config.AGENT_CARD_RANKER选择后端：
+#   llm    : 大模型排序（AGENT_CARD_RANK_MODEL）
+#   local  : 本地相似度+特征打分，直接取最高分
+#   cascade: 先本地打分，最高分与次高分的差距低于AGENT_CARD_RANK_MARGIN_THRES（或最高分低于AGENT_CARD_RANK_MIN_SCORE）时，
+#            再交给大模型排序
+
+
+async def _llm_rank(request_id: str, text_input: str, candidate_cards: list[str], semantic_cards: list[str | None], **kwargs) -> int:
+    return await llm_ranker.rank_agent_card(request_id, text_input, candidate_cards, semantic_cards)
+
+
+async def _local_rank(request_id: str, text_input: str, candidate_cards: list[str], semantic_cards: list[str | None], 
+                    candidate_urls: list[str], query_embedding: list[float] | None, input_mime_types: list[str] | None, 
+                    fallback: bool = False) -> int:
+    scores = local_ranker.score_agent_cards(request_id, text_input, candidate_urls, semantic_cards, query_embedding, input_mime_types)
+    if not scores:
+        logger.info(f"request_id:{request_id}, local ranker can not score candidates, fallback to llm ranker")
+        return await _llm_rank(request_id, text_input, candidate_cards, semantic_cards)
+
+    order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    top_score = scores[order[0]]
+    margin = top_score - scores[order[1]] if len(order) > 1 else top_score
+    logger.info(f"request_id:{request_id}, local rank scores:{[round(s, 4) for s in scores]}, top:{order[0]}, margin:{margin:.4f}")
+
+    if fallback and (margin < config.AGENT_CARD_RANK_MARGIN_THRES or top_score < config.AGENT_CARD_RANK_MIN_SCORE):
+        logger.info(f"request_id:{request_id}, local rank not confident, fallback to llm ranker")
+        return await _llm_rank(request_id, text_input, candidate_cards, semantic_cards)
+    return order[0]
+
+
+async def _cascade_rank(*args, **kwargs) -> int:
+    return await _local_rank(*args, fallback=True, **kwargs)
+
+
+_RANKERS = {
+    "llm": _llm_rank,
+    "local": _local_rank,
+    "cascade": _cascade_rank,
+}
+
+
+async def rank_agent_card(request_id: str,
+                    text_input: str,
+                    candidate_cards: list[str],
+                    semantic_cards: list[str | None] | None = None,
+                    candidate_urls: list[str] | None = None,
+                    query_embedding: list[float] | None = None,
+                    input_mime_types: list[str] | None = None) -> int:
+    """
+    从候选agent中选出最匹配用户输入的一个
+    returns:
+        选中的候选下标，没有合适的agent或出错时返回-1
+    """
+    start = time.perf_counter()
+    try:
+        if not candidate_cards:
+            return -1
+
+        cached_url = rank_cache.lookup(text_input, candidate_urls) if candidate_urls else None
+        if cached_url in (candidate_urls or ()):
+            idx = candidate_urls.index(cached_url)
+            logger.info(f"request_id:{request_id}, rank agent card hit rank cache, selected:{idx}")
+            return idx
+
+        if not semantic_cards:
+            semantic_cards = [a2a_util.get_semantic_json_str(request_id, card) for card in candidate_cards]
+        ranker = _RANKERS.get(config.AGENT_CARD_RANKER, _cascade_rank)
+        idx = await ranker(request_id, text_input, candidate_cards, semantic_cards, 
+                        candidate_urls=candidate_urls or [], 
+                        query_embedding=query_embedding, 
+                        input_mime_types=input_mime_types)
+        if candidate_urls and 0 <= idx < len(candidate_urls):
+            rank_cache.store(text_input, candidate_urls, candidate_urls[idx])
+        logger.info(f"request_id:{request_id}, rank agent card by {config.AGENT_CARD_RANKER} selected:{idx}, cost:{time.perf_counter() - start:.3f}s")
+        return idx
+    except Exception:
+        logger.error(f"request_id:{request_id}, rank agent card failed: {traceback.format_exc()}")
+
+    return -1
@@ -0,0 +1,20 @@
+import config
+
+
+def reciprocal_rank_fusion(ranked_lists: list[list[str]], 
+                            k: int = config.A2A_SERVER_RRF_K,
+                            weights: list[float] | None = None
+                        ) -> list[tuple[str, float]]:
+    """
+    倒数排名融合（RRF）：score(d) = Σ weight_i / (k + rank_i(d))，rank从1开始
+    各路召回的分数量纲不同（余弦距离、三元组相似度），RRF只依赖名次，无需归一化
+    returns:
+        按融合分数降序排列的(id, score)列表
+    """
+    scores: dict[str, float] = {}
+    for i, ranked_list in enumerate(ranked_lists):
+        weight = weights[i] if weights else 1.0
+        for rank, id in enumerate(ranked_list, start=1):
+            scores[id] = scores.get(id, 0.0) + weight / (k + rank)
+
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
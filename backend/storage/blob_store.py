@@ -0,0 +1,162 @@
+import os
+import re
+import asyncio
+import tempfile
+import traceback
+from typing import AsyncIterator, BinaryIO
+
+from utils.log_util import logger
+import config
+
+# 文件内容存储后端：数据库files表只保存元数据和storage_key，内容放在本地目录或S3兼容对象存储
+# config.FILE_BLOB_STORE: db（内容仍存数据库） / local / s3
+
+_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+class BlobStore:
+    def put(self, key: str, fileobj: BinaryIO) -> int:
+        """从文件对象流式写入，returns: 写入的字节数"""
+        raise NotImplementedError
+
+    def get(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def iter_range(self, key: str, start: int, end: int, chunk_size: int) -> AsyncIterator[bytes]:
+        """异步按块读取[start, end]（闭区间）"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> str | None:
+        """本地文件路径，可直接用FileResponse（sendfile）返回；非本地存储返回None"""
+        return None
+
+    @staticmethod
+    def check_key(key: str):
+        if not _KEY_PATTERN.match(key):
+            raise ValueError(f"invalid blob key: {key}")
+
+
+class LocalBlobStore(BlobStore):
+    """
+    本地目录存储，按key前4个字符分两级子目录，避免单目录文件过多
+    先写临时文件再rename，读取方不会看到写了一半的文件
+    """
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        self.check_key(key)
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, key: str, fileobj: BinaryIO) -> int:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while data := fileobj.read(config.FILE_CHUNK_SIZE):
+                    f.write(data)
+                    size += len(data)
+            os.replace(tmp_path, path)
+        except:
+            os.unlink(tmp_path)
+            raise
+        return size
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    async def iter_range(self, key: str, start: int, end: int, chunk_size: int) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, self._path(key), "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = await asyncio.to_thread(f.read, min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+        finally:
+            f.close()
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key: str) -> str | None:
+        path = self._path(key)
+        return path if os.path.exists(path) else None
+
+
+class S3BlobStore(BlobStore):
+    """S3兼容对象存储（如本地测试用的MinIO），需安装boto3"""
+    def __init__(self, endpoint_url: str, bucket: str, access_key: str, secret_key: str, region: str):
+        import boto3  # 可选依赖，只在使用s3后端时需要
+        self.bucket = bucket
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            region_name=region or None
+        )
+
+    def put(self, key: str, fileobj: BinaryIO) -> int:
+        self.check_key(key)
+        start = fileobj.tell()
+        self._client.upload_fileobj(fileobj, self.bucket, key)  # 大文件自动分片上传
+        return fileobj.tell() - start
+
+    def get(self, key: str) -> bytes:
+        self.check_key(key)
+        return self._client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    async def iter_range(self, key: str, start: int, end: int, chunk_size: int) -> AsyncIterator[bytes]:
+        self.check_key(key)
+        response = await asyncio.to_thread(self._client.get_object, Bucket=self.bucket, Key=key, Range=f"bytes={start}-{end}")
+        body = response["Body"]
+        try:
+            while data := await asyncio.to_thread(body.read, chunk_size):
+                yield data
+        finally:
+            body.close()
+
+    def delete(self, key: str):
+        self.check_key(key)
+        self._client.delete_object(Bucket=self.bucket, Key=key)
+
+
+_blob_store: BlobStore | None = None
+_blob_store_inited = False
+
+
+def get_blob_store() -> BlobStore | None:
+    """returns: 配置的存储后端，FILE_BLOB_STORE为db或初始化失败时返回None（内容存数据库）"""
+    global _blob_store, _blob_store_inited
+    if _blob_store_inited:
+        return _blob_store
+    _blob_store_inited = True
+    try:
+        if config.FILE_BLOB_STORE == "local":
+            _blob_store = LocalBlobStore(config.FILE_BLOB_LOCAL_DIR)
+        elif config.FILE_BLOB_STORE == "s3":
+            _blob_store = S3BlobStore(
+                config.FILE_BLOB_S3_ENDPOINT,
+                config.FILE_BLOB_S3_BUCKET,
+                config.FILE_BLOB_S3_ACCESS_KEY,
+                config.FILE_BLOB_S3_SECRET_KEY,
+                config.FILE_BLOB_S3_REGION
+            )
+        logger.info(f"file blob store: {config.FILE_BLOB_STORE}")
+    except:
+        logger.error(f"init file blob store {config.FILE_BLOB_STORE} failed, store file content in database: {traceback.format_exc()}")
+    return _blob_store
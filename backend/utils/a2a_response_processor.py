@@ -0,0 +1,161 @@
+import json
+import mimetypes
+import posixpath
+import urllib.parse
+from uuid import uuid4
+import traceback
+from typing import AsyncIterator, Iterator, NamedTuple
+from a2a.types import (
+    DataPart,
+    FilePart,
+    FileWithBytes,
+    FileWithUri,
+    Part,
+    TextPart,
+    Task,
+    Message,
+    TaskStatusUpdateEvent,
+    TaskArtifactUpdateEvent,
+)
+
+from utils.log_util import logger
+import config
+from database import file_op
+from utils import file_util
+from utils.artifact_assembler import ArtifactAssembler
+
+
+class A2APart(NamedTuple):
+    """各类A2A结果（Task/Message/状态更新/artifact更新）归一化后的part"""
+    source_id : str           # artifactId或messageId
+    text      : str
+    name      : str
+    mime_type : str
+    file_data : str           # FileWithBytes的base64字符串
+    file_uri  : str           # FileWithUri的上游uri，由处理器登记引用或流式下载
+    restart   : bool          # 同一artifact重新开始（artifact更新事件append不为True）
+    last_chunk: bool          # 该artifact的最后一块
+
+
+def process_a2a_part(request_id: str, source_id: str, part: Part, restart: bool = False, last_chunk: bool = False) -> A2APart | None:
+    root = part.root
+    if isinstance(root, TextPart):
+        return A2APart(source_id, root.text, "", "", "", "", restart, last_chunk)
+    if isinstance(root, DataPart):
+        data = json.dumps(root.data, ensure_ascii=False)
+        return A2APart(source_id, "```json" + data + "```", "", "", "", "", restart, last_chunk)
+    if isinstance(root, FilePart):
+        file = root.file
+        if isinstance(file, FileWithBytes):
+            return A2APart(source_id, "", file.name, file.mimeType, file.bytes, "", restart, last_chunk)
+        if isinstance(file, FileWithUri):
+            logger.info(f"request_id:{request_id}, file uri is {file.uri}")
+            return A2APart(source_id, "", file.name, file.mimeType, "", file.uri, restart, last_chunk)
+    logger.warning(f"request_id:{request_id}, unknown a2a part: {type(root)}")
+    return None
+
+
+async def insert_file_reference(request_id: str, name: str, mime_type: str, file_uri: str) -> str:
+    """登记文件引用，下载时由/agent-space/download_file代理上游，returns: 文件id，失败时为空"""
+    path = urllib.parse.urlsplit(file_uri)
+    if path.scheme not in ("http", "https"):
+        logger.warning(f"request_id:{request_id}, unsupported file uri: {file_uri}")
+        return ""
+    filename  = name or posixpath.basename(path.path) or config.DEFAULT_FILENAME_IN_DATABASE
+    mime_type = mime_type or mimetypes.guess_type(filename)[0] or config.DEFAULT_MIME_TYPE_IN_DATABASE
+    gen_file_id = uuid4().hex
+    if await file_op.insert_file_reference_async(request_id, gen_file_id, filename, mime_type, file_uri):
+        return gen_file_id
+    return ""
+
+
+async def download_to_assembler(request_id: str, assembler: ArtifactAssembler, file_uri: str) -> bool:
+    """流式下载到assembler当前的artifact，失败时丢弃该artifact，避免入库不完整的文件"""
+    try:
+        async for chunk in file_util.iter_download(file_uri):
+            assembler.write(chunk)
+        return True
+    except file_util.FileTooLargeError as e:
+        logger.error(f"request_id:{request_id}, download {file_uri} failed: {e}")
+    except:
+        logger.error(f"request_id:{request_id}, download {file_uri} failed: {traceback.format_exc()}")
+    assembler.discard()
+    return False
+
+
+def iter_a2a_parts(request_id: str, result: Task | Message | TaskStatusUpdateEvent | TaskArtifactUpdateEvent) -> Iterator[A2APart]:
+    """
+    将一个A2A结果单遍展开为part流：
+        Task                   : status.message的part（优先展示），然后各artifact的part（每个artifact的最后一块标记last_chunk）
+        Message                : 各part
+        TaskStatusUpdateEvent  : status.message的part
+        TaskArtifactUpdateEvent: artifact的part；append不为True时表示该artifact重新开始，lastChunk标记在最后一个part上
+    """
+    if isinstance(result, Message):
+        messages, artifacts = [result], []
+    elif isinstance(result, Task):
+        messages = [result.status.message] if result.status.message else []
+        artifacts = [(artifact, True, True) for artifact in result.artifacts or []]
+    elif isinstance(result, TaskStatusUpdateEvent):
+        messages, artifacts = ([result.status.message] if result.status.message else []), []
+    elif isinstance(result, TaskArtifactUpdateEvent):
+        messages, artifacts = [], [(result.artifact, not result.append, bool(result.lastChunk))]
+    else:
+        logger.error(f"request_id:{request_id}, unknown a2a result type: {type(result)}")
+        return
+
+    for message in messages:
+        for part in message.parts:
+            item = process_a2a_part(request_id, message.messageId, part, last_chunk=True)
+            if item:
+                yield item
+
+    for artifact, restart, last_chunk in artifacts:
+        parts = artifact.parts
+        for i, part in enumerate(parts):
+            item = process_a2a_part(request_id, artifact.artifactId, part, restart and i == 0, last_chunk and i == len(parts) - 1)
+            if item:
+                yield item
+
+
+class A2AResponseProcessor:
+    """
+    A2A响应处理：文本直接输出，文件分块交给ArtifactAssembler线性拼装
+    文件uri在开启USE_FILE_REFERENCE时只登记引用，否则流式下载并逐块写入assembler
+    文件在 该artifact收到lastChunk / 切换到其他artifact / 同一artifact重新开始 / 响应结束 时入库
+    输出 ("text", 文本) 或 ("file", 文件id)
+    """
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.assembler  = ArtifactAssembler(request_id)
+
+    async def feed(self, result: Task | Message | TaskStatusUpdateEvent | TaskArtifactUpdateEvent) -> AsyncIterator[tuple[str, str]]:
+        for item in iter_a2a_parts(self.request_id, result):
+            if item.text:
+                yield "text", item.text
+            if item.file_uri and config.USE_FILE_REFERENCE:
+                file_id = await insert_file_reference(self.request_id, item.name, item.mime_type, item.file_uri)
+                if file_id:
+                    yield "file", file_id
+            elif item.file_uri or item.file_data:
+                if item.restart and self.assembler.current_id == item.source_id:
+                    file_id = await self.assembler.finish()
+                    if file_id:
+                        yield "file", file_id
+                file_id = await self.assembler.add(item.source_id, item.name, item.mime_type, item.file_data)
+                if file_id:
+                    yield "file", file_id
+                if item.file_uri:
+                    await self._download(item.file_uri)
+            if item.last_chunk and self.assembler.current_id == item.source_id:
+                file_id = await self.assembler.finish()
+                if file_id:
+                    yield "file", file_id
+
+    async def _download(self, file_uri: str):
+        await download_to_assembler(self.request_id, self.assembler, file_uri)
+
+    async def finish(self) -> AsyncIterator[tuple[str, str]]:
+        file_id = await self.assembler.finish()
+        if file_id:
+            yield "file", file_id
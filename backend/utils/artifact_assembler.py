@@ -0,0 +1,130 @@
+import binascii
+import tempfile
+from uuid import uuid4
+import magic
+
+from utils.log_util import logger
+import config
+from database import file_op
+
+_WHITESPACE = b" \t\r\n"
+
+
+class IncrementalBase64Decoder:
+    """
+    增量base64解码：每次只解码完整的4字符组，不完整的尾部留到下一块
+    兼容每个分块各自带padding的情况（直接拼接后整体b64decode会在第一个padding处截断）
+    """
+    def __init__(self):
+        self._pending = b""
+
+    def decode(self, chunk: str | bytes) -> bytes:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("ascii")
+        data = self._pending + chunk.translate(None, _WHITESPACE)
+        out = bytearray()
+        while True:
+            pad = data.find(b"=")
+            if pad < 0:
+                break
+            end = (pad // 4 + 1) * 4  # 含padding的4字符组结束位置
+            if end > len(data):
+                break
+            out += binascii.a2b_base64(data[:end])
+            data = data[end:].lstrip(b"=")
+        n = len(data) // 4 * 4
+        out += binascii.a2b_base64(data[:n])
+        self._pending = data[n:]
+        return bytes(out)
+
+    def flush(self) -> bytes:
+        """处理缺少padding的尾部"""
+        pending, self._pending = self._pending, b""
+        if not pending:
+            return b""
+        return binascii.a2b_base64(pending + b"=" * (-len(pending) % 4))
+
+
+class ArtifactAssembler:
+    """
+    流式拼装agent返回的文件：同一artifact的分块依次解码后写入临时文件（小于ARTIFACT_SPOOL_MAX_MEMORY时在内存中），
+    artifact id变化或结束时入库，整体为线性复制
+    add的数据为str时视为base64（FileWithBytes），为bytes时视为原始内容（由uri下载）
+    """
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self._id: str | None = None
+
+    @property
+    def current_id(self) -> str | None:
+        """正在拼装的artifact id"""
+        return self._id
+
+    def _start(self, id: str):
+        self._id        = id
+        self._name      = ""
+        self._mime_type = ""
+        self._size      = 0
+        self._head      = b""
+        self._decoder   = IncrementalBase64Decoder()
+        self._spool     = tempfile.SpooledTemporaryFile(max_size=config.ARTIFACT_SPOOL_MAX_MEMORY)
+
+    def _write(self, data: bytes):
+        if not data:
+            return
+        if len(self._head) < 2048:
+            self._head += data[:2048 - len(self._head)]
+        self._spool.write(data)
+        self._size += len(data)
+
+    def write(self, data: bytes):
+        """向当前artifact追加原始bytes（流式下载的文件块）"""
+        if self._id is not None:
+            self._write(data)
+
+    def discard(self):
+        """丢弃当前artifact（如下载失败），不入库"""
+        if self._id is None:
+            return
+        self._spool.close()
+        self._id = None
+
+    async def add(self, id: str, name: str, mime_type: str, data: str | bytes) -> str:
+        """returns: artifact id变化时，上一个文件入库后的文件id，否则为空"""
+        file_id = ""
+        if self._id is not None and id != self._id:
+            file_id = await self.finish()
+        if self._id is None:
+            self._start(id)
+        if name:
+            self._name = name
+        if mime_type:
+            self._mime_type = mime_type
+        self._write(self._decoder.decode(data) if isinstance(data, str) else data)
+        return file_id
+
+    async def finish(self) -> str:
+        """当前文件入库，returns: 文件id，没有内容或入库失败时为空"""
+        if self._id is None:
+            return ""
+        try:
+            self._write(self._decoder.flush())
+            if self._size <= 0:
+                return ""
+            filename  = self._name or config.DEFAULT_FILENAME_IN_DATABASE
+            mime_type = self._mime_type or magic.from_buffer(self._head, mime=True)
+            if not mime_type:
+                mime_type = config.DEFAULT_MIME_TYPE_IN_DATABASE
+                logger.warning(f"request_id: {self.request_id}, cann't get mimetype, use default:{mime_type}")
+
+            self._spool.seek(0)
+            gen_file_id = uuid4().hex
+            if await file_op.insert_file_stream_async(self.request_id, gen_file_id, filename, mime_type, self._size, self._spool):
+                return gen_file_id
+        except (binascii.Error, ValueError):
+            logger.error(f"request_id: {self.request_id}, decode artifact {self._id} failed, invalid base64")
+        finally:
+            self._spool.close()
+            self._id = None
+
+        return ""
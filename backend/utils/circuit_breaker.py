@@ -0,0 +1,159 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from utils.log_util import logger
+import config
+
+# 按a2a_server_url的调用准入层：
+# 1. 并发上限：每个agent最多AGENT_CALL_MAX_INFLIGHT个进行中的调用，超出时排队，排队超过AGENT_CALL_QUEUE_TIMEOUT秒拒绝
+# 2. 熔断：滚动窗口内调用数达到下限且失败率（含首包过慢）超过阈值时打开，打开期间直接拒绝
+#    打开AGENT_BREAKER_OPEN_SECONDS秒后半开，只放行一个探测调用，成功则关闭，失败则重新打开
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class AgentUnavailableError(Exception):
+    """熔断打开或排队超时，调用未发出"""
+    def __init__(self, a2a_server_url: str, reason: str):
+        super().__init__(f"{a2a_server_url}: {reason}")
+        self.a2a_server_url = a2a_server_url
+        self.reason = reason
+
+
+class BreakerCall:
+    """一次被准入的调用，调用方通过它上报首包时间和失败"""
+    def __init__(self):
+        self.start = time.monotonic()
+        self.first_chunk_latency: float | None = None
+        self.error: str | None = None
+
+    def first_chunk(self):
+        if self.first_chunk_latency is None:
+            self.first_chunk_latency = time.monotonic() - self.start
+
+    def fail(self, error: str):
+        self.error = error
+
+
+class CircuitBreaker:
+    def __init__(self, a2a_server_url: str):
+        self.a2a_server_url = a2a_server_url
+        self.state          = CLOSED
+        self.opened_at      = 0.0
+        self.inflight       = 0
+        self.waiting        = 0
+        self.rejected       = 0
+        self._semaphore     = asyncio.Semaphore(config.AGENT_CALL_MAX_INFLIGHT)
+        self._probing       = False
+        self._window: deque[tuple[float, bool]] = deque()  # (结束时间, 是否失败)
+
+    def _trim(self, now: float):
+        while self._window and self._window[0][0] < now - config.AGENT_BREAKER_WINDOW_SECONDS:
+            self._window.popleft()
+
+    def _try_pass(self) -> bool:
+        """熔断检查，返回是否作为半开探测调用放行"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < config.AGENT_BREAKER_OPEN_SECONDS:
+                raise AgentUnavailableError(self.a2a_server_url, "circuit open")
+            self.state = HALF_OPEN
+            logger.info(f"circuit breaker of {self.a2a_server_url} half open")
+        if self.state == HALF_OPEN:
+            if self._probing:
+                raise AgentUnavailableError(self.a2a_server_url, "circuit half open, probe in progress")
+            self._probing = True
+            return True
+        return False
+
+    def _record(self, call: BreakerCall, probe: bool):
+        now = time.monotonic()
+        failed = call.error is not None or (call.first_chunk_latency or 0.0) > config.AGENT_BREAKER_SLOW_CALL_SECONDS
+        if probe:
+            self._probing = False
+            if failed:
+                self.state, self.opened_at = OPEN, now
+                logger.warning(f"circuit breaker of {self.a2a_server_url} probe failed ({call.error}), reopen")
+            else:
+                self.state = CLOSED
+                self._window.clear()
+                logger.info(f"circuit breaker of {self.a2a_server_url} closed")
+            return
+
+        self._window.append((now, failed))
+        self._trim(now)
+        if self.state == CLOSED and len(self._window) >= config.AGENT_BREAKER_MIN_CALLS:
+            failure_rate = sum(1 for _, f in self._window if f) / len(self._window)
+            if failure_rate >= config.AGENT_BREAKER_FAILURE_RATE:
+                self.state, self.opened_at = OPEN, now
+                logger.warning(f"circuit breaker of {self.a2a_server_url} open, failure rate:{failure_rate:.2f} over {len(self._window)} calls")
+
+    @asynccontextmanager
+    async def admit(self, request_id: str) -> AsyncIterator[BreakerCall]:
+        try:
+            probe = self._try_pass()
+        except AgentUnavailableError:
+            self.rejected += 1
+            raise
+
+        try:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), config.AGENT_CALL_QUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                logger.warning(f"request_id:{request_id}, queue timeout for agent {self.a2a_server_url}, inflight:{self.inflight}")
+                raise AgentUnavailableError(self.a2a_server_url, "too many concurrent calls")
+            finally:
+                self.waiting -= 1
+        except BaseException:
+            if probe:
+                self._probing = False
+            raise
+
+        self.inflight += 1
+        call = BreakerCall()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            # 调用方取消（如用户停止生成）不计入失败
+            if probe:
+                self._probing = False
+            probe = None
+            raise
+        except Exception as e:
+            call.fail(repr(e))
+            raise
+        finally:
+            self.inflight -= 1
+            self._semaphore.release()
+            if probe is not None:
+                self._record(call, probe)
+
+    def stats(self) -> dict:
+        self._trim(time.monotonic())
+        failures = sum(1 for _, f in self._window if f)
+        return {
+            "state": self.state,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "window_calls": len(self._window),
+            "window_failures": failures,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(a2a_server_url: str) -> CircuitBreaker:
+    breaker = _breakers.get(a2a_server_url)
+    if breaker is None:
+        breaker = _breakers[a2a_server_url] = CircuitBreaker(a2a_server_url)
+    return breaker
+
+
+def stats() -> dict:
+    return {a2a_server_url: breaker.stats() for a2a_server_url, breaker in _breakers.items()}
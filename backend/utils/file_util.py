@@ -1,16 +1,71 @@
-import requests
+import time
+from typing import AsyncIterator
+import httpx
 
 import config
+from utils import http_client
 
 def allowed_file(filename: str) -> bool:
     """检查文件扩展名是否允许"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in config.ALLOWED_EXTENSIONS
 
-def download_file(url: str) -> bytes:
-    """下载文件"""
+
+class FileTooLargeError(Exception):
+    pass
+
+
+async def iter_download(url: str,
+                        max_size: int = config.FILE_DOWNLOAD_MAX_SIZE,
+                        timeout: float = config.FILE_DOWNLOAD_TIMEOUT,
+                        chunk_size: int = config.FILE_DOWNLOAD_CHUNK_SIZE
+                    ) -> AsyncIterator[bytes]:
+    """
+    在共享连接池上流式下载文件，按块返回，不阻塞事件循环
+    超过max_size（字节）抛FileTooLargeError，整体超过timeout（秒）抛httpx.TimeoutException，非2xx抛httpx.HTTPStatusError
+    """
+    deadline = time.monotonic() + timeout
+    client = http_client.get_http_client()
+    async with client.stream("GET", url, timeout=httpx.Timeout(timeout, connect=config.HTTP_CLIENT_CONNECT_TIMEOUT)) as response:
+        response.raise_for_status()
+        content_length = int(response.headers.get("Content-Length") or 0)
+        if max_size and content_length > max_size:
+            raise FileTooLargeError(f"content length {content_length} exceeds {max_size}")
+
+        received = 0
+        async for chunk in response.aiter_bytes(chunk_size):
+            received += len(chunk)
+            if max_size and received > max_size:
+                raise FileTooLargeError(f"received more than {max_size} bytes")
+            if time.monotonic() > deadline:
+                raise httpx.TimeoutException(f"download exceeds {timeout}s")
+            yield chunk
+
+
+def parse_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """
+    解析单个Range（bytes=a-b / bytes=a- / bytes=-n），返回闭区间(start, end)
+    多段Range或格式无法识别时返回(0, size - 1)，即返回整个文件；范围不满足时返回None（应答416）
+    """
+    full = (0, size - 1)
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return full
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return full
     try:
-        response = requests.get(url)
-        return response.content
-    except:
-        return b""
\ No newline at end of file
+        if not first:  # 最后n个字节
+            length = int(last)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return full
+    if start > end:
+        return full
+    if start >= size:
+        return None
+    return start, min(end, size - 1)
@@ -0,0 +1,49 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import httpx
+
+from utils.log_util import logger
+import config
+
+# 进程内共享的httpx连接池（keep-alive，可用时启用HTTP/2），避免每次请求agent都重新建立TCP/TLS连接
+# 在FastAPI lifespan结束时调用close_http_client()关闭
+
+_client: httpx.AsyncClient | None = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  httpx[http2]的可选依赖
+        return True
+    except ImportError:
+        return False
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        http2 = config.HTTP_CLIENT_HTTP2 and _http2_available()
+        _client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(config.HTTP_CLIENT_TIMEOUT, connect=config.HTTP_CLIENT_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=config.HTTP_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=config.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.HTTP_CLIENT_KEEPALIVE_EXPIRY
+            )
+        )
+        logger.info(f"shared http client created, http2:{http2}")
+    return _client
+
+
+@asynccontextmanager
+async def shared_client() -> AsyncIterator[httpx.AsyncClient]:
+    """替代 `async with httpx.AsyncClient() as client`，退出时不关闭共享连接池"""
+    yield get_http_client()
+
+
+async def close_http_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
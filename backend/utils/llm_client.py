@@ -1,7 +1,13 @@
 import os
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 client = OpenAI(
     api_key=os.getenv("DASHSCOPE_API_KEY"),  # 如果您没有配置环境变量，请在此处用您的API Key进行替换
     base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"  # 百炼服务的base_url
-)
\ No newline at end of file
+)
+
+# 异步客户端（事件循环中使用，避免阻塞uvicorn）
+async_client = AsyncOpenAI(
+    api_key=os.getenv("DASHSCOPE_API_KEY"),
+    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
+)
@@ -7,8 +7,16 @@ export async function GET(req: NextRequest) {
     return NextResponse.json({ error: '缺少 thread_id 参数', ok: false });
   }
 
+  // 透传分页参数：cursor为上一页返回的next_cursor
+  const page = new URLSearchParams();
+  for (const name of ['cursor', 'limit']) {
+    const value = searchParams.get(name);
+    if (value) page.set(name, value);
+  }
+  const query = page.toString() ? `?${page.toString()}` : '';
+
   // 请求后端文件下载接口
-  const backendRes = await fetch(`http://127.0.0.1:5001/agent-space/get_message_list/${thread_id}`, {
+  const backendRes = await fetch(`http://127.0.0.1:5001/agent-space/get_message_list/${thread_id}${query}`, {
     method: 'GET',
   });
 
@@ -17,5 +25,5 @@ export async function GET(req: NextRequest) {
   }
 
   const data = await backendRes.json();
-  return NextResponse.json({ ok: true, data: data });
+  return NextResponse.json({ ok: true, data: data, next_cursor: backendRes.headers.get('X-Next-Cursor') });
 }
\ No newline at end of file
@@ -21,6 +21,85 @@ interface FetchDataProps {
   provider_url?: string
 }
 
+// 将一条流式事件/历史消息合并到消息列表，返回新列表
+function appendMessage(prev: Message[], data: FetchDataProps): Message[] {
+  const newMessages = [...prev];
+
+  const role = data.role || 'assistant';
+  if (role === 'user') {
+    const userMessage = {
+      role: role,
+      content: data.content,
+      source: "",
+      agentId: "",
+      providerUrl: "",
+      contentType: data.content_type
+    };
+    newMessages.push(userMessage);
+    return newMessages;
+  }
+
+  if (data.event === 'TEXT_MESSAGE_CHUNK') {
+    if (data.source === 'agent') {
+      const lastMessage = newMessages[newMessages.length - 1];
+      if (lastMessage && 
+          lastMessage.role === 'assistant' && 
+          lastMessage.source === 'agent' && 
+          lastMessage.agentId === data.agent_id &&
+          lastMessage.contentType === 'text') {
+        const updatedMessage = {
+          ...lastMessage,
+          content: (lastMessage?.content || '') + (data?.content || '')
+        };
+        newMessages[newMessages.length - 1] = updatedMessage;
+      } else {
+        const agentMessage = {
+          role: role,
+          content: data.content,
+          source: data.source,
+          agentId: data.agent_id,
+          providerUrl: data.provider_url,
+          contentType: data.content_type
+        };
+        newMessages.push(agentMessage);
+      }
+    } else {
+      const lastMessage = newMessages[newMessages.length - 1];
+      if (lastMessage && 
+          lastMessage.role === 'assistant' && 
+          lastMessage.source === 'platform') {
+        const updatedMessage = {
+          ...lastMessage,
+          content: (lastMessage?.content || '') + (data?.content || '')
+        };
+        newMessages[newMessages.length - 1] = updatedMessage;
+      } else {
+        const agentMessage = {
+          role: role,
+          content: data.content,
+          source: data.source,
+          agentId: data.agent_id,
+          providerUrl: data.provider_url,
+          contentType: data.content_type
+        };
+        newMessages.push(agentMessage);
+      }
+    }
+  } else if (data.event === 'FILE_ID_STRING') {
+    const agentMessage = {
+      role: role,
+      fileId: data.content,
+      source: data.source,
+      agentId: data.agent_id,
+      providerUrl: data.provider_url,
+      contentType: data.content_type
+    };
+    newMessages.push(agentMessage);
+  }
+
+  return newMessages;
+}
+
 export default function ChatPage() {
   const params = useParams();
   const searchParams = useSearchParams();
@@ -45,6 +124,9 @@ export default function ChatPage() {
   const [isCancelling, setIsCancelling] = useState(false);
   // WebSocket连接引用
   const wsRef = useRef<WebSocket | null>(null);
+  // 更早消息的分页游标（为空表示没有更早的消息）
+  const [olderCursor, setOlderCursor] = useState<string | null>(null);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
 
   // 新建会话
   const handleNewChat = () => {
@@ -57,83 +139,7 @@ export default function ChatPage() {
   };
 
   const updateMessages = React.useCallback((data: FetchDataProps) => {
-    setMessages(prev => {
-      const newMessages = [...prev];
-
-      const role = data.role || 'assistant';
-      if (role === 'user') {
-        const userMessage = {
-          role: role,
-          content: data.content,
-          source: "",
-          agentId: "",
-          providerUrl: "",
-          contentType: data.content_type
-        };
-        newMessages.push(userMessage);
-        return newMessages;
-      }
-
-      if (data.event === 'TEXT_MESSAGE_CHUNK') {
-        if (data.source === 'agent') {
-          const lastMessage = newMessages[newMessages.length - 1];
-          if (lastMessage && 
-              lastMessage.role === 'assistant' && 
-              lastMessage.source === 'agent' && 
-              lastMessage.agentId === data.agent_id &&
-              lastMessage.contentType === 'text') {
-            const updatedMessage = {
-              ...lastMessage,
-              content: (lastMessage?.content || '') + (data?.content || '')
-            };
-            newMessages[newMessages.length - 1] = updatedMessage;
-          } else {
-            const agentMessage = {
-              role: role,
-              content: data.content,
-              source: data.source,
-              agentId: data.agent_id,
-              providerUrl: data.provider_url,
-              contentType: data.content_type
-            };
-            newMessages.push(agentMessage);
-          }
-        } else {
-          const lastMessage = newMessages[newMessages.length - 1];
-          if (lastMessage && 
-              lastMessage.role === 'assistant' && 
-              lastMessage.source === 'platform') {
-            const updatedMessage = {
-              ...lastMessage,
-              content: (lastMessage?.content || '') + (data?.content || '')
-            };
-            newMessages[newMessages.length - 1] = updatedMessage;
-          } else {
-            const agentMessage = {
-              role: role,
-              content: data.content,
-              source: data.source,
-              agentId: data.agent_id,
-              providerUrl: data.provider_url,
-              contentType: data.content_type
-            };
-            newMessages.push(agentMessage);
-          }
-        }
-      } else if (data.event === 'FILE_ID_STRING') {
-        const agentMessage = {
-          role: role,
-          fileId: data.content,
-          source: data.source,
-          agentId: data.agent_id,
-          providerUrl: data.provider_url,
-          contentType: data.content_type
-        };
-        newMessages.push(agentMessage);
-      }
-
-      return newMessages;
-    });
+    setMessages(prev => appendMessage(prev, data));
   }, []);
 
   // 发送消息
@@ -290,12 +296,13 @@ export default function ChatPage() {
     }
   };
 
-  // 加载特定会话的消息
+  // 加载特定会话的消息（最新一页，更早的消息通过loadOlderMessages按游标加载）
   const loadThreadMessages = React.useCallback(async (targetThreadId?: string) => {
     const threadIdToLoad = targetThreadId || threadId;
     if (!threadIdToLoad) return;
 
     setMessages([]);
+    setOlderCursor(null);
     setIsLoading(true);
 
     try {
@@ -306,15 +313,37 @@ export default function ChatPage() {
         return;
       }
 
-      for (const message of data.data) {
-        updateMessages(message);
-      }
+      setMessages(data.data.reduce(appendMessage, []));
+      setOlderCursor(data.next_cursor || null);
     } catch (error) {
       console.error('加载消息失败:', error);
     } finally {
       setIsLoading(false);
     }
-  }, [threadId, updateMessages]);
+  }, [threadId]);
+
+  // 加载更早的一页消息，拼接到列表前面
+  const loadOlderMessages = React.useCallback(async () => {
+    if (!threadId || !olderCursor || isLoadingOlder) return;
+
+    setIsLoadingOlder(true);
+    try {
+      const res = await fetch(`/api/agent-space-chat/get-message-list?thread_id=${threadId}&cursor=${encodeURIComponent(olderCursor)}`);
+      const data = await res.json();
+      if (!data.ok) {
+        console.error('loadOlderMessages data.ok:', data.ok);
+        return;
+      }
+
+      const olderMessages: Message[] = data.data.reduce(appendMessage, []);
+      setMessages(prev => [...olderMessages, ...prev]);
+      setOlderCursor(data.next_cursor || null);
+    } catch (error) {
+      console.error('加载更早消息失败:', error);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  }, [threadId, olderCursor, isLoadingOlder]);
 
   // 鼠标高亮效果（保留原代码）
   const highlightRef = useRef<HTMLDivElement>(null);
@@ -382,6 +411,9 @@ export default function ChatPage() {
               isCancelling={isCancelling}
               onCancelRun={handleCancelRun}
               isLoading={isLoading}
+              hasOlderMessages={!!olderCursor}
+              isLoadingOlder={isLoadingOlder}
+              onLoadOlder={loadOlderMessages}
               onLoginCancel={handleLoginCancel}
               ref={chatAreaLoginCancelRef}
             />
@@ -24,10 +24,13 @@ interface ChatAreaProps {
   isCancelling?: boolean;
   onCancelRun?: () => void;
   isLoading?: boolean;
+  hasOlderMessages?: boolean;
+  isLoadingOlder?: boolean;
+  onLoadOlder?: () => void;
   onLoginCancel?: () => void;
 }
 
-const ChatArea = React.forwardRef<{ handleLoginCancel: () => void }, ChatAreaProps>(({ messages, onSend, agentName: initialAgentName, agentOrganization: initialAgentOrganization, isRunning = false, isCancelling = false, onCancelRun, isLoading = false, onLoginCancel }, ref) => {
+const ChatArea = React.forwardRef<{ handleLoginCancel: () => void }, ChatAreaProps>(({ messages, onSend, agentName: initialAgentName, agentOrganization: initialAgentOrganization, isRunning = false, isCancelling = false, onCancelRun, isLoading = false, hasOlderMessages = false, isLoadingOlder = false, onLoadOlder, onLoginCancel }, ref) => {
   const { t } = useLanguage();
   const [input, setInput] = React.useState('');
   const [fileIds, setFileIds] = React.useState<string[]>([]);
@@ -649,6 +652,16 @@ const ChatArea = React.forwardRef<{ handleLoginCancel: () => void }, ChatAreaPro
               )} */}
             </div>
           ) : null}
+          {/* 加载更早的消息 */}
+          {!isLoading && hasOlderMessages && (
+            <button
+              className="self-center text-gray-400 hover:text-blue-500 text-sm py-1 cursor-pointer transition-colors disabled:cursor-default"
+              onClick={onLoadOlder}
+              disabled={isLoadingOlder}
+            >
+              {isLoadingOlder ? t('chat_loading') : t('chat_load_older')}
+            </button>
+          )}
           {(() => {
             const renderedMessages: JSX.Element[] = [];
             let i = 0;
@@ -30,6 +30,7 @@ const translations: Record<string, { en: string; zh: string }> = {
   fail_retry: { en: 'Response failed, please retry later', zh: '应答失败，请稍后再试' },
   // ChatArea.tsx
   chat_loading: { en: 'Loading...', zh: '加载中...' },
+  chat_load_older: { en: 'Load earlier messages', zh: '加载更早的消息' },
   chat_welcome: { en: "Hi, I'm Yugong. Start your intelligent exploration here", zh: 'hi，我是愚公，在此开启你的智能探索' },
   chat_placeholder: { en: 'Be a little “foolish”, life gets better', zh: '自“愚”一下，生活更美好' },
   chat_single_agent_tip: { en: 'Only one agent can be specified', zh: '目前支持最多指定一个agent' },
@@ -94,6 +95,7 @@ const translations: Record<string, { en: string; zh: string }> = {
   sidebar_new_chat: { en: 'New chat', zh: '新建会话' },
   sidebar_expand_sidebar: { en: 'Expand sidebar', zh: '展开侧边栏' },
   sidebar_collapse_sidebar: { en: 'Collapse sidebar', zh: '收起侧边栏' },
+  sidebar_load_more: { en: 'Load more', zh: '加载更多' },
 };
 
 const LanguageContext = React.createContext<LanguageContextValue | undefined>(undefined);
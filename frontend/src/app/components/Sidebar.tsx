@@ -15,7 +15,7 @@ interface SidebarProps {
 }
 
 export default function Sidebar({ onNewChat, onSelectChat, currentThreadId }: SidebarProps) {
-  const { collapsed, setCollapsed, chats } = useSidebar();
+  const { collapsed, setCollapsed, chats, hasMoreChats, loadMoreChats } = useSidebar();
   const { t } = useLanguage();
   
   return (
@@ -56,6 +56,14 @@ export default function Sidebar({ onNewChat, onSelectChat, currentThreadId }: Si
               {chat.title}
             </div>
           ))}
+          {hasMoreChats && (
+            <button
+              className="w-full p-2 rounded text-gray-400 hover:text-blue-500 hover:bg-[#23233a] text-left cursor-pointer transition-colors"
+              onClick={loadMoreChats}
+            >
+              {t('sidebar_load_more')}
+            </button>
+          )}
         </div>
       )}
     </aside>
@@ -10,6 +10,8 @@ interface SidebarContextType {
   chats: ChatItem[];
   setChats: (chats: ChatItem[]) => void;
   updateChats: () => Promise<void>;
+  hasMoreChats: boolean;
+  loadMoreChats: () => Promise<void>;
 }
 
 const SidebarContext = createContext<SidebarContextType | undefined>(undefined);
@@ -17,36 +19,64 @@ const SidebarContext = createContext<SidebarContextType | undefined>(undefined);
 export function SidebarProvider({ children }: { children: ReactNode }) {
   const [collapsed, setCollapsed] = useState(false);
   const [chats, setChats] = useState<ChatItem[]>([]);
+  // 下一页会话的分页游标（为空表示没有更多）
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const { userId } = useAuth();
   const userid = userId;
 
-  const updateChats = useCallback(async () => {
-    try {
-      const res = await fetch(`/api/agent-space-chat/get-chat-list?user_id=${userid}`);
-      const data = await res.json();
-      if (!data.ok) {
-        console.error('updateChats data.ok:', data.ok);
-        return;
-      }
+  const fetchChats = useCallback(async (cursor?: string) => {
+    const query = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+    const res = await fetch(`/api/agent-space-chat/get-chat-list?user_id=${userid}${query}`);
+    const data = await res.json();
+    if (!data.ok) {
+      console.error('fetchChats data.ok:', data.ok);
+      return null;
+    }
 
-      const chatList = data.data.map((item: ChatItem) => ({
-        thread_id: item.thread_id,
-        title: item.title
-      }));
+    const chatList: ChatItem[] = data.data.map((item: ChatItem) => ({
+      thread_id: item.thread_id,
+      title: item.title
+    }));
+    return { chatList, nextCursor: (data.next_cursor || null) as string | null };
+  }, [userid]);
 
-      setChats(chatList);
+  // 刷新为第一页
+  const updateChats = useCallback(async () => {
+    try {
+      const page = await fetchChats();
+      if (!page) return;
+      setChats(page.chatList);
+      setNextCursor(page.nextCursor);
     } catch (error) {
       console.error('Failed to update chats:', error);
     }
-  }, [userid]);
+  }, [fetchChats]);
+
+  // 追加下一页
+  const loadMoreChats = useCallback(async () => {
+    if (!nextCursor) return;
+    try {
+      const page = await fetchChats(nextCursor);
+      if (!page) return;
+      setChats(prev => {
+        const loaded = new Set(prev.map(chat => chat.thread_id));
+        return [...prev, ...page.chatList.filter(chat => !loaded.has(chat.thread_id))];
+      });
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Failed to load more chats:', error);
+    }
+  }, [fetchChats, nextCursor]);
 
   const value = useMemo(() => ({
     collapsed,
     setCollapsed,
     chats,
     setChats,
-    updateChats
-  }), [collapsed, chats, updateChats]);
+    updateChats,
+    hasMoreChats: !!nextCursor,
+    loadMoreChats
+  }), [collapsed, chats, updateChats, nextCursor, loadMoreChats]);
 
   return (
     <SidebarContext.Provider value={value}>